@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+Requests/sec of the blocking CbNgsi10v2Utils against AsyncCbNgsi10v2Utils, using a local stand-in server
+(run in its own process) which answers after a simulated service latency.
+Usage: PYTHONPATH=. python benchmarks/cb_async_benchmark.py [requests] [concurrency] [latency_ms]
+"""
+
+import sys
+import time
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.cb_async_utils import AsyncCbNgsi10v2Utils
+from iotqatools.helpers_utils import LogLevelConfiguration
+from stand_in_server import StandInProcess
+
+PAYLOAD = {'temperature': {'value': 21}}
+
+
+def run_sync(server, requests_number):
+    with CbNgsi10v2Utils(server.host, port=str(server.port), log_verbosity='ERROR') as cb:
+        start = time.time()
+        for i in range(requests_number):
+            cb.update_entity(PAYLOAD, 'room_%s' % i, headers={})
+        return requests_number / (time.time() - start)
+
+
+def run_async(server, requests_number, concurrency):
+    with AsyncCbNgsi10v2Utils(server.host, concurrency=concurrency, max_pending=10 * concurrency,
+                              port=str(server.port), log_verbosity='ERROR') as cb:
+        start = time.time()
+        pending = [cb.update_entity(PAYLOAD, 'room_%s' % i) for i in range(requests_number)]
+        cb.gather(pending)
+        return requests_number / (time.time() - start)
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.005
+    LogLevelConfiguration.default_log_level = 'ERROR'
+    server = StandInProcess(latency=latency).start()
+    try:
+        print('sync                %8.1f req/s' % run_sync(server, number))
+        print('async (%4s)        %8.1f req/s' % (concurrency, run_async(server, number, concurrency)))
+    finally:
+        server.stop()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+Entity payload generation: string concatenation + json.loads + json.dumps (previous raw path) against
+EntityPayloadTemplate, for 1, 100 and 1000 attributes.
+Usage: PYTHONPATH=. python benchmarks/cb_payload_benchmark.py [entities]
+"""
+
+import json
+import sys
+import time
+
+from iotqatools.cb_payload_utils import EntityPayloadTemplate
+
+
+def entity_context(attributes_number):
+    names = '&'.join('"attr_%s"' % i for i in range(attributes_number))
+    return {'entities_number': 1, 'entities_type': '"Room"', 'entities_id': '"room"',
+            'entities_prefix': {'id': False, 'type': False}, 'attributes_number': attributes_number,
+            'attributes_name': names, 'attributes_value': '&'.join(['21.5'] * attributes_number),
+            'attributes_type': '&'.join(['"Number"'] * attributes_number), 'attributes_metadata': 'true',
+            'metadatas_number': 0, 'metadatas_name': None, 'metadatas_type': None, 'metadatas_value': None}
+
+
+def legacy(context, entity_ids):
+    """
+    previous path: attributes concatenated in every entity, parsed and serialized again before sending
+    """
+    for entity_id in entity_ids:
+        attributes = ''
+        for name, value, attr_type in zip(context['attributes_name'].split('&'),
+                                          context['attributes_value'].split('&'),
+                                          context['attributes_type'].split('&')):
+            attributes = attributes + '%s:{"type": %s, "value": %s}, ' % (name, attr_type, value)
+        payload = '{"type": %s, "id": "%s", %s}' % (context['entities_type'], entity_id, attributes[:-2])
+        json.dumps(json.loads(payload))
+
+
+def template(context, entity_ids):
+    compiled = EntityPayloadTemplate(context, 'normalized', raw=True)
+    for entity_id in entity_ids:
+        compiled.render(entity_id=entity_id)
+
+
+def batch(context, entity_ids):
+    EntityPayloadTemplate(context, 'normalized', raw=True).render_batch(entity_ids)
+
+
+def measure(function, context, entities_number):
+    entity_ids = ['room_%s' % i for i in range(entities_number)]
+    start = time.time()
+    function(context, entity_ids)
+    return entities_number / (time.time() - start)
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print('%-11s %14s %14s %14s' % ('attributes', 'legacy', 'template', 'render_batch'))
+    for attributes in (1, 100, 1000):
+        entities = max(number // attributes, 20)
+        context = entity_context(attributes)
+        print('%-11s %10.1f e/s %10.1f e/s %10.1f e/s' % (attributes, measure(legacy, context, entities),
+                                                          measure(template, context, entities),
+                                                          measure(batch, context, entities)))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+Requests/sec of CbNgsi10v2Utils against a local stand-in server, with and without connection pooling.
+Usage: PYTHONPATH=. python benchmarks/cb_pool_benchmark.py [requests]
+"""
+
+import sys
+import time
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.helpers_utils import LogLevelConfiguration
+from stand_in_server import StandInServer
+
+
+def run(requests_number, keep_alive):
+    server = StandInServer().start()
+    try:
+        with CbNgsi10v2Utils(server.host, port=str(server.port), log_verbosity='ERROR', keep_alive=keep_alive) as cb:
+            payload = {'id': 'room', 'type': 'Room', 'temperature': {'value': 21}}
+            start = time.time()
+            for i in range(requests_number):
+                cb.update_entity(payload, 'room', headers={})
+            return requests_number / (time.time() - start)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    LogLevelConfiguration.default_log_level = 'ERROR'
+    for keep_alive in (False, True):
+        print('keep_alive=%-5s  %8.1f req/s' % (keep_alive, run(number, keep_alive)))
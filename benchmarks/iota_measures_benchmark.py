@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+UL measures encoding: previous getMeasure (+= concatenation and str.replace loop) against MeasureEncoder, per
+device and batched, for 1M measures (100k devices of 10 measures).
+Usage: PYTHONPATH=. python benchmarks/iota_measures_benchmark.py [measures]
+"""
+
+import sys
+import time
+
+from iotqatools.iota_measures import MeasureEncoder
+
+
+def legacy(protocol, measures):
+    """
+    previous Gw_Measures_Utils.getMeasure, without the prints
+    """
+    result = ""
+    for measure in measures:
+        if protocol == "UL":
+            result += "||" + str(measure.get("timestamp", "")) + "|" + str(measure.get("id", "")) + "||" + str(
+                measure.get("alias", "")) + "|" + str(measure.get("value", "")) + "#"
+        else:
+            result += str(measure.get("timestamp", "")) + "|" + str(measure.get("alias", "")) + "|" + str(
+                measure.get("value", "")) + "#"
+    result = result.rpartition("#")[0]
+    replaces = {"True": "1", "False": "0", "true": "1", "false": "0", ";": "/", "&": "|"}
+    if "IoT" not in protocol:
+        for kreplace in replaces:
+            result = result.replace(kreplace, replaces[kreplace])
+    else:
+        result = result.replace("\'", "\"")
+    return result
+
+
+def devices_measures(measures_number, per_device=10):
+    return [[{'alias': 'a%s' % i, 'value': 20.5 + i, 'timestamp': '2016-03-01T10:00:00Z'}
+             for i in range(per_device)] for _ in xrange(measures_number // per_device)]
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    devices = devices_measures(number)
+    print('%-8s %16s %16s %16s' % ('protocol', 'legacy', 'encode', 'encode_many'))
+    for protocol in ('UL', 'UL2', 'IoTUL2'):
+        start = time.time()
+        for measures in devices:
+            legacy(protocol, measures)
+        legacy_time = time.time() - start
+        encoder = MeasureEncoder(protocol)
+        start = time.time()
+        for measures in devices:
+            encoder.encode(measures)
+        encode_time = time.time() - start
+        start = time.time()
+        encoder.encode_many(devices)
+        many_time = time.time() - start
+        print('%-8s %12.0f m/s %12.0f m/s %12.0f m/s' % (protocol, number / legacy_time, number / encode_time,
+                                                         number / many_time))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+JSON bodies of Orion: previous path (json.dumps + encode, json.loads(response.text)) against the JsonCodec of
+every backend installed, for an entity, an update batch of 100 entities and a query response of 1000 entities.
+Usage: PYTHONPATH=. python benchmarks/json_codec_benchmark.py [iterations]
+"""
+
+import json
+import sys
+import time
+
+import requests
+
+from iotqatools.json_utils import JsonCodec, available_backends
+
+
+def entity(number, attributes=10):
+    content = {'id': u'habitación_%s' % number, 'type': 'Room'}
+    for i in range(attributes):
+        content['temperature_%s' % i] = {'type': 'Number', 'value': 21.5 + i,
+                                         'metadata': {'accuracy': {'type': 'Number', 'value': 0.5},
+                                                      'timestamp': {'type': 'DateTime',
+                                                                    'value': '2017-06-17T07:21:24.238Z'}}}
+    return content
+
+
+def response(body):
+    """
+    response of Orion as built by requests (application/json without charset)
+    """
+    result = requests.Response()
+    result.status_code = 200
+    result._content = body
+    result.headers['Content-Type'] = 'application/json'
+    return result
+
+
+def legacy_dumps(value):
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def legacy_loads(body):
+    return json.loads(response(body).text)
+
+
+def measure(function, argument, iterations):
+    start = time.time()
+    for _ in xrange(iterations):
+        function(argument)
+    return (time.time() - start) * 1000000 / iterations
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    payloads = [('entity', entity(0)),
+                ('batch 100', {'actionType': 'append', 'entities': [entity(i) for i in range(100)]}),
+                ('query 1000', [entity(i) for i in range(1000)])]
+    codecs = [JsonCodec(backend) for backend in available_backends()]
+    print('%-11s %-6s %12s' % ('payload', 'op', 'legacy(us)') +
+          ''.join(' %12s' % ('%s(us)' % codec.backend) for codec in codecs))
+    for name, payload in payloads:
+        body = legacy_dumps(payload)
+        count = max(iterations // max(len(body) // 10000, 1), 5)
+        print('%-11s %-6s %12.1f' % (name, 'dumps', measure(legacy_dumps, payload, count)) +
+              ''.join(' %12.1f' % measure(lambda value: codec.dumps(value, ensure_ascii=False), payload, count)
+                      for codec in codecs))
+        print('%-11s %-6s %12.1f' % (name, 'loads', measure(legacy_loads, body, count)) +
+              ''.join(' %12.1f' % measure(lambda data: codec.response_json(response(data)), body, count)
+                      for codec in codecs))
+    # the responses not parsed by the test do not cost anything now (response.text was decoded in every request)
+    body = legacy_dumps([entity(i) for i in range(100)])
+    print('unused response of %s bytes: %.1f us before, 0 now' % (
+        len(body), measure(lambda data: response(data).text, body, iterations)))
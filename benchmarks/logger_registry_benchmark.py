@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+Cost of get_logger and of the request logging path (PqaTools.log_fullRequest at INFO), configuring the logger in
+every call (previous get_logger) against the cached logger registry.
+Usage: PYTHONPATH=. python benchmarks/logger_registry_benchmark.py [calls]
+"""
+
+import sys
+import time
+
+from iotqatools import iot_tools
+from iotqatools.helpers_utils import LogLevelConfiguration
+from iotqatools.iot_logger import configure_logger, get_logger
+from iotqatools.iot_tools import PqaTools
+from pqa_logging_benchmark import exchange
+
+
+def legacy_get_logger(name, level=None):
+    """
+    previous get_logger: the handler and formatter are created again in every call
+    """
+    return configure_logger(name, level or LogLevelConfiguration.default_log_level)
+
+
+def measure(function, number):
+    start = time.time()
+    for i in range(number):
+        function()
+    return (time.time() - start) * 1000000 / number
+
+
+def request_logging(logger_factory, number):
+    params, response = exchange()
+    iot_tools.get_logger = logger_factory
+    try:
+        return measure(lambda: PqaTools.log_fullRequest(comp='CB', response=response, params=params), number)
+    finally:
+        iot_tools.get_logger = get_logger
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    LogLevelConfiguration.default_log_level = 'INFO'
+    print('%-28s %9.2f us/call' % ('get_logger previous', measure(lambda: legacy_get_logger('iot_tools'), number)))
+    print('%-28s %9.2f us/call' % ('get_logger cached', measure(lambda: get_logger('iot_tools'), number)))
+    print('%-28s %9.2f us/call' % ('log_fullRequest previous', request_logging(legacy_get_logger, number)))
+    print('%-28s %9.2f us/call' % ('log_fullRequest cached', request_logging(get_logger, number)))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+
+Per request overhead of PqaTools.log_fullRequest at INFO and DEBUG (written to /dev/null), against the previous
+eager formatting.
+Usage: PYTHONPATH=. python benchmarks/pqa_logging_benchmark.py [requests]
+"""
+
+import json
+import os
+import pprint
+import sys
+import time
+
+import requests
+
+from iotqatools.helpers_utils import LogLevelConfiguration
+from iotqatools.iot_logger import get_logger
+from iotqatools.iot_tools import PqaTools
+
+
+def legacy_log_full_request(comp='', response='', params=dict()):
+    """
+    previous log_fullRequest: the texts are built before knowing if they are logged
+    """
+    log = get_logger('iot_tools')
+    log_msg = '>>>>>>>>>>>>>\t Data sent:     \t>>>>>>>>>>>>> \n'
+    log_msg += '\t> Comp: %s\n' % comp
+    log_msg += '\t> Url: %s\n' % params['url']
+    log_msg += '\t> Method: %s\n' % params['method']
+    log_msg += '\t> Headers: {}\n'.format(str(params['headers']))
+    log_msg += '\t> Payload sent: {}\n'.format(pprint.pformat(params['data'], width=20))
+    log.debug(log_msg)
+    log_msg = '<<<<<<<<<<<<<<\t Data responded:\t<<<<<<<<<<<<<<\n'
+    log_msg += '\t< Response code: {}\n'.format(str(response.status_code))
+    log_msg += '\t< Headers: {}\n'.format(str(dict(response.headers)))
+    log_msg += '\t< Payload received:\n {}'.format(response.content)
+    log.debug(log_msg)
+    return 0
+
+
+def exchange():
+    entities = [{'id': 'room_%s' % i, 'type': 'Room', 'temperature': {'value': i, 'type': 'Number'}}
+                for i in range(20)]
+    params = {'method': 'post', 'url': 'http://127.0.0.1:1026/v2/op/update', 'verify': False,
+              'headers': {'Accept': 'application/json', 'Content-Type': 'application/json',
+                          'Fiware-Service': 'bench', 'Fiware-ServicePath': '/'},
+              'data': json.dumps({'actionType': 'append', 'entities': entities})}
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response.headers['Fiware-Correlator'] = 'b2d5a7e2-0a43-11e7-8f5c-0242ac110003'
+    response._content = json.dumps(entities)
+    return params, response
+
+
+def measure(function, level, number, sample_rate=1):
+    LogLevelConfiguration.default_log_level = level
+    PqaTools.configure_request_logging(sample_rate=sample_rate)
+    params, response = exchange()
+    start = time.time()
+    for i in range(number):
+        function(comp='CB', response=response, params=params)
+    return (time.time() - start) * 1000000 / number
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # the handlers created by get_logger write to sys.stderr
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        results = [('INFO', 'previous', measure(legacy_log_full_request, 'INFO', number)),
+                   ('INFO', 'lazy', measure(PqaTools.log_fullRequest, 'INFO', number)),
+                   ('DEBUG', 'previous', measure(legacy_log_full_request, 'DEBUG', number)),
+                   ('DEBUG', 'lazy', measure(PqaTools.log_fullRequest, 'DEBUG', number)),
+                   ('DEBUG', 'lazy 1/10', measure(PqaTools.log_fullRequest, 'DEBUG', number, 10))]
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    for level, mode, micros in results:
+        print('%-6s %-10s %9.1f us/request' % (level, mode, micros))
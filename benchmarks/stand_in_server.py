@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import socket
+import threading
+import time
+import multiprocessing
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Orion-like handler used by the benchmarks. It keeps HTTP/1.1 connections alive,
+    so the client side connection pooling can be measured
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply(self, status, body=None, headers=None):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        content = '' if body is None else json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for header in headers or {}:
+            self.send_header(header, headers[header])
+        if (self.headers.getheader('Connection') or '').lower() == 'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __read_body(self):
+        length = int(self.headers.getheader('Content-Length') or 0)
+        return self.rfile.read(length) if length else ''
+
+    def do_GET(self):
+        if self.path.startswith('/version'):
+            self.__reply(200, {'orion': {'version': 'stand-in'}})
+        elif self.path.startswith('/statistics'):
+            self.__reply(200, {'uptime_in_secs': 1, 'measuring_interval_in_secs': 1})
+        else:
+            self.__reply(200, [])
+
+    def do_POST(self):
+        self.__read_body()
+        if self.path.startswith('/v2/op/update'):
+            self.__reply(204)
+        else:
+            self.__reply(201, headers={'Location': self.path})
+
+    def do_PATCH(self):
+        self.__read_body()
+        self.__reply(204)
+
+    def do_PUT(self):
+        self.__read_body()
+        self.__reply(204)
+
+    def do_DELETE(self):
+        self.__reply(204)
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    latency = 0
+
+
+class StandInServer(object):
+    """
+    Local stand-in server running in a background thread
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, handler=StandInHandler, latency=0):
+        """
+        :param latency: seconds waited before every response, to simulate the service time
+        """
+        self.server = ThreadedHTTPServer((host, port), handler)
+        self.server.latency = latency
+        self.host, self.port = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StandInProcess(object):
+    """
+    Local stand-in server running in its own process, so it does not compete for the GIL with the client
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, handler=StandInHandler, latency=0):
+        if port == 0:
+            probe = socket.socket()
+            probe.bind((host, 0))
+            port = probe.getsockname()[1]
+            probe.close()
+        self.host, self.port = host, port
+        self.process = multiprocessing.Process(target=self.__serve, args=(host, port, handler, latency))
+        self.process.daemon = True
+
+    @staticmethod
+    def __serve(host, port, handler, latency):
+        server = ThreadedHTTPServer((host, port), handler)
+        server.latency = latency
+        server.serve_forever()
+
+    def start(self):
+        self.process.start()
+        # wait until the server accepts connections
+        for attempt in range(100):
+            try:
+                socket.create_connection((self.host, self.port), 0.1).close()
+                break
+            except socket.error:
+                time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
@@ -28,6 +28,7 @@ import pystache
 from iotqatools.templates.ac_templates import *
 from iotqatools.iot_logger import get_logger
 from iotqatools.iot_tools import PqaTools
+from iotqatools.transport_utils import client_transport
 
 
 def generate_url(host, tenant, subject):
@@ -51,8 +52,12 @@ class AC(object):
 
     log = get_logger('AccessControl', 'ERROR')
 
-    def __init__(self, host, port='8080', protocol='http'):
+    def __init__(self, host, port='8080', protocol='http', transport=None):
+        """
+        :param transport: HttpTransport shared with other clients (None creates one for this client)
+        """
         self.url = '%s://%s:%s' % (protocol, host, port)
+        self.transport, self.own_transport = client_transport(transport, log_instance=self.log)
 
     def send(self, method, url, headers=None, payload=None, query=None):
         """
@@ -78,7 +83,7 @@ class AC(object):
             request_parms.update({'data': payload})
         if query is not None:
             request_parms.update({'params': query})
-        response = requests.request(method, url, **request_parms)
+        response = self.transport.request(method, url, **request_parms)
         PqaTools.log_fullRequest(comp='ORC', response=response, params=request_parms)
 
         return response
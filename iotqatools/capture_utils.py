@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import atexit
+import base64
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+from urlparse import urlparse, parse_qsl
+
+from requests.structures import CaseInsensitiveDict
+
+from iotqatools.iot_tools import PqaTools
+
+HAR = 'har'
+JSON_LINES = 'jsonl'
+
+
+def har_headers(headers):
+    if not headers:
+        return []
+    return [{'name': name, 'value': str(value)} for name, value in headers.items()]
+
+
+def har_content(body, max_size):
+    """
+    :return tuple (text, size, encoding) of a body, encoding is 'base64' if it is not utf-8 text
+    """
+    if body is None:
+        return None, 0, None
+    if not isinstance(body, basestring):
+        body = json.dumps(body)
+    size = len(body)
+    if max_size is not None and size > max_size:
+        body = body[:max_size]
+    if isinstance(body, unicode):
+        return body, size, None
+    try:
+        return body.decode('utf-8'), size, None
+    except UnicodeDecodeError:
+        return base64.b64encode(body), size, 'base64'
+
+
+class TrafficExporter(object):
+    """
+    Write every request/response exchange of all the components (the ones logged by PqaTools) to disk as they
+    happen, as a HAR file or as JSON-lines (a HAR entry per line), optionally gzipped. Only the current entry is
+    kept in memory
+    >>> with TrafficExporter('run.har.gz').install():
+    >>>     run_test()
+    """
+
+    def __init__(self, filename, format=None, compress=None, max_body_size=None):
+        """
+        Traffic exporter constructor
+        :param filename: path to the file
+        :param format: har | jsonl (by default jsonl if the filename contains .jsonl, har if not)
+        :param compress: gzip the file (by default if the filename ends with .gz)
+        :param max_body_size: max chars of the bodies written (None writes them whole)
+        """
+        if format is None:
+            format = JSON_LINES if '.jsonl' in filename else HAR
+        if format not in (HAR, JSON_LINES):
+            raise Exception('Wrong format "%s", allowed: %s, %s' % (format, HAR, JSON_LINES))
+        if compress is None:
+            compress = filename.endswith('.gz')
+        self.filename = filename
+        self.format = format
+        self.max_body_size = max_body_size
+        self.fd = gzip.open(filename, 'wb') if compress else open(filename, 'wb')
+        self.lock = threading.Lock()
+        self.entries = 0
+        self.closed = False
+        if format == HAR:
+            self.fd.write('{"log": {"version": "1.2", "creator": {"name": "iotqatools", "version": "1.0"}, '
+                          '"entries": [\n')
+
+    def entry(self, comp, method, url, headers, data, response):
+        """
+        build the HAR entry of an exchange
+        """
+        end = time.time()
+        elapsed = response.elapsed.total_seconds() * 1000 if response is not None and \
+            response.elapsed is not None else 0
+        if response is not None:
+            url = response.url or url
+            if response.request is not None:
+                headers = response.request.headers
+        text, size, encoding = har_content(data, self.max_body_size)
+        request = {'method': str(method).upper(), 'url': url, 'httpVersion': 'HTTP/1.1', 'cookies': [],
+                   'headers': har_headers(headers),
+                   'queryString': [{'name': name, 'value': value} for name, value in
+                                   parse_qsl(urlparse(url).query, keep_blank_values=True)],
+                   'headersSize': -1, 'bodySize': size}
+        if text is not None:
+            request['postData'] = {'mimeType': CaseInsensitiveDict(headers or {}).get('Content-Type', ''),
+                                   'text': text}
+            if encoding is not None:
+                request['postData']['encoding'] = encoding
+        entry = {'startedDateTime': datetime.utcfromtimestamp(end - elapsed / 1000).isoformat() + 'Z',
+                 'time': elapsed, 'request': request, 'cache': {},
+                 'timings': {'send': 0, 'wait': elapsed, 'receive': 0}, '_comp': comp}
+        if response is not None:
+            text, size, encoding = har_content(response.content, self.max_body_size)
+            content = {'size': size, 'mimeType': response.headers.get('Content-Type', ''), 'text': text or ''}
+            if encoding is not None:
+                content['encoding'] = encoding
+            entry['response'] = {'status': response.status_code, 'statusText': response.reason or '',
+                                 'httpVersion': 'HTTP/1.1', 'cookies': [], 'headers': har_headers(response.headers),
+                                 'content': content, 'redirectURL': '', 'headersSize': -1, 'bodySize': size}
+        else:
+            # the request was not answered (network error)
+            entry['response'] = {'status': 0, 'statusText': '', 'httpVersion': '', 'cookies': [], 'headers': [],
+                                 'content': {'size': 0, 'mimeType': ''}, 'redirectURL': '', 'headersSize': -1,
+                                 'bodySize': -1, '_error': True}
+        return entry
+
+    def write(self, comp, method, url, headers, data, response):
+        """
+        exchange hook (see PqaTools.add_exchange_hook): write the exchange
+        """
+        line = json.dumps(self.entry(comp, method, url, headers, data, response))
+        with self.lock:
+            if self.closed:
+                return
+            if self.format == HAR and self.entries > 0:
+                self.fd.write(',\n')
+            self.fd.write(line)
+            if self.format == JSON_LINES:
+                self.fd.write('\n')
+            self.entries += 1
+
+    def install(self):
+        """
+        start writing the exchanges. The file is closed at process exit if close is not called
+        :return self
+        """
+        PqaTools.add_exchange_hook(self.write)
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """
+        stop writing the exchanges and close the file (with the end of the HAR document)
+        """
+        PqaTools.remove_exchange_hook(self.write)
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.format == HAR:
+                self.fd.write('\n]}}\n')
+            self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
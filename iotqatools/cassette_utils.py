@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+from datetime import timedelta
+
+import requests
+from requests.exceptions import RequestException
+from requests.structures import CaseInsensitiveDict
+
+from iotqatools.iot_logger import get_logger
+from iotqatools.metrics_utils import route_template
+
+RECORD = 'record'
+REPLAY = 'replay'
+# replay if the cassette file exists, record if not
+AUTO = 'auto'
+
+# request headers which must match to replay an interaction (the tokens change in each run)
+MATCH_HEADERS = ('Fiware-Service', 'Fiware-ServicePath', 'Content-Type', 'Accept')
+
+
+def body_hash(body):
+    if body is None:
+        return None
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    return hashlib.sha1(body).hexdigest()
+
+
+class CassetteMissError(RequestException):
+    """
+    The request has not been recorded in the cassette
+    """
+
+
+class Cassette(object):
+    """
+    Record the request/response interactions of a HttpTransport in a file (JSON-lines) and replay them later
+    without network. Interactions are matched by method, route template of the url (see metrics_utils), the
+    MATCH_HEADERS and the hash of the body; among the matching ones the one with the same url is preferred, and
+    they are replayed in the recorded order (the last one is repeated when they run out)
+    >>> transport = HttpTransport(cassette=Cassette('features/cassettes/entities.jsonl', mode=AUTO))
+    >>> cb = CbNgsi10v2Utils('127.0.0.1', transport=transport)
+    """
+
+    def __init__(self, filename, mode=AUTO, match_headers=MATCH_HEADERS, match_body=True, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        Cassette constructor
+        :param filename: path to the cassette file
+        :param mode: record | replay | auto (replay if the file exists)
+        :param match_headers: request headers which must match (case insensitive)
+        :param match_body: the body of the request must match
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('Cassette', log_verbosity)
+        if mode == AUTO:
+            mode = REPLAY if os.path.exists(filename) else RECORD
+        if mode not in (RECORD, REPLAY):
+            raise Exception('Wrong mode "%s", allowed: %s, %s, %s' % (mode, RECORD, REPLAY, AUTO))
+        self.filename = filename
+        self.mode = mode
+        self.match_headers = tuple(match_headers)
+        self.match_body = match_body
+        self.lock = threading.Lock()
+        self.index = {}
+        self.cursors = {}
+        self.played = 0
+        self.recorded = 0
+        self.fd = None
+        if mode == REPLAY:
+            self.load()
+        else:
+            self.fd = open(filename, 'w')
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def prepare(self, method, url, kwargs):
+        """
+        :return the prepared request that would be sent (url with the query string and encoded body). Cookies
+            and auth are not prepared, they are not matched
+        """
+        prepared = requests.PreparedRequest()
+        prepared.prepare_method(method)
+        prepared.prepare_url(url, kwargs.get('params'))
+        prepared.prepare_headers(kwargs.get('headers'))
+        prepared.prepare_body(kwargs.get('data'), kwargs.get('files'), kwargs.get('json'))
+        return prepared
+
+    def key(self, method, url, headers, body):
+        """
+        :return the index key of a request
+        """
+        if not isinstance(headers, CaseInsensitiveDict):
+            headers = CaseInsensitiveDict(headers or {})
+        return (method.upper(), route_template(url), tuple(str(headers.get(name)) for name in self.match_headers),
+                body_hash(body) if self.match_body else None)
+
+    def load(self):
+        """
+        read the cassette file and index its interactions (the responses are kept ready to be served)
+        """
+        with open(self.filename) as fd:
+            for line in fd:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                request = interaction['request']
+                response = interaction['response']
+                content = response['body'] or ''
+                if response.get('encoding') == 'base64':
+                    content = base64.b64decode(content)
+                else:
+                    content = content.encode('utf-8')
+                key = self.key(request['method'], request['url'], request['headers'], None)[:3] + \
+                    (request['body_hash'] if self.match_body else None,)
+                self.index.setdefault(key, []).append(
+                    (request['url'], response['status'], response['reason'],
+                     CaseInsensitiveDict(response['headers']), content))
+        self.log.debug('Cassette %s loaded: %s requests' % (self.filename, len(self.index)))
+
+    def play(self, method, url, kwargs):
+        """
+        get the recorded response of a request
+        :return requests.Response
+        """
+        prepared = self.prepare(method, url, kwargs)
+        key = self.key(method, url, prepared.headers, prepared.body)
+        with self.lock:
+            interactions = self.index.get(key)
+            if not interactions:
+                raise CassetteMissError('ERROR: request %s %s not recorded in the cassette %s' %
+                                        (method.upper(), prepared.url, self.filename))
+            cursor = self.cursors.get(key, 0)
+            position = min(cursor, len(interactions) - 1)
+            # the next one with the same url, or the last one with it already replayed
+            candidates = range(cursor, len(interactions)) + range(min(cursor, len(interactions)) - 1, -1, -1)
+            for candidate in candidates:
+                if interactions[candidate][0] == prepared.url:
+                    position = candidate
+                    break
+            self.cursors[key] = position + 1
+            self.played += 1
+        recorded_url, status, reason, headers, content = interactions[position]
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = headers.copy()
+        response._content = content
+        response.url = prepared.url
+        response.request = prepared
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.elapsed = timedelta(0)
+        return response
+
+    def record(self, method, url, kwargs, response):
+        """
+        write an interaction in the cassette
+        """
+        prepared = self.prepare(method, url, kwargs)
+        content = response.content or ''
+        try:
+            body = content.decode('utf-8')
+            encoding = None
+        except UnicodeDecodeError:
+            body = base64.b64encode(content)
+            encoding = 'base64'
+        headers = CaseInsensitiveDict(prepared.headers or {})
+        interaction = {'request': {'method': method.upper(), 'url': prepared.url,
+                                   'headers': dict((name, headers[name]) for name in self.match_headers
+                                                   if name in headers),
+                                   'body_hash': body_hash(prepared.body)},
+                       'response': {'status': response.status_code, 'reason': response.reason,
+                                    'headers': dict(response.headers), 'body': body, 'encoding': encoding}}
+        line = json.dumps(interaction)
+        with self.lock:
+            self.fd.write(line)
+            self.fd.write('\n')
+            self.recorded += 1
+
+    def close(self):
+        """
+        close the cassette file (record mode)
+        """
+        with self.lock:
+            if self.fd is not None:
+                self.fd.close()
+                self.fd = None
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+from multiprocessing.pool import ThreadPool
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+
+
+class AsyncCbNgsi10v2Utils(object):
+    """
+    Non blocking variant of CbNgsi10v2Utils. Every operation is queued in a pool of worker threads, each one with
+    its own CbNgsi10v2Utils (the clients keep the context of the requests) sharing the same http connection pool,
+    and returns an AsyncResult whose get() gives the same response returned by
+    CbNgsi10v2Utils (requests logged with the same PqaTools hooks)
+    >>> cb = AsyncCbNgsi10v2Utils('127.0.0.1', concurrency=100)
+    >>> pending = [cb.update_entity({'temperature': {'value': i}}, 'room_%s' % i) for i in range(10000)]
+    >>> responses = cb.gather(pending)
+    """
+
+    def __init__(self, instance, concurrency=50, max_pending=None, **kwargs):
+        """
+        Async CB Utils constructor
+        :param instance: CB host
+        :param concurrency: number of requests sent at the same time (worker threads and pooled connections)
+        :param max_pending: max number of queued operations, the caller blocks when it is reached (None unbounded)
+        :param kwargs: rest of CbNgsi10v2Utils constructor parameters (protocol, port, default_headers, ...)
+        """
+        kwargs.setdefault('pool_maxsize', concurrency)
+        self.instance = instance
+        self.kwargs = kwargs
+        # owner of the http transport, shared by the clients of the workers
+        self.cb = CbNgsi10v2Utils(instance, **kwargs)
+        self.local = threading.local()
+        self.pool = ThreadPool(int(concurrency))
+        self.pending = threading.BoundedSemaphore(int(max_pending)) if max_pending is not None else None
+
+    def client(self):
+        """
+        :return the CbNgsi10v2Utils of the current thread
+        """
+        cb = getattr(self.local, 'cb', None)
+        if cb is None:
+            kwargs = dict(self.kwargs, transport=self.cb.transport, log_instance=self.cb.log)
+            cb = CbNgsi10v2Utils(self.instance, **kwargs)
+            self.local.cb = cb
+        return cb
+
+    def __submit(self, operation, *args, **kwargs):
+        """
+        queue a CbNgsi10v2Utils operation in the pool
+        :param operation: name of the CbNgsi10v2Utils method
+        :return AsyncResult
+        """
+        def call():
+            try:
+                return getattr(self.client(), operation)(*args, **kwargs)
+            finally:
+                if self.pending is not None:
+                    self.pending.release()
+
+        if self.pending is not None:
+            self.pending.acquire()
+        return self.pool.apply_async(call)
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """
+        wait for a list of AsyncResult
+        :param results: list of AsyncResult returned by the operations
+        :param timeout: max seconds to wait for each result
+        :return list of responses, in the same order
+        """
+        return [result.get(timeout) for result in results]
+
+    def close(self):
+        """
+        wait for the queued operations and close the workers and the http connections
+        """
+        self.pool.close()
+        self.pool.join()
+        self.cb.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # headers and params are copied in every call, CbNgsi10v2Utils updates them in place
+
+    def version(self):
+        return self.__submit('version')
+
+    def statistics(self):
+        return self.__submit('statistics')
+
+    def create_entity(self, payload, headers=None, params=None):
+        return self.__submit('create_entity', payload, headers=dict(headers or {}), params=params)
+
+    def update_entity(self, payload, entity_id, headers=None, params=None, method='post'):
+        return self.__submit('update_entity', payload, entity_id, headers=dict(headers or {}), params=params,
+                             method=method)
+
+    def delete_entity(self, entity_id, entity_type=None):
+        return self.__submit('delete_entity', entity_id, entity_type=entity_type)
+
+    def list_entities(self, headers=None, params=None):
+        return self.__submit('list_entities', headers=dict(headers or {}), params=params)
+
+    def get_entity_types(self, headers=None, params=None):
+        return self.__submit('get_entity_types', headers=dict(headers or {}), params=params)
+
+    def get_entity_attrs(self, entity_id, headers=None, params=None):
+        return self.__submit('get_entity_attrs', entity_id, headers=dict(headers or {}), params=params)
+
+    def get_attribute(self, headers, entity_id, entity_type, attribute_name, params=None):
+        return self.__submit('get_attribute', dict(headers or {}), entity_id, entity_type, attribute_name,
+                             params=dict(params or {}))
+
+    def create_subscription(self, payload, headers=None):
+        return self.__submit('create_subscription', payload, headers=dict(headers or {}))
+
+    def retrieve_subscriptions(self, headers=None, params=None):
+        return self.__submit('retrieve_subscriptions', headers=dict(headers or {}), params=params)
+
+    def retrieve_subscription_by_id(self, headers, subscription_id):
+        return self.__submit('retrieve_subscription_by_id', dict(headers or {}), subscription_id)
+
+    def delete_subscription(self, sub_id):
+        return self.__submit('delete_subscription', sub_id)
+
+    def batch_update(self, entities, action_type='append', headers=None, params=None):
+        return self.__submit('batch_update', entities, action_type=action_type, headers=dict(headers or {}),
+                             params=params)
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from iotqatools import json_utils
+from iotqatools.iot_logger import get_logger
+
+DEFAULT_CHUNK_SIZE = 100
+# Orion rejects requests with payloads bigger than 1MB (-inReqPayloadMaxSize), the batch envelope
+# ({"actionType": ..., "entities": [...]}) fits in the margin
+MAX_CHUNK_BYTES = 1024 * 1024 - 1024
+
+
+def iter_json_lines(filename):
+    """
+    Read a JSON-lines file lazily, one entity (dict) per line. Empty lines are ignored
+    :param filename: path to the file
+    :return generator of dicts
+    """
+    with open(filename, 'r') as fd:
+        for line in fd:
+            line = line.strip()
+            if line != '':
+                yield json.loads(line)
+
+
+def json_size(entity):
+    """
+    :return size of an entity serialized as CbNgsi10v2Utils sends it
+    """
+    return len(json_utils.dumps(entity, ensure_ascii=False))
+
+
+def iter_chunks(entities, chunk_size, max_bytes=None, size=json_size):
+    """
+    Split an iterable of entities in lists of chunk_size elements (the last one could be smaller)
+    :param entities: iterable of entities
+    :param chunk_size: max number of entities per chunk
+    :param max_bytes: max size of the entities of a chunk, with a separator per entity (None does not limit it).
+    An entity bigger than max_bytes is put alone in a chunk
+    :param size: function returning the size of an entity
+    :return generator of lists
+    """
+    chunk = []
+    chunk_bytes = 0
+    for entity in entities:
+        if max_bytes is not None:
+            entity_bytes = size(entity) + 1
+            if chunk and chunk_bytes + entity_bytes > max_bytes:
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+            chunk_bytes += entity_bytes
+        chunk.append(entity)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+    if chunk:
+        yield chunk
+
+
+class BulkLoadReport(object):
+    """
+    Result of a bulk load: counters, throughput and the chunks which failed (to be retried)
+    """
+
+    def __init__(self):
+        self.entities = 0
+        self.chunks = 0
+        self.failed_entities = 0
+        self.failed_chunks = []
+        self.start_time = time.time()
+        self.end_time = None
+
+    def add(self, chunk, status_code, error):
+        """
+        account the result of a chunk
+        :param chunk: list of entities sent
+        :param status_code: http status code (None if the request was not sent)
+        :param error: error text (None if the chunk was loaded)
+        """
+        self.chunks += 1
+        self.entities += len(chunk)
+        if error is not None:
+            self.failed_entities += len(chunk)
+            self.failed_chunks.append({'entities': chunk, 'status_code': status_code, 'error': error})
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def elapsed(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def entities_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return (self.entities - self.failed_entities) / elapsed
+
+    def __str__(self):
+        return 'entities: %s, chunks: %s, failed chunks: %s, failed entities: %s, elapsed: %.2fs, %.1f entities/s' % (
+            self.entities, self.chunks, len(self.failed_chunks), self.failed_entities, self.elapsed(),
+            self.entities_per_second())
+
+
+class BulkDeleteReport(object):
+    """
+    Result of a bulk delete: counters, throughput and the ids which could not be deleted
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.deleted = 0
+        self.not_found = 0
+        self.failed = []
+        self.start_time = time.time()
+        self.end_time = None
+
+    def add(self, item_id, status_code, error):
+        """
+        account the result of a delete
+        :param item_id: id of the deleted element
+        :param status_code: http status code (None if the request was not sent)
+        :param error: error text (None if the element was deleted)
+        """
+        if error is None:
+            self.deleted += 1
+        elif status_code == 404:
+            # already removed (by other client or a previous teardown)
+            self.not_found += 1
+        else:
+            self.failed.append({'id': item_id, 'status_code': status_code, 'error': error})
+
+    def done(self):
+        return self.deleted + self.not_found + len(self.failed)
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def elapsed(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def deletes_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return self.done() / elapsed
+
+    def __str__(self):
+        return 'total: %s, deleted: %s, not found: %s, failed: %s, elapsed: %.2fs, %.1f deletes/s' % (
+            self.total, self.deleted, self.not_found, len(self.failed), self.elapsed(), self.deletes_per_second())
+
+
+class CbBulkLoader(object):
+    """
+    Load a big number of entities in ContextBroker, using chunked /v2/op/update requests sent concurrently
+    >>> loader = CbBulkLoader(CbNgsi10v2Utils('127.0.0.1', pool_maxsize=8), workers=8)
+    >>> report = loader.load_file('entities.jsonl')
+    >>> report = loader.retry(report)
+    """
+
+    def __init__(self, cb, workers=4, max_in_flight=None, chunk_size=DEFAULT_CHUNK_SIZE, action_type='append',
+                 headers=None, params=None, max_chunk_bytes=MAX_CHUNK_BYTES, log_instance=None, log_verbosity='INFO'):
+        """
+        CB bulk loader constructor
+        :param cb: CbNgsi10v2Utils instance used to send the batches (its pool_maxsize should be >= workers)
+        :param workers: number of threads sending chunks
+        :param max_in_flight: max number of chunks read and not finished yet (by default 2 * workers)
+        :param chunk_size: max number of entities per batch request
+        :param action_type: batch action type (append, appendStrict, update, delete, replace)
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param params: query parameters of the batch requests
+        :param max_chunk_bytes: max size of the serialized entities of a batch (None does not limit it)
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('CbBulkLoader', log_verbosity)
+        self.cb = cb
+        self.workers = int(workers)
+        self.max_in_flight = int(max_in_flight) if max_in_flight is not None else 2 * self.workers
+        self.chunk_size = int(chunk_size)
+        self.action_type = action_type
+        self.headers = headers or {}
+        self.params = params
+        self.max_chunk_bytes = int(max_chunk_bytes) if max_chunk_bytes is not None else None
+
+    def __send_chunk(self, chunk):
+        """
+        send a chunk as a batch operation
+        :return tuple (chunk, status_code, error)
+        """
+        try:
+            response = self.cb.batch_update(chunk, action_type=self.action_type, headers=self.headers,
+                                            params=self.params)
+        except Exception, e:
+            return chunk, None, str(e)
+        if 200 <= response.status_code < 300:
+            return chunk, response.status_code, None
+        return chunk, response.status_code, response.text
+
+    def load(self, entities):
+        """
+        load the entities in chunks. The iterable is consumed lazily, so only max_in_flight chunks are in memory
+        :param entities: iterable of entities (dict), in the same format used in create_entity
+        :return BulkLoadReport
+        """
+        report = BulkLoadReport()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        lock = threading.Lock()
+
+        def done(result):
+            # run in the result thread of the pool, it must not raise (the next results would not be handled)
+            try:
+                with lock:
+                    report.add(*result)
+                if result[2] is not None:
+                    self.log.warning('Chunk failed (%s): %s' % (result[1], result[2]))
+            except Exception, e:
+                self.log.error('Chunk result not accounted: %s' % e)
+            finally:
+                in_flight.release()
+
+        pool = ThreadPool(self.workers)
+        try:
+            for chunk in iter_chunks(entities, self.chunk_size, self.max_chunk_bytes):
+                in_flight.acquire()
+                pool.apply_async(self.__send_chunk, (chunk,), callback=done)
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+        report.finish()
+        self.log.info('Bulk load finished. %s' % report)
+        return report
+
+    def load_file(self, filename):
+        """
+        load the entities stored in a JSON-lines file (one entity per line)
+        :param filename: path to the file
+        :return BulkLoadReport
+        """
+        return self.load(iter_json_lines(filename))
+
+    def retry(self, report):
+        """
+        send again the failed chunks of a previous load
+        :param report: BulkLoadReport of the previous load
+        :return BulkLoadReport of the retry
+        """
+        return self.load(entity for failed in report.failed_chunks for entity in failed['entities'])
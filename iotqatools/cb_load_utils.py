@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import sys
+import random
+import threading
+import time
+from getopt import getopt, GetoptError
+from multiprocessing.pool import ThreadPool
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.histogram_utils import Histogram
+from iotqatools.helpers_utils import LogLevelConfiguration
+from iotqatools.iot_logger import get_logger
+
+# operation name -> http method used in /v2/entities/<entity_id>/attrs
+OPERATIONS = {
+    'append': 'post',   # update_entity with POST (attributes are appended or updated)
+    'update': 'patch',  # update_entity with PATCH (attributes must exist)
+    'replace': 'put',   # update_entity with PUT (all the attributes are replaced)
+    'read': 'get'       # get_entity_attrs
+}
+DEFAULT_MIX = {'update': 80, 'append': 10, 'read': 10}
+
+
+class LoadStats(object):
+    """
+    Latency histogram (microseconds), requests and errors per operation type
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.errors = {}
+        self.start_time = time.time()
+        self.end_time = None
+
+    def record(self, operation, seconds, error):
+        with self.lock:
+            if operation not in self.histograms:
+                self.histograms[operation] = Histogram()
+                self.errors[operation] = 0
+            self.histograms[operation].record_seconds(seconds)
+            if error:
+                self.errors[operation] += 1
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def report(self):
+        """
+        :return text table with requests, errors, throughput and latency percentiles (ms) per operation
+        """
+        elapsed = (self.end_time or time.time()) - self.start_time
+        lines = ['%-10s %9s %8s %7s %9s %9s %9s %9s %9s' % ('operation', 'requests', 'errors', 'error%', 'req/s',
+                                                           'p50(ms)', 'p95(ms)', 'p99(ms)', 'max(ms)')]
+        total = Histogram()
+        total_errors = 0
+        for operation in sorted(self.histograms) + ['total']:
+            if operation == 'total':
+                histogram, errors = total, total_errors
+            else:
+                histogram, errors = self.histograms[operation], self.errors[operation]
+                total.merge(histogram)
+                total_errors += errors
+            summary = histogram.summary()
+            lines.append('%-10s %9d %8d %7.2f %9.1f %9.2f %9.2f %9.2f %9.2f' % (
+                operation, histogram.count, errors, 100.0 * errors / max(histogram.count, 1),
+                histogram.count / max(elapsed, 0.000001), summary['p50'] / 1000.0, summary['p95'] / 1000.0,
+                summary['p99'] / 1000.0, summary['max'] / 1000.0))
+        return '\n'.join(lines)
+
+
+class CbLoadDriver(object):
+    """
+    Drive entity attribute updates against ContextBroker, either at a fixed rate (open loop, Poisson arrivals)
+    or with N virtual users sending requests one after another (closed loop)
+    >>> driver = CbLoadDriver(CbNgsi10v2Utils('127.0.0.1', pool_maxsize=50), entities=100)
+    >>> stats = driver.run_open_loop(rps=200, duration=60)
+    >>> print stats.report()
+    """
+
+    def __init__(self, cb, entities=100, entity_prefix='load_entity', entity_type='Thing',
+                 attributes=('temperature',), mix=None, headers=None, seed=None, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        CB load driver constructor
+        :param cb: CbNgsi10v2Utils instance (its pool_maxsize should be >= the number of workers/users)
+        :param entities: number of entities used (<entity_prefix>_0 ... <entity_prefix>_N-1)
+        :param entity_prefix: entity id prefix
+        :param entity_type: entity type, sent as query parameter
+        :param attributes: attribute names updated in each request
+        :param mix: dict operation -> weight, operations: append, update, replace and read (see OPERATIONS)
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param seed: random seed, to repeat the same sequence of requests. Each virtual user (closed loop) or
+                     request (open loop) uses its own generator, seeded from this one
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('CbLoadDriver', log_verbosity)
+        self.cb = cb
+        self.entity_ids = ['%s_%s' % (entity_prefix, i) for i in range(int(entities))]
+        self.entity_type = entity_type
+        self.attributes = list(attributes)
+        self.headers = headers or {}
+        self.random = random.Random(seed)
+        mix = mix or DEFAULT_MIX
+        for operation in mix:
+            if operation not in OPERATIONS:
+                raise Exception('Wrong operation "%s" in mix, allowed: %s' % (operation, ', '.join(OPERATIONS)))
+        self.operations = [operation for operation in sorted(mix) if mix[operation] > 0]
+        self.cumulative_weights = []
+        total = 0
+        for operation in self.operations:
+            total += mix[operation]
+            self.cumulative_weights.append(total)
+
+    def __worker_random(self):
+        """
+        create a random generator for a worker, seeded from the driver one (only used by the caller thread)
+        """
+        return random.Random(self.random.getrandbits(64))
+
+    def __choose_operation(self, rand):
+        point = rand.random() * self.cumulative_weights[-1]
+        for pos in range(len(self.operations)):
+            if point < self.cumulative_weights[pos]:
+                return self.operations[pos]
+        return self.operations[-1]
+
+    def create_entities(self):
+        """
+        create (or update) the entities used by the load, so update operations do not fail
+        """
+        entities = []
+        for entity_id in self.entity_ids:
+            entity = {'id': entity_id, 'type': self.entity_type}
+            for attribute in self.attributes:
+                entity[attribute] = {'value': 0}
+            entities.append(entity)
+        for pos in range(0, len(entities), 100):
+            self.cb.batch_update(entities[pos:pos + 100], 'append', headers=self.headers)
+
+    def send(self, operation, rand=None):
+        """
+        send one request of the given operation to a random entity
+        :param operation: operation name (see OPERATIONS)
+        :param rand: random generator used to choose the entity and the values (default is the driver one)
+        :return response
+        """
+        rand = rand or self.random
+        entity_id = rand.choice(self.entity_ids)
+        params = {'type': self.entity_type}
+        if operation == 'read':
+            return self.cb.get_entity_attrs(entity_id, headers=dict(self.headers), params=params)
+        payload = {}
+        for attribute in self.attributes:
+            payload[attribute] = {'value': rand.randint(0, 1000)}
+        return self.cb.update_entity(payload, entity_id, headers=dict(self.headers), params=params,
+                                     method=OPERATIONS[operation])
+
+    def __timed_send(self, stats, operation, scheduled, rand):
+        """
+        send a request and record its latency since it was scheduled (so queueing delay is not omitted)
+        """
+        error = True
+        try:
+            response = self.send(operation, rand)
+            error = response.status_code >= 400
+        except Exception, e:
+            self.log.debug('Request error: %s' % e)
+        stats.record(operation, time.time() - scheduled, error)
+
+    def run_open_loop(self, rps, duration=None, requests=None, workers=100):
+        """
+        send requests at a target rate, with exponential inter-arrival times (Poisson process). If the requests
+        can not be sent on time (all workers busy), they wait and the wait is included in their latency
+        :param rps: target requests per second
+        :param duration: seconds of load (if requests is None)
+        :param requests: total number of requests
+        :param workers: max number of requests in progress
+        :return LoadStats
+        """
+        stats = LoadStats()
+        pool = ThreadPool(int(workers))
+        end_time = stats.start_time + duration if duration is not None else None
+        scheduled = stats.start_time
+        sent = 0
+        try:
+            while (requests is None or sent < requests) and (end_time is None or scheduled < end_time):
+                scheduled += self.random.expovariate(rps)
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                rand = self.__worker_random()
+                pool.apply_async(self.__timed_send, (stats, self.__choose_operation(rand), scheduled, rand))
+                sent += 1
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+        stats.finish()
+        return stats
+
+    def run_closed_loop(self, users, duration=None, requests=None, think_time=0):
+        """
+        run N virtual users, each one sends a request when the previous one finishes
+        :param users: number of virtual users (threads)
+        :param duration: seconds of load (if requests is None)
+        :param requests: total number of requests
+        :param think_time: seconds waited by each user between requests
+        :return LoadStats
+        """
+        stats = LoadStats()
+        end_time = stats.start_time + duration if duration is not None else None
+        counter = {'sent': 0}
+        lock = threading.Lock()
+
+        def user(rand):
+            while end_time is None or time.time() < end_time:
+                with lock:
+                    if requests is not None and counter['sent'] >= requests:
+                        return
+                    counter['sent'] += 1
+                self.__timed_send(stats, self.__choose_operation(rand), time.time(), rand)
+                if think_time:
+                    time.sleep(think_time)
+
+        threads = [threading.Thread(target=user, args=(self.__worker_random(),)) for i in range(int(users))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.finish()
+        return stats
+
+
+def usage():
+    """
+    Print usage message
+    """
+    print('Usage: python -m iotqatools.cb_load_utils --host <host> [options]')
+    print('')
+    print('Parameters:')
+    print("  --host <host>: CB host (default is '127.0.0.1')")
+    print("  --port <port>: CB port (default is 1026)")
+    print("  --mode <open|closed>: open loop (fixed rate) or closed loop (virtual users) (default is open)")
+    print("  --rps <rps>: target requests per second in open mode (default is 100)")
+    print("  --users <n>: virtual users in closed mode, max requests in progress in open mode (default is 10)")
+    print("  --duration <secs>: seconds of load (default is 60)")
+    print("  --requests <n>: total number of requests (instead of duration)")
+    print("  --entities <n>: number of entities (default is 100)")
+    print("  --type <type>: entity type (default is Thing)")
+    print("  --attributes <a,b>: attributes updated in each request (default is temperature)")
+    print("  --mix <op=weight,...>: operations mix, ops: append, update, replace, read (default is %s)" %
+          ','.join('%s=%s' % (op, DEFAULT_MIX[op]) for op in sorted(DEFAULT_MIX)))
+    print("  --service <service>: Fiware-Service header")
+    print("  --servicepath <path>: Fiware-ServicePath header")
+    print("  --token <token>: X-Auth-Token header")
+    print("  --no-create: do not create the entities before the load")
+    print("  -u: print this usage message")
+
+
+def main(argv):
+    try:
+        opts, args = getopt(argv, 'u', ['host=', 'port=', 'mode=', 'rps=', 'users=', 'duration=', 'requests=',
+                                        'entities=', 'type=', 'attributes=', 'mix=', 'service=', 'servicepath=',
+                                        'token=', 'no-create'])
+    except GetoptError, e:
+        print(str(e))
+        usage()
+        return 1
+
+    options = {'--host': '127.0.0.1', '--port': '1026', '--mode': 'open', '--rps': '100', '--users': '10',
+               '--duration': '60', '--entities': '100', '--type': 'Thing', '--attributes': 'temperature'}
+    for opt, arg in opts:
+        if opt == '-u':
+            usage()
+            return 0
+        options[opt] = arg
+
+    headers = {}
+    if '--service' in options:
+        headers['Fiware-Service'] = options['--service']
+    if '--servicepath' in options:
+        headers['Fiware-ServicePath'] = options['--servicepath']
+    if '--token' in options:
+        headers['X-Auth-Token'] = options['--token']
+    mix = None
+    if '--mix' in options:
+        mix = dict((op.split('=')[0], float(op.split('=')[1])) for op in options['--mix'].split(','))
+    requests = int(options['--requests']) if '--requests' in options else None
+    duration = None if requests is not None else float(options['--duration'])
+    users = int(options['--users'])
+
+    # request logging is too expensive during a load
+    LogLevelConfiguration.default_log_level = 'ERROR'
+    cb = CbNgsi10v2Utils(options['--host'], port=options['--port'], log_verbosity='ERROR', pool_maxsize=users)
+    driver = CbLoadDriver(cb, entities=options['--entities'], entity_type=options['--type'],
+                          attributes=options['--attributes'].split(','), mix=mix, headers=headers)
+    if '--no-create' not in options:
+        driver.create_entities()
+    if options['--mode'] == 'closed':
+        stats = driver.run_closed_loop(users, duration=duration, requests=requests)
+    else:
+        stats = driver.run_open_loop(float(options['--rps']), duration=duration, requests=requests, workers=users)
+    cb.close()
+    print(stats.report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
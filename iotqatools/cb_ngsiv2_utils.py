@@ -26,11 +26,17 @@ __author__ = 'Manu'
 
 import requests
 import json
+from multiprocessing.pool import ThreadPool
 
 from iotqatools.iot_logger import get_logger
 from requests.exceptions import RequestException
 from iotqatools.iot_tools import PqaTools
-from helpers_utils import convert_str_to_list, remove_quote, string_generator, mapping_quotes, generate_date_zulu, generate_timestamp
+from iotqatools.cb_payload_utils import EncodedJson, EntityPayloadTemplate, checked_json
+from iotqatools import json_utils
+from iotqatools.cb_bulk_utils import BulkDeleteReport
+from iotqatools.pagination_utils import iter_pages
+from iotqatools.transport_utils import client_transport
+from helpers_utils import remove_quote, string_generator, mapping_quotes, generate_date_zulu, generate_timestamp
 
 __logger__ = get_logger("CB Utils")
 
@@ -66,7 +72,14 @@ class CbNgsi10v2Utils(object):
                  log_verbosity='DEBUG',
                  default_headers={'Accept': 'application/json'},
                  verify=False,
-                 check_json=True):
+                 check_json=True,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 pool_block=False,
+                 max_retries=0,
+                 keep_alive=True,
+                 transport=None,
+                 timeout=None):
         """
         CB Utils constructor
         :param instance:
@@ -88,6 +101,13 @@ class CbNgsi10v2Utils(object):
         :param default_headers:
         :param verify: ssl check
         :param check_json:
+        :param pool_connections: number of host connection pools kept by the session
+        :param pool_maxsize: max number of connections kept alive per host
+        :param pool_block: block when no free connection is available in the pool, instead of opening a new one
+        :param max_retries: retries done by the http adapter (int or urllib3 Retry object)
+        :param keep_alive: reuse connections between requests (if False, "Connection: close" is sent)
+        :param transport: HttpTransport shared with other clients (the pool parameters are not used then)
+        :param timeout: default timeout of the requests, seconds or tuple (connect, read). None waits forever
         """
         # initialize logger
         if log_instance is not None:
@@ -114,6 +134,12 @@ class CbNgsi10v2Utils(object):
         self.verify = verify
         self.check_json = check_json
 
+        # initialize http transport, its connection pool is reused by all requests
+        self.transport, self.own_transport = client_transport(
+            transport, pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block,
+            max_retries=max_retries, keep_alive=keep_alive, timeout=timeout, log_instance=self.log)
+        self.session = self.transport.session
+
         # initialize context dictionaries
         self.entities_parameters = {}
         self.__init_entity_context_dict()
@@ -122,6 +148,19 @@ class CbNgsi10v2Utils(object):
         self.previous_value = {'name': None, 'type': None, 'value': None}
 
 
+    def close(self):
+        """
+        close the http session and all pooled connections (only if the transport is not shared)
+        """
+        if self.own_transport:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def __init_entity_context_dict(self):
         """
         initialize entity_context dict (used in create, update or append entity)
@@ -181,22 +220,29 @@ class CbNgsi10v2Utils(object):
         """
         Send a request to a specific url in a specifying type of http request
         """
+        self.request_string = str(payload) if payload is not None else ''
+        self.response_string = ''
+        return self.__request(method, url, headers, payload, verify, query)
+
+    def __request(self, method, url, headers=None, payload=None, verify=None, query=None):
+        """
+        Send a request without storing its context in the instance (it can be used from other threads)
+        """
 
         parameters = {
             'method': method,
             'url': url,
         }
 
-        self.request_string = ''
-        self.response_string = ''
-
         if headers is not None:
             parameters.update({'headers': headers})
 
         if payload is not None:
-            self.request_string = str(payload)
-            if self.check_json:
-                parameters.update({'data': json.dumps(payload, ensure_ascii=False).encode('utf-8')})
+            if isinstance(payload, EncodedJson):
+                # already serialized (see cb_payload_utils)
+                parameters.update({'data': payload})
+            elif self.check_json:
+                parameters.update({'data': json_utils.dumps(payload, ensure_ascii=False)})
             else:
                 parameters.update({'data': payload})
 
@@ -211,7 +257,7 @@ class CbNgsi10v2Utils(object):
 
         # Send the requests
         try:
-            response = requests.request(**parameters)
+            response = self.transport.request(**parameters)
         except RequestException, e:
             PqaTools.log_requestAndResponse(url=url, headers=headers, params=query, data=payload, comp='CB',
                                             method=method)
@@ -220,8 +266,6 @@ class CbNgsi10v2Utils(object):
         # Log data
         PqaTools.log_fullRequest(comp='CB', response=response, params=parameters)
 
-        response_string = response.text
-
         return response
 
     def get_request_response_string(self):
@@ -230,152 +274,6 @@ class CbNgsi10v2Utils(object):
         """
         return self.request_string, self.response_string
 
-    def __create_metadata(self, metadata_number, metadata_name, metadata_type, metadata_value):
-        """
-        create N metadatas dynamically. The value could be random value ("random").
-        :param metadata_number: number of metadatas
-        :param metadata_name: name of metadatas with a prefix plus a consecutive
-        :param metadata_value: metadatas value.
-        :param metadata_typee: metadatas type.
-        :return metadatas dict
-        """
-        meta_dict = {}
-        if metadata_name is not None:
-            for i in range(int(metadata_number)):
-                if int(metadata_number) > 1:
-                    name = "%s_%s" % (metadata_name, str(i))
-                else:
-                    name = metadata_name
-                meta_dict[name] = {}
-                if metadata_value is not None:
-                    meta_dict[name]['value'] = metadata_value
-                if metadata_type != 'none':
-                    meta_dict[name]['type'] = metadata_type
-        return meta_dict
-
-
-    def __create_attributes(self, entity_context, mode):
-        """
-        create attributes with entity context
-        :return (dict) attribute list
-        """
-        attr = {}
-        attributes = {}
-        metadata = {}
-
-        # create metadatas if they exist
-        if int(entity_context['metadatas_number']) > 0:
-            metadata = self.__create_metadata(entity_context['metadatas_number'], entity_context['metadatas_name'],
-                                              entity_context['metadatas_type'], entity_context['metadatas_value'])
-        __logger__.debug("Metadatas: %s" % str(metadata))
-
-        # create attributes
-        if mode == 'normalized':
-            if metadata != {}:
-                attr['metadata'] = metadata
-            if entity_context['attributes_type'] != "none":
-                attr['type'] = entity_context['attributes_type']
-            if entity_context['attributes_value'] is not None:
-                attr['value'] = entity_context['attributes_value']
-        elif mode == 'keyValues':
-            if entity_context['attributes_value'] is not None:
-                attr = entity_context['attributes_value']
-
-        if entity_context['attributes_name'] is not None:
-            for i in range(int(entity_context['attributes_number'])):
-                if int(entity_context['attributes_number']) > 1:
-                    name = "%s_%s" % (entity_context['attributes_name'], str(i))
-                else:
-                    name = entity_context['attributes_name']
-                attributes[name] = attr
-        return attributes
-
-
-    def __create_attribute_raw(self, entity_context, mode):
-        """
-        create an attribute with entity context in raw mode
-        :return (string)
-        Hint: to create N attributes use & as separator. Ev:
-                  | parameter           | value                                 |
-                  | entities_type       | "house"                               |
-                  | entities_id         | "room_2"                              |
-                  | attributes_name     | "temperature"&"pressure"&"humidity"   |
-                  | attributes_value    | 34&"high"&"random=3"                  |
-                  | attributes_type     | "celsius"&&"porcent"                  |
-                  | attributes_metadata | true&false                            |
-                  | metadatas_name      | "very_hot"                            |
-                  | metadatas_type      | "alarm"                               |
-                  | metadatas_value     | "default"                             |
-        """
-        attributes_final = ''
-        separator = "&"
-        name_list = []
-        values_list = []
-        type_list = []
-        meta_names_list = []
-        meta_values_list = []
-        meta_types_list = []
-        # create N attributes with/without attribute type and metadatas (with/without type)
-        if entity_context['attributes_name'] is not None:
-            name_list = convert_str_to_list(entity_context['attributes_name'], separator)
-        if entity_context['attributes_value'] is not None:
-            values_list = convert_str_to_list(entity_context['attributes_value'], separator)
-        if entity_context['attributes_type'] is not None:
-            while entity_context['attributes_type'].find("&&") >= 0:
-                entity_context['attributes_type'] = entity_context['attributes_type'].replace("%s%s" % (separator, separator), '%s"none"%s' % (separator, separator))
-            type_list = convert_str_to_list(entity_context['attributes_type'], separator)
-        if entity_context['metadatas_name'] is not None:
-            meta_names_list = convert_str_to_list(entity_context['metadatas_name'], separator)
-        if entity_context['metadatas_value'] is not None:
-            meta_values_list = convert_str_to_list(entity_context['metadatas_value'], separator)
-        if entity_context['metadatas_type'] is not None:
-            while entity_context['metadatas_type'].find("&&") >= 0:
-                entity_context['metadatas_type'] = entity_context['metadatas_type'].replace("%s%s" % (separator, separator), '%s"none"%s' % (separator, separator))
-            meta_types_list = convert_str_to_list(entity_context['metadatas_type'], separator)
-
-        for pos in range(len(name_list)):
-            attribute_str = ''
-            # create a entity with N attributes in normalized mode
-            if mode == 'normalized':
-                # append attribute type if it does exist
-                if (len(type_list) > pos) and (remove_quote(type_list[pos]) != 'none'):
-                    attribute_str = '"type": %s' % type_list[pos]
-
-                # append metadata if it does exist
-                if (len(meta_names_list) > pos) and meta_names_list[pos] != None:
-                    if (len(meta_types_list) > pos) and remove_quote(meta_types_list[pos]) != 'none':
-                        metadata = '"metadata": {%s: {"value": %s, "type": %s}}' % (meta_names_list[pos],
-                                                                                    meta_values_list[pos],
-                                                                                    meta_types_list[pos])
-                    else:
-                        metadata = '"metadata": {%s: {"value": %s}}' % (meta_names_list[pos],
-                                                                        meta_values_list[pos])
-                    if attribute_str != '':
-                        attribute_str = '%s, %s' % (attribute_str, metadata)
-                    else:
-                        attribute_str = metadata
-
-                # append attribute value if it exist
-                if values_list[pos] is not None:
-                    if attribute_str != '':
-                        attribute_str = '%s, "value": %s' % (attribute_str, values_list[pos])
-                    else:
-                        attribute_str = '"value": %s' % values_list[pos]
-
-                # append attribute name
-                if name_list[pos] is not None:
-                    attribute_str = u'%s:{%s},' % (name_list[pos], attribute_str)
-                attributes_final = "%s %s" % (attributes_final, attribute_str)
-
-            # create a entity with N attributes in keyValues mode
-            elif mode == 'keyValues' and entity_context['attributes_name'] is not None:
-                attribute_str = u'%s: %s,' % (name_list[pos], values_list[pos])
-                attributes_final = "%s %s" % (attributes_final, attribute_str)
-
-        __logger__.debug("Atribute with raw values: %s" % attributes_final[:-1])
-        return attributes_final[:-1]
-
-
     def __create_subsc_subject_raw(self, subscription_context):
         """
         create subject field (entities and condition) to subscriptions in raw mode
@@ -718,13 +616,12 @@ class CbNgsi10v2Utils(object):
              "value": "2017-06-17T07:21:24.238Z"  -->  "type: "date"
         :return responses list
         """
-        entity = ''
-        attribute_str = ''
         self.entity_context['entities_number'] = 1
         self.entity_context['attributes_number'] = 1
 
         # create attribute with/without attribute type and metadatas (with/without type)
-        attribute_str = self.__create_attribute_raw(self.entity_context, mode)
+        template = EntityPayloadTemplate(self.entity_context, mode, raw=True)
+        attribute_str = template.attributes_text
 
         # if options=keyValues the attribute values is all. Attribute_type and metadata(s) are restarted
         if 'options' in self.entities_parameters and self.entities_parameters['options'] == 'keyValues':
@@ -735,20 +632,8 @@ class CbNgsi10v2Utils(object):
             self.entity_context['metadatas_name'] = None
 
         # create entity with attribute value in raw
-        if self.entity_context['entities_type'] != 'Thing':
-            entity = '"type": %s' % self.entity_context['entities_type']
-        if self.entity_context['entities_id'] is not None:
-            if entity != '':
-                entity = '%s, "id": %s' % (entity, self.entity_context['entities_id'])
-            else:
-                entity = '"id": %s' % self.entity_context['entities_id']
-        if attribute_str != '':
-            payload = u'{%s, %s}' % (entity, attribute_str)
-        else:
-            payload = u'{%s}' % entity
-
-        resp = self.__send_request('post', self.path_entities, headers=self.headers, payload=json.loads(payload),
-                                   query=self.entities_parameters)
+        resp = self.__send_request('post', self.path_entities, headers=self.headers,
+                                   payload=checked_json(template.render()), query=self.entities_parameters)
         self.action_type = 'append'
         return resp
 
@@ -936,34 +821,34 @@ class CbNgsi10v2Utils(object):
         :query parameters --> No
         :return responses
         """
-        payload = "{"
+        fields = []
         # description field
         if self.subscription_context['description'] is not None:
-            payload = u'%s "description": %s,' % (payload, self.subscription_context['description'])
+            fields.append(u'"description": %s' % self.subscription_context['description'])
 
         # subject fields
-        payload = u'%s %s,' % (payload, self.__create_subsc_subject_raw(self.subscription_context))
+        fields.append(self.__create_subsc_subject_raw(self.subscription_context))
 
         # notification fields
-        payload = u'%s %s,' % (payload, self.__create_subsc_notification_raw(self.subscription_context))
+        fields.append(self.__create_subsc_notification_raw(self.subscription_context))
 
         # expires field
         if self.subscription_context['expires'] is not None:
-            payload = u'%s "expires": %s,' % (payload, self.subscription_context['expires'])
+            fields.append(u'"expires": %s' % self.subscription_context['expires'])
 
         # status field
         if self.subscription_context['status'] is not None:
-            payload = u'%s "status": %s,' % (payload, self.subscription_context['status'])
+            fields.append(u'"status": %s' % self.subscription_context['status'])
 
-       # throttling field
+        # throttling field
         if self.subscription_context['throttling'] is not None:
-            payload =  u'%s "throttling": %s,'  % (payload, self.subscription_context['throttling'])
+            fields.append(u'"throttling": %s' % self.subscription_context['throttling'])
 
-        # payload
-        payload = "%s }" % payload[:-1]
+        # payload, checked and sent as it is written (without serializing it again)
+        payload = u'{%s}' % u', '.join(fields)
         __logger__.debug("subscription: %s" % payload)
-        resp = self.__send_request('post', self.path_subscriptions, headers=self.headers, payload=json.loads(payload),
-                                   query=self.entities_parameters)
+        resp = self.__send_request('post', self.path_subscriptions, headers=self.headers,
+                                   payload=checked_json(payload), query=self.entities_parameters)
         return resp
 
     def update_or_append_an_attribute_by_id(self, method, entity_id, mode):
@@ -990,12 +875,12 @@ class CbNgsi10v2Utils(object):
         self.entity_context = self.__random_values(RANDOM_ENTITIES_LABEL, self.entity_context)
 
         # create attributes with entity context
-        entities = self.__create_attributes(self.entity_context, mode)
+        entities = EntityPayloadTemplate(self.entity_context, mode).render_attributes()
 
         path = self.path_update_entity.replace('entityId', self.entity_context['entities_id'])
 
         # FIXME: it doesn't make sense to send this operation without payload...
-        if entities != {}:
+        if entities is not None:
             resp = self.__send_request(method, path, headers=self.headers, payload=entities, query=self.entities_parameters)
         else:
             resp = self.__send_request(method, path, headers=self.headers, query=self.entities_parameters)
@@ -1080,35 +965,41 @@ class CbNgsi10v2Utils(object):
         :param accumulate: entities accumulate with different properties
         :return http response
         """
-        entity = '"entities": ['
         self.entities_parameters = parameters
         mode = 'normalized'
 
         if 'options' in self.entities_parameters:
             mode = self.entities_parameters['options']
 
-        for item in accumulate:
-            # create attributes from entity context in raw mode
-            attributes = self.__create_attribute_raw(item, mode)
-            # create entity in raw mode
-            if item['entities_type'] != 'Thing':
-                entity = '%s {"type": %s' % (entity, item['entities_type'])
-            if item['entities_id'] is not None:
-                if item['entities_type'] != 'Thing':
-                    entity = '%s, "id": %s' % (entity, item['entities_id'])
-                else:
-                    entity = '%s {"id": %s' % (entity, item['entities_id'])
-            if attributes != '':
-                entity = u'%s, %s},' % (entity, attributes)
-            else:
-                entity = u'%s},' % entity
+        # create entities from entity contexts in raw mode
+        entities = [EntityPayloadTemplate(item, mode, raw=True).render() for item in accumulate]
 
-        payload = u'{"actionType": "%s", %s]}' % (mapping_quotes(op), entity[:-1]) # mapping_quote from helpers_utils.py
+        payload = checked_json('{"actionType": "%s", "entities": [%s]}' % (
+            mapping_quotes(op).encode('utf-8'), ', '.join(entities)))  # mapping_quote from helpers_utils.py
         __logger__.debug("payload: %s" % payload)
 
-        resp = self.__send_request('post', self.path_batch_update, headers=self.headers, query=self.entities_parameters, payload=json.loads(payload))
+        resp = self.__send_request('post', self.path_batch_update, headers=self.headers, query=self.entities_parameters, payload=payload)
         return resp
 
+    def batch_update(self, entities, action_type='append', headers={}, params=None):
+        """
+        create, update and/or delete several entities in a single batch operation
+        :request -> POST /v2/op/update
+        :payload --> Yes
+        :query parameters --> Yes
+        :param entities: list of entities (dict), in the same format used in create_entity
+        :param action_type: kind of update action to do (append, appendStrict, update, delete, replace)
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param params: query parameters
+        :return http response
+        """
+        request_headers = dict(headers)
+        request_headers.update(self.headers)
+        request_headers.update({'content-type': 'application/json'})
+        payload = {'actionType': action_type, 'entities': entities}
+        return self.__send_request('post', self.path_batch_update, headers=request_headers, payload=payload,
+                                   query=params, verify=None)
+
     def batch_query(self, parameters):
         """
         returns an Array containing one object per matching entity
@@ -1245,6 +1136,51 @@ class CbNgsi10v2Utils(object):
 
         return self.__send_request('get', self.path_entities, headers=headers, verify=None, query=params)
 
+    def iter_entities(self, headers={}, params=None, page_size=100, prefetch=True):
+        """
+        Iterate over all the entities which match the criteria in params (see list_entities), walking Orion pages
+        with limit/offset and "options=count". Only the current page and the next one are kept in memory.
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param params: query parameters (limit and options=count are managed by the iterator, offset is the start)
+        :param page_size: number of entities requested per page (Orion allows 1000 as max)
+        :param prefetch: request the next page in a background thread while the current one is consumed
+        :return generator of entities (dict)
+        """
+        return self.__iter_pages(self.path_entities, headers, params, page_size, prefetch)
+
+    def iter_entity_types(self, headers={}, params=None, page_size=100, prefetch=True):
+        """
+        Iterate over all the entity types (GET /v2/types), walking Orion pages. See iter_entities
+        :return generator of entity types (dict)
+        """
+        return self.__iter_pages(self.path_types, headers, params, page_size, prefetch)
+
+    def __iter_pages(self, url, headers, params, page_size, prefetch):
+        """
+        generator walking a paginated Orion resource (limit/offset). The total is taken from the Fiware-Total-Count
+        header (see pagination_utils.iter_pages)
+        """
+        page_headers = dict(headers)
+        page_headers.update(self.headers)
+        query = dict(params or {})
+        options = [option for option in str(query.get('options', '')).split(',') if option != '']
+        if 'count' not in options:
+            options.append('count')
+        query['options'] = ','.join(options)
+        query['limit'] = int(page_size)
+        offset = int(query.pop('offset', 0))
+
+        def fetch_page(page_offset):
+            page_query = dict(query)
+            page_query['offset'] = page_offset
+            # the pages could be requested in background, while the instance is used by the caller
+            response = self.__request('get', url, headers=page_headers, verify=None, query=page_query)
+            assert response.status_code == 200, 'ERROR: listing %s (offset %s) returns %s: %s' % (
+                url, page_offset, response.status_code, response.text)
+            return json_utils.response_json(response), response.headers.get('Fiware-Total-Count')
+
+        return iter_pages(fetch_page, page_size, offset, prefetch)
+
     def get_entity_attrs(self, entity_id, headers={}, params=None):
         """
         GET /v2/entities/{id}/attrs
@@ -1543,6 +1479,78 @@ class CbNgsi10v2Utils(object):
         # Make request
         return self.__send_request('delete', path, headers=self.headers, verify=None)
 
+    def iter_subscriptions(self, headers={}, params=None, page_size=100, prefetch=True, description_prefix=None,
+                           notification_url=None):
+        """
+        Iterate over all the subscriptions, walking Orion pages (see iter_entities). The filters are applied in the
+        client, Orion does not filter subscriptions
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param params: query parameters (limit and options=count are managed by the iterator, offset is the start)
+        :param page_size: number of subscriptions requested per page (Orion allows 1000 as max)
+        :param prefetch: request the next page in a background thread while the current one is consumed
+        :param description_prefix: only the subscriptions whose description starts with it
+        :param notification_url: only the subscriptions notifying to this url (http or httpCustom)
+        :return generator of subscriptions (dict)
+        """
+        for subscription in self.__iter_pages(self.path_subscriptions, headers, params, page_size, prefetch):
+            if description_prefix is not None and \
+                    not subscription.get('description', '').startswith(description_prefix):
+                continue
+            if notification_url is not None:
+                notification = subscription.get('notification', {})
+                url = notification.get('http', notification.get('httpCustom', {})).get('url')
+                if url != notification_url:
+                    continue
+            yield subscription
+
+    def delete_subscriptions(self, headers={}, description_prefix=None, notification_url=None, workers=8,
+                             page_size=1000, progress_every=1000):
+        """
+        Delete all the subscriptions matching the filters (see iter_subscriptions), sending the deletes concurrently.
+        The ids are collected before deleting, so the deletes do not move the pages being read.
+        Subscriptions already removed (404) are not failures
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param description_prefix: only the subscriptions whose description starts with it
+        :param notification_url: only the subscriptions notifying to this url
+        :param workers: max number of deletes sent at the same time (pool_maxsize should be >= workers)
+        :param page_size: number of subscriptions requested per page while collecting the ids
+        :param progress_every: log the progress every N deletes
+        :return BulkDeleteReport (its failed list can be used to retry)
+        """
+        delete_headers = dict(headers)
+        delete_headers.update(self.headers)
+        ids = [subscription['id'] for subscription in
+               self.iter_subscriptions(headers, page_size=page_size, description_prefix=description_prefix,
+                                       notification_url=notification_url)]
+        report = BulkDeleteReport(len(ids))
+        self.log.info('Deleting %s subscriptions' % len(ids))
+
+        def delete(sub_id):
+            path = self.path_subscriptions_by_id.replace('subscriptionId', sub_id)
+            try:
+                response = self.__request('delete', path, headers=delete_headers, verify=None)
+            except Exception, e:
+                return sub_id, None, str(e)
+            if response.status_code == 204:
+                return sub_id, response.status_code, None
+            return sub_id, response.status_code, response.text
+
+        pool = ThreadPool(int(workers))
+        try:
+            for result in pool.imap_unordered(delete, ids):
+                report.add(*result)
+                if result[2] is not None and result[1] != 404:
+                    self.log.warning('Subscription %s not deleted (%s): %s' % result)
+                if progress_every and report.done() % int(progress_every) == 0:
+                    self.log.info('Deleted subscriptions: %s' % report)
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+        report.finish()
+        self.log.info('Subscriptions delete finished. %s' % report)
+        return report
+
 
 if __name__ == '__main__':
     # Example if use of the library as a client
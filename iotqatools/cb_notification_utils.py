@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from getopt import getopt, GetoptError
+from multiprocessing.pool import ThreadPool
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.histogram_utils import Histogram
+from iotqatools.helpers_utils import LogLevelConfiguration
+from iotqatools.iot_logger import get_logger
+
+# attributes stamped in every update: sequence number and send time (epoch seconds)
+SEQ_ATTRIBUTE = 'seq'
+SENT_AT_ATTRIBUTE = 'sentAt'
+# sequence number of the entity when the subscriptions are created (notified once per subscription on creation)
+INITIAL_SEQ = -1
+DEFAULT_DESCRIPTION = 'notification latency benchmark'
+
+
+class NotificationLatencyStats(object):
+    """
+    Match the notifications received with the updates sent, by sequence number. Latency is the time from the
+    update being sent to the notification being received (both taken in this host), in microseconds
+    """
+
+    def __init__(self, subscriptions, rate=None):
+        """
+        :param subscriptions: number of subscriptions, each update is expected once per subscription
+        :param rate: target updates per second, reported with the achieved one
+        """
+        self.subscriptions = int(subscriptions)
+        self.rate = rate
+        # reentrant, report() reads the counters with the lock taken
+        self.lock = threading.RLock()
+        self.sent_times = {}
+        self.sent_count = 0
+        self.first_sent = None
+        self.last_sent = None
+        self.received_keys = set()
+        self.histogram = Histogram()
+        self.duplicated = 0
+        self.initial = 0
+        self.unknown = 0
+        self.update_errors = 0
+        self.first_received = None
+        self.last_received = None
+
+    def sent(self, seq, timestamp):
+        with self.lock:
+            self.sent_times[seq] = timestamp
+            self.sent_count += 1
+            if self.first_sent is None:
+                self.first_sent = timestamp
+            self.last_sent = timestamp
+
+    def update_failed(self, seq):
+        with self.lock:
+            self.sent_times.pop(seq, None)
+            self.update_errors += 1
+
+    def received(self, subscription_id, seq, timestamp):
+        """
+        account a notification
+        :param subscription_id: subscriptionId of the notification
+        :param seq: sequence number of the notified update
+        :param timestamp: epoch seconds when the notification was received
+        """
+        with self.lock:
+            if seq not in self.sent_times:
+                self.unknown += 1
+                return
+            key = (subscription_id, seq)
+            if key in self.received_keys:
+                self.duplicated += 1
+                return
+            self.received_keys.add(key)
+            self.histogram.record_seconds(timestamp - self.sent_times[seq])
+            if self.first_received is None:
+                self.first_received = timestamp
+            self.last_received = timestamp
+
+    def notified(self, notification, timestamp):
+        """
+        account the entities of a notification received (see NotificationHandler)
+        :param notification: NGSIv2 notification (dict)
+        :param timestamp: epoch seconds when the notification was received
+        """
+        for entity in notification['data']:
+            seq = entity.get(SEQ_ATTRIBUTE)
+            if isinstance(seq, dict):
+                seq = seq.get('value')
+            if seq is None or int(seq) == INITIAL_SEQ:
+                # initial notification of a new subscription, not caused by an update
+                with self.lock:
+                    self.initial += 1
+                continue
+            self.received(notification['subscriptionId'], int(seq), timestamp)
+
+    def expected(self):
+        with self.lock:
+            return len(self.sent_times) * self.subscriptions
+
+    def received_count(self):
+        with self.lock:
+            return len(self.received_keys)
+
+    def lost(self):
+        with self.lock:
+            return self.expected() - self.received_count()
+
+    def achieved_rate(self):
+        """
+        :return updates per second actually sent (lower than the target one if the updates took too long)
+        """
+        with self.lock:
+            if self.sent_count < 2 or self.last_sent <= self.first_sent:
+                return 0.0
+            return (self.sent_count - 1) / (self.last_sent - self.first_sent)
+
+    def report(self):
+        """
+        :return text with the counters and the update to notification latency percentiles (ms)
+        """
+        with self.lock:
+            summary = self.histogram.summary((50, 90, 95, 99, 99.9))
+            elapsed = (self.last_received or 0) - (self.first_received or 0)
+            lines = ['subscriptions: %s, updates: %s (%s errors), expected: %s, received: %s, lost: %s, '
+                     'duplicated: %s, initial: %s, unknown: %s, %.1f notifications/s' % (
+                         self.subscriptions, len(self.sent_times), self.update_errors, self.expected(),
+                         self.received_count(), self.lost(), self.duplicated, self.initial, self.unknown,
+                         self.received_count() / elapsed if elapsed > 0 else 0.0),
+                     'updates/s: %s target, %.1f achieved' % (self.rate if self.rate is not None else '-',
+                                                             self.achieved_rate()),
+                     '%9s %9s %9s %9s %9s %9s %9s' % ('min(ms)', 'p50(ms)', 'p90(ms)', 'p95(ms)', 'p99(ms)',
+                                                      'p99.9(ms)', 'max(ms)'),
+                     '%9.2f %9.2f %9.2f %9.2f %9.2f %9.2f %9.2f' % tuple(
+                         summary[name] / 1000.0 for name in ('min', 'p50', 'p90', 'p95', 'p99', 'p99.9', 'max'))]
+        return '\n'.join(lines)
+
+
+class NotificationHandler(BaseHTTPRequestHandler):
+    """
+    Receive NGSIv2 notifications, stamp them on arrival and account them in the server stats (any object with
+    notified(notification, timestamp), a lock and an unknown counter)
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.getheader('content-length', 0)))
+        received = time.time()
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        stats = self.server.stats
+        if stats is None:
+            return
+        try:
+            stats.notified(json.loads(body), received)
+        except (ValueError, KeyError, TypeError):
+            with stats.lock:
+                stats.unknown += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadedNotificationServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    stats = None
+
+
+class NotificationReceiver(object):
+    """
+    HTTP server receiving the notifications in a background thread
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, path='/notify'):
+        self.server = ThreadedNotificationServer((host, int(port)), NotificationHandler)
+        self.port = self.server.server_address[1]
+        self.path = path
+        self.thread = None
+
+    def url(self, notify_host):
+        """
+        :param notify_host: host name or ip used by ContextBroker to reach this receiver
+        :return notification url
+        """
+        return 'http://%s:%s%s' % (notify_host, self.port, self.path)
+
+    def reset(self, stats):
+        """
+        account the next notifications in stats
+        """
+        self.server.stats = stats
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class NotificationLatencyBenchmark(object):
+    """
+    Measure the time from an entity update to the notification arriving. N subscriptions are created on the
+    entity type, every update stamps a sequence number and its send time in the entity, and the notifications
+    are matched on receipt
+    >>> receiver = NotificationReceiver(port=10031).start()
+    >>> benchmark = NotificationLatencyBenchmark(CbNgsi10v2Utils('127.0.0.1'), receiver.url('10.0.0.2'))
+    >>> print benchmark.run(receiver, subscriptions=100, updates=200, rate=10).report()
+    """
+
+    def __init__(self, cb, notification_url, entity_id='latency_entity', entity_type='LatencyBenchmark',
+                 headers=None, description=DEFAULT_DESCRIPTION, workers=8, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        Notification latency benchmark constructor
+        :param cb: CbNgsi10v2Utils instance (its pool_maxsize should be >= workers)
+        :param notification_url: url of the receiver, as seen by ContextBroker
+        :param entity_id: id of the updated entity
+        :param entity_type: type of the updated entity, used in the subscriptions
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param description: description of the subscriptions, used to delete them at the end
+        :param workers: number of threads creating the subscriptions
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('NotificationLatencyBenchmark', log_verbosity)
+        self.cb = cb
+        self.notification_url = notification_url
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.headers = headers or {}
+        self.description = description
+        self.workers = int(workers)
+
+    def __subscription(self):
+        return {'description': self.description,
+                'subject': {'entities': [{'idPattern': '.*', 'type': self.entity_type}],
+                            'condition': {'attrs': [SEQ_ATTRIBUTE]}},
+                'notification': {'http': {'url': self.notification_url},
+                                 'attrs': [SEQ_ATTRIBUTE, SENT_AT_ATTRIBUTE]}}
+
+    def create_subscriptions(self, subscriptions):
+        """
+        create the subscriptions concurrently
+        """
+        payload = self.__subscription()
+
+        def create(pos):
+            response = self.cb.create_subscription(payload, headers=dict(self.headers))
+            return response.status_code == 201
+
+        pool = ThreadPool(self.workers)
+        try:
+            created = sum(pool.imap_unordered(create, range(int(subscriptions))))
+        finally:
+            pool.terminate()
+        assert created == int(subscriptions), 'ERROR: only %s of %s subscriptions created' % (created, subscriptions)
+        self.log.info('Created %s subscriptions' % created)
+
+    def delete_subscriptions(self):
+        return self.cb.delete_subscriptions(headers=dict(self.headers), description_prefix=self.description,
+                                            workers=self.workers)
+
+    def update(self, stats, seq):
+        """
+        send an update stamped with seq and the send time
+        """
+        sent_at = time.time()
+        stats.sent(seq, sent_at)
+        payload = {SEQ_ATTRIBUTE: {'value': seq, 'type': 'Number'},
+                   SENT_AT_ATTRIBUTE: {'value': sent_at, 'type': 'Number'}}
+        try:
+            response = self.cb.update_entity(payload, self.entity_id, headers=dict(self.headers),
+                                             params={'type': self.entity_type}, method='post')
+            if response.status_code >= 400:
+                stats.update_failed(seq)
+        except Exception, e:
+            self.log.debug('Update error: %s' % e)
+            stats.update_failed(seq)
+
+    def run(self, receiver, subscriptions, updates=100, rate=10.0, drain_timeout=30, keep_subscriptions=False):
+        """
+        create the subscriptions, send the updates at a fixed rate and wait for the notifications
+        :param receiver: NotificationReceiver started, reachable in notification_url
+        :param subscriptions: number of subscriptions on the entity type
+        :param updates: number of updates sent
+        :param rate: target updates per second (each one generates a notification per subscription). Updates are
+                     sent one after another, so the achieved rate is lower if they take longer than 1/rate
+        :param drain_timeout: seconds waited after the last update without receiving notifications
+        :param keep_subscriptions: do not delete the subscriptions at the end
+        :return NotificationLatencyStats
+        """
+        # the entity is created before subscribing, so its creation is not notified
+        self.cb.batch_update([{'id': self.entity_id, 'type': self.entity_type,
+                               SEQ_ATTRIBUTE: {'value': INITIAL_SEQ, 'type': 'Number'},
+                               SENT_AT_ATTRIBUTE: {'value': 0, 'type': 'Number'}}], 'append',
+                             headers=dict(self.headers))
+        stats = NotificationLatencyStats(subscriptions, rate)
+        receiver.reset(stats)
+        try:
+            self.create_subscriptions(subscriptions)
+            start = time.time()
+            for seq in range(int(updates)):
+                delay = start + seq / float(rate) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self.update(stats, seq)
+            if int(updates) > 1 and stats.achieved_rate() < 0.9 * rate:
+                self.log.warn('Updates sent at %.1f/s, the target was %s/s' % (stats.achieved_rate(), rate))
+            last_count = -1
+            last_progress = time.time()
+            while stats.lost() > 0 and time.time() - last_progress < drain_timeout:
+                if stats.received_count() != last_count:
+                    last_count = stats.received_count()
+                    last_progress = time.time()
+                time.sleep(0.1)
+        finally:
+            receiver.reset(None)
+            if not keep_subscriptions:
+                self.delete_subscriptions()
+        return stats
+
+
+def usage():
+    """
+    Print usage message
+    """
+    print('Usage: python -m iotqatools.cb_notification_utils --host <host> --notify-host <host> [options]')
+    print('')
+    print('Parameters:')
+    print("  --host <host>: CB host (default is '127.0.0.1')")
+    print("  --port <port>: CB port (default is 1026)")
+    print("  --notify-host <host>: host or ip of this machine, as seen by CB (default is '127.0.0.1')")
+    print("  --listen-port <port>: port of the notification receiver (default is 10031)")
+    print("  --subscriptions <n,m>: runs, with the number of subscriptions of each one (default is 1,100,10000)")
+    print("  --updates <n>: updates sent in each run (default is 100)")
+    print("  --rate <n>: updates per second (default is 10)")
+    print("  --drain <secs>: seconds waited for pending notifications (default is 30)")
+    print("  --type <type>: entity type (default is LatencyBenchmark)")
+    print("  --service <service>: Fiware-Service header")
+    print("  --servicepath <path>: Fiware-ServicePath header")
+    print("  --token <token>: X-Auth-Token header")
+    print("  -u: print this usage message")
+
+
+def main(argv):
+    try:
+        opts, args = getopt(argv, 'u', ['host=', 'port=', 'notify-host=', 'listen-port=', 'subscriptions=',
+                                        'updates=', 'rate=', 'drain=', 'type=', 'service=', 'servicepath=',
+                                        'token='])
+    except GetoptError, e:
+        print(str(e))
+        usage()
+        return 1
+
+    options = {'--host': '127.0.0.1', '--port': '1026', '--notify-host': '127.0.0.1', '--listen-port': '10031',
+               '--subscriptions': '1,100,10000', '--updates': '100', '--rate': '10', '--drain': '30',
+               '--type': 'LatencyBenchmark'}
+    for opt, arg in opts:
+        if opt == '-u':
+            usage()
+            return 0
+        options[opt] = arg
+
+    headers = {}
+    if '--service' in options:
+        headers['Fiware-Service'] = options['--service']
+    if '--servicepath' in options:
+        headers['Fiware-ServicePath'] = options['--servicepath']
+    if '--token' in options:
+        headers['X-Auth-Token'] = options['--token']
+
+    # request logging is too expensive during the benchmark
+    LogLevelConfiguration.default_log_level = 'ERROR'
+    cb = CbNgsi10v2Utils(options['--host'], port=options['--port'], log_verbosity='ERROR')
+    receiver = NotificationReceiver(port=options['--listen-port']).start()
+    benchmark = NotificationLatencyBenchmark(cb, receiver.url(options['--notify-host']),
+                                             entity_type=options['--type'], headers=headers)
+    try:
+        for subscriptions in options['--subscriptions'].split(','):
+            stats = benchmark.run(receiver, int(subscriptions), updates=int(options['--updates']),
+                                  rate=float(options['--rate']), drain_timeout=float(options['--drain']))
+            print(stats.report())
+            print('')
+    finally:
+        receiver.stop()
+        cb.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
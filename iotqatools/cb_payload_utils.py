@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+
+from iotqatools import json_utils
+from iotqatools.helpers_utils import convert_str_to_list, remove_quote
+
+SEPARATOR = '&'
+
+
+class EncodedJson(str):
+    """
+    Payload already serialized as JSON (utf-8 bytes). It is sent as it is, without a new serialization
+    """
+
+
+def encode_json(value):
+    """
+    serialize a value as JSON (utf-8 bytes), keeping non ascii chars as they are
+    """
+    return json_utils.dumps(value, ensure_ascii=False, compact=True)
+
+
+def checked_json(payload):
+    """
+    check that a payload written by hand is valid JSON, so a malformed request fails before being sent
+    :param payload: JSON text (unicode or utf-8 bytes)
+    :return EncodedJson
+    """
+    payload = to_bytes(payload)
+    json.loads(payload)
+    return EncodedJson(payload)
+
+
+def to_bytes(text):
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return str(text)
+
+
+def raw_attribute_fragments(entity_context, mode):
+    """
+    create the attributes of an entity context in raw mode, as JSON fragments (names and values are sent as they
+    are written, so booleans, numbers, vectors or compound values can be used)
+    Hint: to create N attributes use & as separator. Ev:
+              | parameter           | value                                 |
+              | entities_type       | "house"                               |
+              | entities_id         | "room_2"                              |
+              | attributes_name     | "temperature"&"pressure"&"humidity"   |
+              | attributes_value    | 34&"high"&"random=3"                  |
+              | attributes_type     | "celsius"&&"porcent"                  |
+              | metadatas_name      | "very_hot"                            |
+              | metadatas_type      | "alarm"                               |
+              | metadatas_value     | "default"                             |
+    :param entity_context: entity context dict
+    :param mode: normalized | keyValues
+    :return list of unicode fragments, one per attribute ('"name": {...}' or '"name": value')
+    """
+    name_list = []
+    values_list = []
+    type_list = []
+    meta_names_list = []
+    meta_values_list = []
+    meta_types_list = []
+    double_separator = '%s%s' % (SEPARATOR, SEPARATOR)
+    if entity_context['attributes_name'] is not None:
+        name_list = convert_str_to_list(entity_context['attributes_name'], SEPARATOR)
+    if entity_context['attributes_value'] is not None:
+        values_list = convert_str_to_list(entity_context['attributes_value'], SEPARATOR)
+    if entity_context['attributes_type'] is not None:
+        while entity_context['attributes_type'].find(double_separator) >= 0:
+            entity_context['attributes_type'] = entity_context['attributes_type'].replace(
+                double_separator, '%s"none"%s' % (SEPARATOR, SEPARATOR))
+        type_list = convert_str_to_list(entity_context['attributes_type'], SEPARATOR)
+    if entity_context['metadatas_name'] is not None:
+        meta_names_list = convert_str_to_list(entity_context['metadatas_name'], SEPARATOR)
+    if entity_context['metadatas_value'] is not None:
+        meta_values_list = convert_str_to_list(entity_context['metadatas_value'], SEPARATOR)
+    if entity_context['metadatas_type'] is not None:
+        while entity_context['metadatas_type'].find(double_separator) >= 0:
+            entity_context['metadatas_type'] = entity_context['metadatas_type'].replace(
+                double_separator, '%s"none"%s' % (SEPARATOR, SEPARATOR))
+        meta_types_list = convert_str_to_list(entity_context['metadatas_type'], SEPARATOR)
+
+    fragments = []
+    for pos in range(len(name_list)):
+        if mode == 'normalized':
+            fields = []
+            # attribute type if it does exist
+            if len(type_list) > pos and remove_quote(type_list[pos]) != 'none':
+                fields.append(u'"type": %s' % type_list[pos])
+            # metadata if it does exist
+            if len(meta_names_list) > pos:
+                if len(meta_types_list) > pos and remove_quote(meta_types_list[pos]) != 'none':
+                    fields.append(u'"metadata": {%s: {"value": %s, "type": %s}}' % (
+                        meta_names_list[pos], meta_values_list[pos], meta_types_list[pos]))
+                else:
+                    fields.append(u'"metadata": {%s: {"value": %s}}' % (meta_names_list[pos],
+                                                                         meta_values_list[pos]))
+            # attribute value if it does exist
+            if len(values_list) > pos:
+                fields.append(u'"value": %s' % values_list[pos])
+            fragments.append(u'%s:{%s}' % (name_list[pos], u', '.join(fields)))
+        elif mode == 'keyValues':
+            fragments.append(u'%s: %s' % (name_list[pos], values_list[pos]))
+    return fragments
+
+
+def attribute_fragments(entity_context, mode):
+    """
+    create the attributes of an entity context (not raw), as JSON fragments. If attributes_number is greater
+    than 1, the attribute names are the name plus a consecutive suffix (name_0, name_1, ...); if it is 0 there are
+    no attributes. The attribute body is serialized only once and shared by all the attributes
+    :param entity_context: entity context dict
+    :param mode: normalized | keyValues
+    :return list of unicode fragments, one per attribute
+    """
+    attributes_number = int(entity_context['attributes_number'])
+    if entity_context['attributes_name'] is None or attributes_number < 1:
+        return []
+    attr = {}
+    if mode == 'normalized':
+        metadata = {}
+        metadatas_number = int(entity_context['metadatas_number'])
+        if metadatas_number > 0 and entity_context['metadatas_name'] is not None:
+            for i in range(metadatas_number):
+                name = entity_context['metadatas_name']
+                if metadatas_number > 1:
+                    name = '%s_%s' % (name, i)
+                metadata[name] = {}
+                if entity_context['metadatas_value'] is not None:
+                    metadata[name]['value'] = entity_context['metadatas_value']
+                if entity_context['metadatas_type'] != 'none':
+                    metadata[name]['type'] = entity_context['metadatas_type']
+        if metadata != {}:
+            attr['metadata'] = metadata
+        if entity_context['attributes_type'] != 'none':
+            attr['type'] = entity_context['attributes_type']
+        if entity_context['attributes_value'] is not None:
+            attr['value'] = entity_context['attributes_value']
+    elif mode == 'keyValues' and entity_context['attributes_value'] is not None:
+        attr = entity_context['attributes_value']
+    body = json.dumps(attr, ensure_ascii=False)
+
+    name = entity_context['attributes_name']
+    if attributes_number == 1:
+        return [u'%s: %s' % (json.dumps(name, ensure_ascii=False), body)]
+    return [u'%s: %s' % (json.dumps(u'%s_%s' % (name, i), ensure_ascii=False), body)
+            for i in range(attributes_number)]
+
+
+class EntityPayloadTemplate(object):
+    """
+    Entity payload compiled once from an entity context. The attributes are serialized when the template is
+    created, and every render only adds the entity id and type, so N distinct entities are generated as bytes
+    without building and serializing dicts again
+    >>> template = EntityPayloadTemplate(cb.get_entity_context(), 'normalized')
+    >>> payload = template.render(entity_id='room_1')
+    >>> batch = template.render_batch(['room_%s' % i for i in range(100)])
+    """
+
+    def __init__(self, entity_context, mode='normalized', raw=False):
+        """
+        :param entity_context: entity context dict (see CbNgsi10v2Utils.properties_to_entities)
+        :param mode: mode used to create the attributes (normalized | keyValues)
+        :param raw: entity context values are JSON fragments (used in create_entity_raw and batch_update_in_raw)
+        """
+        self.raw = raw
+        if raw:
+            fragments = raw_attribute_fragments(entity_context, mode)
+        else:
+            fragments = attribute_fragments(entity_context, mode)
+        self.attributes_text = u', '.join(fragments)
+        self.attributes = to_bytes(self.attributes_text)
+
+        # default entity id and type. In raw mode they are JSON fragments and the "Thing" type is not sent
+        if raw:
+            self.entity_id = to_bytes(entity_context['entities_id']) if entity_context['entities_id'] is not None \
+                else None
+            self.entity_type = to_bytes(entity_context['entities_type']) \
+                if entity_context['entities_type'] not in (None, 'Thing') else None
+        else:
+            self.entity_id = encode_json(entity_context['entities_id']) if entity_context['entities_id'] is not None \
+                else None
+            self.entity_type = encode_json(entity_context['entities_type']) \
+                if entity_context['entities_type'] is not None else None
+
+    def render(self, entity_id=None, entity_type=None):
+        """
+        create an entity payload
+        :param entity_id: entity id (if None, the one in the entity context is used)
+        :param entity_type: entity type (if None, the one in the entity context is used)
+        :return EncodedJson
+        """
+        fields = []
+        type_field = encode_json(entity_type) if entity_type is not None else self.entity_type
+        if type_field is not None:
+            fields.append('"type": ' + type_field)
+        id_field = encode_json(entity_id) if entity_id is not None else self.entity_id
+        if id_field is not None:
+            fields.append('"id": ' + id_field)
+        if self.attributes:
+            fields.append(self.attributes)
+        return EncodedJson('{' + ', '.join(fields) + '}')
+
+    def render_attributes(self):
+        """
+        create the attributes payload of an entity (used to update or append attributes)
+        :return EncodedJson or None if there are not attributes
+        """
+        if not self.attributes:
+            return None
+        return EncodedJson('{' + self.attributes + '}')
+
+    def render_many(self, entity_ids, entity_type=None):
+        """
+        create an entity payload per entity id
+        :return generator of EncodedJson
+        """
+        for entity_id in entity_ids:
+            yield self.render(entity_id, entity_type)
+
+    def render_batch(self, entity_ids, action_type='append', entity_type=None):
+        """
+        create a batch update payload (POST /v2/op/update) with an entity per entity id
+        :return EncodedJson
+        """
+        return EncodedJson('{"actionType": %s, "entities": [%s]}' % (
+            encode_json(action_type), ', '.join(self.render_many(entity_ids, entity_type))))
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import threading
+import time
+from array import array
+
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.iot_logger import get_logger
+
+TIMESTAMP = 'timestamp'
+MISSING = float('nan')
+
+
+def flatten_statistics(statistics, prefix=''):
+    """
+    flatten the /statistics document in a dict of numeric values, with the path joined by dots. Ev:
+        {"counters": {"requests": {"/v2/entities": {"GET": 3}}}} -> {"counters.requests./v2/entities.GET": 3.0}
+    Booleans and strings are ignored
+    :param statistics: dict returned by GET /statistics
+    :return dict
+    """
+    values = {}
+    for key, value in statistics.iteritems():
+        name = '%s%s' % (prefix, key)
+        if isinstance(value, dict):
+            values.update(flatten_statistics(value, name + '.'))
+        elif isinstance(value, (int, long, float)) and not isinstance(value, bool):
+            values[name] = float(value)
+    return values
+
+
+class StatisticsBuffer(object):
+    """
+    Columnar in-memory buffer of samples: a timestamp column and a column per value, stored in arrays of doubles.
+    Columns appearing in later samples are filled with NaN in the previous ones, and a value missing in a sample
+    is stored as NaN too
+    """
+
+    def __init__(self):
+        self.columns = {TIMESTAMP: array('d')}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.columns[TIMESTAMP])
+
+    def append(self, timestamp, values):
+        """
+        add a sample
+        :param timestamp: epoch seconds of the sample
+        :param values: dict of column name and numeric value
+        """
+        with self.lock:
+            size = len(self.columns[TIMESTAMP])
+            for name in values:
+                if name not in self.columns:
+                    self.columns[name] = array('d', [MISSING]) * size
+            for name, column in self.columns.iteritems():
+                if name == TIMESTAMP:
+                    column.append(timestamp)
+                else:
+                    column.append(values.get(name, MISSING))
+
+    def names(self):
+        """
+        :return column names, timestamp first and then sorted
+        """
+        with self.lock:
+            return [TIMESTAMP] + sorted(name for name in self.columns if name != TIMESTAMP)
+
+    def column(self, name):
+        """
+        :return copy of a column (array of doubles)
+        """
+        with self.lock:
+            return array('d', self.columns[name])
+
+    def rates(self, names=None):
+        """
+        compute the deltas per second of the columns between consecutive samples. The rate of a sample is the
+        delta from the previous one, so the first sample has no rate (NaN). Useful to line up Orion counters with
+        client side latencies
+        :param names: columns used (by default all the columns)
+        :return dict of column name and array of rates, plus the timestamp column
+        """
+        with self.lock:
+            timestamps = self.columns[TIMESTAMP]
+            if names is None:
+                names = [name for name in self.columns if name != TIMESTAMP]
+            result = {TIMESTAMP: array('d', timestamps)}
+            for name in names:
+                column = self.columns[name]
+                rates = array('d', [MISSING]) * len(column)
+                for pos in range(1, len(column)):
+                    elapsed = timestamps[pos] - timestamps[pos - 1]
+                    if elapsed > 0:
+                        rates[pos] = (column[pos] - column[pos - 1]) / elapsed
+                result[name] = rates
+            return result
+
+    def rows(self, rates=False):
+        """
+        iterate the samples as dicts (NaN values are not included)
+        :param rates: add a "<column>/s" value with the rate of each column
+        :return generator of dicts
+        """
+        names = self.names()
+        columns = dict((name, self.column(name)) for name in names)
+        if rates:
+            for name, column in self.rates(names[1:]).iteritems():
+                if name != TIMESTAMP:
+                    columns['%s/s' % name] = column
+                    names.append('%s/s' % name)
+        for pos in range(len(columns[TIMESTAMP])):
+            row = {}
+            for name in names:
+                value = columns[name][pos]
+                if value == value:
+                    row[name] = value
+            yield row
+
+    def to_csv(self, filename, rates=False):
+        """
+        export the samples as CSV, a row per sample and a column per value (empty when it is missing)
+        :param filename: path to the file
+        :param rates: add a "<column>/s" column with the rate of each column
+        """
+        names = self.names()
+        if rates:
+            names += ['%s/s' % name for name in names[1:]]
+        with open(filename, 'w') as fd:
+            fd.write('%s\n' % ','.join(names))
+            for row in self.rows(rates):
+                fd.write('%s\n' % ','.join(repr(row[name]) if name in row else '' for name in names))
+
+    def to_json_lines(self, filename, rates=False):
+        """
+        export the samples as JSON-lines, a JSON object per sample
+        :param filename: path to the file
+        :param rates: add a "<column>/s" value with the rate of each column
+        """
+        with open(filename, 'w') as fd:
+            for row in self.rows(rates):
+                fd.write('%s\n' % json.dumps(row, sort_keys=True))
+
+
+class CbStatisticsSampler(object):
+    """
+    Poll the ContextBroker /statistics at a fixed interval in a background thread, using its own connection, and
+    store the samples in a StatisticsBuffer
+    >>> with CbStatisticsSampler('127.0.0.1', interval=1) as sampler:
+    >>>     run_soak_test()
+    >>> sampler.buffer.to_csv('orion_statistics.csv', rates=True)
+    """
+
+    def __init__(self, instance, interval=1.0, log_instance=None, log_verbosity='INFO', **kwargs):
+        """
+        CB statistics sampler constructor
+        :param instance: CB host
+        :param interval: seconds between samples
+        :param log_instance:
+        :param log_verbosity:
+        :param kwargs: rest of CbNgsi10v2Utils constructor parameters (protocol, port, default_headers, ...)
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('CbStatisticsSampler', log_verbosity)
+        kwargs.setdefault('log_verbosity', 'ERROR')
+        kwargs.setdefault('pool_connections', 1)
+        kwargs.setdefault('pool_maxsize', 1)
+        self.cb = CbNgsi10v2Utils(instance, **kwargs)
+        self.interval = float(interval)
+        self.buffer = StatisticsBuffer()
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """
+        take a sample now. The timestamp is the middle of the request
+        :return dict of values, None if the request failed
+        """
+        before = time.time()
+        try:
+            response = self.cb.statistics()
+            statistics = response.json() if response.status_code == 200 else None
+        except Exception, e:
+            self.log.warning('Statistics request failed: %s' % e)
+            statistics = None
+        else:
+            if statistics is None:
+                self.log.warning('Statistics request failed (%s): %s' % (response.status_code, response.text))
+        if statistics is None:
+            self.errors += 1
+            return None
+        values = flatten_statistics(statistics)
+        self.buffer.append((before + time.time()) / 2, values)
+        return values
+
+    def __run(self):
+        next_sample = time.time()
+        while not self.stopped.is_set():
+            self.sample()
+            # fixed rate, a slow sample does not move the next ones
+            next_sample += self.interval
+            delay = next_sample - time.time()
+            if delay < 0:
+                next_sample = time.time()
+                delay = 0
+            self.stopped.wait(delay)
+
+    def start(self):
+        """
+        start sampling in background
+        :return self
+        """
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.__run, name='CbStatisticsSampler')
+            self.thread.daemon = True
+            self.thread.start()
+            self.log.debug('Statistics sampler started, interval: %ss' % self.interval)
+        return self
+
+    def stop(self):
+        """
+        stop sampling and wait for the sampler thread. The samples are kept in the buffer
+        """
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+            self.log.debug('Statistics sampler stopped, samples: %s, errors: %s' % (len(self.buffer), self.errors))
+
+    def close(self):
+        self.stop()
+        self.cb.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
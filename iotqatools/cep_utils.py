@@ -24,12 +24,12 @@ please contact with::[iot_support@tid.es]
 
 import yaml
 import pystache
-import requests
 
 from iotqatools.templates.cep_templates import *
 from iotqatools.helpers_utils import *
 from iotqatools.iot_logger import get_logger
 from iotqatools.iot_tools import PqaTools
+from iotqatools.transport_utils import client_transport
 from requests.exceptions import RequestException
 
 
@@ -48,7 +48,8 @@ class CEP:
                  verbosity='DEBUG',
                  default_headers={'Accept': 'application/json'},
                  verify=False,
-                 check_json=True):
+                 check_json=True,
+                 transport=None):
         """
         constructor with values by default
         :param protocol: protocol to be used (e.g. http:// or https://)
@@ -58,6 +59,7 @@ class CEP:
         :param default_headers: default headers for CEP requests
         :param instance: cep endpoint
         :param cep_version: cep version
+        :param transport: HttpTransport shared with other clients (None creates one for this client)
         """
         # initialize logger
         self.log = get_logger('cep_utils', verbosity)
@@ -73,6 +75,7 @@ class CEP:
         self.headers = default_headers
         self.verify = verify
         self.check_json = check_json
+        self.transport, self.own_transport = client_transport(transport, log_instance=self.log)
 
     def __create_headers(self, service, subservice='', token=''):
         """
@@ -114,7 +117,7 @@ class CEP:
 
         # Send the requests
         try:
-            response = requests.request(**parameters)
+            response = self.transport.request(**parameters)
         except RequestException, e:
             PqaTools.log_requestAndResponse(url=url, headers=headers, params=query, data=payload, comp='CEP',
                                             method=method)
@@ -10,12 +10,12 @@ stipulated in the agreement/contract under which the program(s) have
 been supplied.
 """
 
-import requests
 import json
 
 from iotqatools.iot_logger import get_logger
 from requests.exceptions import RequestException
 from iotqatools.iot_tools import PqaTools
+from iotqatools.transport_utils import client_transport
 
 DEFAULT_ENDPOINT = 'localhost'
 DEFAULT_APIKEY = '7b321ca7-2193-4adf-8039-d550428620fe'
@@ -33,7 +33,8 @@ class CKANUtils:
                  url=DEFAULT_URL,
                  protocol=DEFAULT_PROTOCOL,
                  verbosity='DEBUG',
-                 default_headers={"Accept": "application/json", 'content-type': 'application/json'}):
+                 default_headers={"Accept": "application/json", 'content-type': 'application/json'},
+                 transport=None):
         """
         Method for initialization of CKAN. Basically you can set the endpoint and the apikey of the user you are going
         to use by initializing the class (e.g. ckan = CkanUtils(instance='http://81.45.57.227:8443',
@@ -46,6 +47,7 @@ class CKANUtils:
         :param protocol: ckan protocol (e.g. http, https)
         :param verbosity: verbosity level ('CRITICAL','ERROR', 'WARNING', 'INFO', 'DEBUG')
         :param default_headers: default headers for every requests to be sent to ckan
+        :param transport: HttpTransport shared with other clients (None creates one for this client)
         """
         # initialize logger
         self.log = get_logger('ckan_utils', verbosity)
@@ -57,6 +59,7 @@ class CKANUtils:
         self.url = url
         self.verbosity = verbosity
         self.default_headers = default_headers
+        self.transport, self.own_transport = client_transport(transport, log_instance=self.log)
 
     def compose_url(self, protocol, endpoint, port, path, action):
         """
@@ -104,7 +107,7 @@ class CKANUtils:
 
         # Send the requests
         try:
-            response = requests.request(**parameters)
+            response = self.transport.request(**parameters)
         except RequestException, e:
             PqaTools.log_requestAndResponse(url=url, headers=headers, data=payload, comp='CKAN')
             assert False, 'ERROR: [NETWORK ERROR] {}'.format(e)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+# Values lower than SUB_BUCKETS have their own bucket. Higher values are grouped in buckets whose width doubles
+# every HALF_BUCKETS buckets (log-linear, like HdrHistogram), so the relative error is lower than 1 / HALF_BUCKETS
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BUCKETS = SUB_BUCKETS >> 1
+
+
+def bucket_index(value):
+    """
+    get the bucket index of a positive integer value
+    """
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift + 1) * HALF_BUCKETS + (value >> shift) - HALF_BUCKETS
+
+
+def bucket_range(index):
+    """
+    get the values range [lower, upper) of a bucket index
+    """
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // HALF_BUCKETS - 1
+    lower = (index % HALF_BUCKETS + HALF_BUCKETS) << shift
+    return lower, lower + (1 << shift)
+
+
+class Histogram(object):
+    """
+    Log-linear histogram of positive values. Only the non empty buckets are stored, so memory is bounded by the
+    range of the values (not by their number), and two histograms can be merged adding their buckets.
+    Values are recorded as integers in the histogram unit; record_seconds() stores seconds as microseconds.
+    >>> h = Histogram()
+    >>> h.record_seconds(0.0123)
+    >>> h.percentile(99) / 1000.0  # milliseconds
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value, count=1):
+        """
+        record an integer value (negative values are recorded as 0)
+        """
+        value = max(int(value), 0)
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_seconds(self, seconds):
+        """
+        record a duration in seconds, with microseconds resolution
+        """
+        self.record(seconds * 1000000)
+
+    def merge(self, other):
+        """
+        add the values of other histogram to this one
+        :return self
+        """
+        for index in other.buckets:
+            self.buckets[index] = self.buckets.get(index, 0) + other.buckets[index]
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def copy(self):
+        return Histogram().merge(self)
+
+    def mean(self):
+        if self.count == 0:
+            return 0.0
+        return float(self.total) / self.count
+
+    def percentile(self, percentile):
+        """
+        get the value under which are the given percentage of the recorded values (the middle of its bucket,
+        limited by the exact min and max)
+        :param percentile: 0-100
+        :return value in the histogram unit (0 if the histogram is empty)
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(round(self.count * float(percentile) / 100)))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                lower, upper = bucket_range(index)
+                return min(max((lower + upper - 1) // 2, self.min), self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """
+        :return dict with count, min, mean, max and the given percentiles (p50, p95, ...)
+        """
+        result = {'count': self.count, 'min': self.min or 0, 'mean': self.mean(), 'max': self.max or 0}
+        for percentile in percentiles:
+            result['p%s' % percentile] = self.percentile(percentile)
+        return result
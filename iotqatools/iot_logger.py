@@ -24,12 +24,39 @@ please contact with::[iot_support@tid.es]
 
 __author__ = 'xvc'
 
+import atexit
+import copy
 import logging
+import Queue
+import sys
+import threading
 from iotqatools.helpers_utils import LogLevelConfiguration
 
 
+class StderrHandler(logging.StreamHandler):
+    """
+    StreamHandler writing to the current sys.stderr, so a cached logger follows the stderr replacements done by the
+    test runners to capture the output
+    """
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+# loggers already configured: name -> (configuration, logger)
+__loggers__ = {}
+__loggers_lock__ = threading.RLock()
+
+
 def get_logger(name, level=None, verbose=False, file=False, filename='', formatter=None):
     """
+    Get a configured logger. Each logger is configured once and cached, the cached instance is returned while it is
+    requested with the same configuration (a different one, or a change of the default level, reconfigures it)
     :param name: Name of the logging module
     :param level: Verbosity level (default None). Possible values [None, 'CRITICAL','ERROR', 'WARNING', 'INFO', 'DEBUG'].
         If None is used then default level (from LogLevelConfiguration class) is used.
@@ -39,28 +66,66 @@ def get_logger(name, level=None, verbose=False, file=False, filename='', formatt
     :param formatter: Specific logging.Formatter, if its none or is not a formatter class, default depending of the verbose is used
     :return: a Logger object with the iot default formatter and the verbosity level especified
     """
+    if level is not None:
+        lvl = level
+    else:
+        lvl = LogLevelConfiguration.default_log_level
+    configuration = (lvl, verbose, file, filename, formatter)
+    cached = __loggers__.get(name)
+    if cached is not None and cached[0] == configuration:
+        return cached[1]
+    return reconfigure_logger(name, level, verbose, file, filename, formatter)
+
+
+def reconfigure_logger(name, level=None, verbose=False, file=False, filename='', formatter=None):
+    """
+    Configure a logger again (its handler is replaced), even if it is cached with the same configuration.
+    Parameters as in get_logger
+    :return: a Logger object with the iot default formatter and the verbosity level especified
+    """
+    if level is not None:
+        lvl = level
+    else:
+        lvl = LogLevelConfiguration.default_log_level
+    with __loggers_lock__:
+        logger = configure_logger(name, lvl, verbose, file, filename, formatter)
+        if logger is not None:
+            __loggers__[name] = ((lvl, verbose, file, filename, formatter), logger)
+        return logger
+
+
+def reset_loggers():
+    """
+    Forget the configured loggers, so the next get_logger configures them again
+    """
+    with __loggers_lock__:
+        __loggers__.clear()
+
+
+def configure_logger(name, lvl, verbose=False, file=False, filename='', formatter=None):
+    """
+    Set the level of a logger and replace its handler
+    :return: the Logger, None if the level is wrong
+    """
     # Create logger
     logger = logging.getLogger(name)
     # Do not pass throw parents handlers
     logger.propagate = False
     # Set log level
-    if level is not None:
-        lvl = level
-    else:
-        lvl = LogLevelConfiguration.default_log_level
     try:
         logger.setLevel(lvl)
     except ValueError as e:
         get_logger(__name__, 'ERROR').error(str(e))
         return
-    # If there is a handler with the same class, delete it first
+    # If there is a handler with the same class (directly or through the async sink), delete it first
     if len(logger.handlers) > 0:
         for handler in logger.handlers:
+            target = handler.target if isinstance(handler, QueueHandler) else handler
             if file:
-                if isinstance(handler, logging.FileHandler):
+                if isinstance(target, logging.FileHandler):
                     logger.removeHandler(handler)
             else:
-                if isinstance(handler, logging.StreamHandler):
+                if isinstance(target, logging.StreamHandler):
                     logger.removeHandler(handler)
     if file:
         if filename == '':
@@ -72,7 +137,7 @@ def get_logger(name, level=None, verbose=False, file=False, filename='', formatt
                 filename_log = filename
         new_handler = logging.FileHandler(filename_log)
     else:
-        new_handler = logging.StreamHandler()
+        new_handler = StderrHandler()
 
     new_handler.setLevel(lvl)
 
@@ -88,7 +153,168 @@ def get_logger(name, level=None, verbose=False, file=False, filename='', formatt
     # Set formatter
     new_handler.setFormatter(new_formatter)
 
-    # Add new handler with the new format to the logger
+    # Add new handler with the new format to the logger (through the async sink if it is enabled)
+    if __async_sink__[0] is not None:
+        new_handler = QueueHandler(__async_sink__[0], new_handler)
     logger.addHandler(new_handler)
     return logger
 
+
+class QueueHandler(logging.Handler):
+    """
+    Handler putting the records in the queue of an AsyncLogSink, its target handler formats and writes them in
+    the sink thread. The message is rendered in the caller thread, while its arguments are not changed yet
+    """
+
+    def __init__(self, sink, target):
+        logging.Handler.__init__(self, target.level)
+        self.sink = sink
+        self.target = target
+
+    def prepare(self, record):
+        """
+        :return copy of the record with the message (and the traceback) rendered, without args nor exc_info
+        """
+        message = self.format(record)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.sink.put(self.target, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class AsyncLogSink(object):
+    """
+    Background thread (queue listener) formatting and writing the records of all the loggers, so the request
+    threads do not wait for the log I/O. The queue is bounded; when it is full the records are dropped (and
+    counted) or the caller blocks, depending on the policy
+    """
+    DROP = 'drop'
+    BLOCK = 'block'
+
+    def __init__(self, max_queue_size=10000, policy=DROP):
+        """
+        :param max_queue_size: max number of records waiting to be written
+        :param policy: drop | block, what to do when the queue is full
+        """
+        if policy not in (self.DROP, self.BLOCK):
+            raise Exception('Wrong policy "%s", allowed: %s, %s' % (policy, self.DROP, self.BLOCK))
+        self.policy = policy
+        self.queue = Queue.Queue(int(max_queue_size))
+        self.dropped = 0
+        self.written = 0
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.__run, name='AsyncLogSink')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, target, record):
+        if self.stopped:
+            # stale handler, after the stop: the record is written in the caller thread
+            self.__write(target, record)
+            return
+        if self.policy == self.BLOCK:
+            while True:
+                try:
+                    self.queue.put((target, record), timeout=0.1)
+                    return
+                except Queue.Full:
+                    if self.stopped:
+                        self.__write(target, record)
+                        return
+        try:
+            self.queue.put_nowait((target, record))
+        except Queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def __run(self):
+        while True:
+            target, record = self.queue.get()
+            if target is None:
+                return
+            self.__write(target, record)
+
+    def __write(self, target, record):
+        try:
+            if record.levelno >= target.level:
+                target.handle(record)
+        except Exception:
+            target.handleError(record)
+        with self.lock:
+            self.written += 1
+
+    def stop(self):
+        """
+        write the records already queued and stop the thread
+        """
+        self.stopped = True
+        if self.thread.is_alive():
+            self.queue.put((None, None))
+            self.thread.join()
+        # records put after the stop are written here
+        while not self.queue.empty():
+            target, record = self.queue.get_nowait()
+            if target is not None:
+                self.__write(target, record)
+        if self.dropped > 0:
+            sys.stderr.write('WARNING async log sink dropped %s records\n' % self.dropped)
+
+
+# AsyncLogSink used by the loggers, if any
+__async_sink__ = [None]
+
+
+def enable_async_logging(max_queue_size=10000, policy=AsyncLogSink.DROP):
+    """
+    Write the logs of all the loggers (the configured ones and the next ones) in a background thread. The queued
+    records are written at process exit
+    :param max_queue_size: max number of records waiting to be written
+    :param policy: drop | block, what to do when the queue is full
+    :return AsyncLogSink (its dropped attribute counts the records lost)
+    """
+    with __loggers_lock__:
+        disable_async_logging()
+        __async_sink__[0] = AsyncLogSink(max_queue_size, policy)
+        _rewire_handlers()
+        return __async_sink__[0]
+
+
+def disable_async_logging():
+    """
+    Write the queued records, stop the background thread and go back to write the logs in the caller threads
+    :return AsyncLogSink stopped (None if it was not enabled)
+    """
+    with __loggers_lock__:
+        sink = __async_sink__[0]
+        if sink is None:
+            return None
+        __async_sink__[0] = None
+        _rewire_handlers()
+        sink.stop()
+        return sink
+
+
+def _rewire_handlers():
+    """
+    put (or remove) the async sink between the cached loggers (the same instances) and their handlers
+    """
+    sink = __async_sink__[0]
+    for configuration, logger in __loggers__.values():
+        for handler in list(logger.handlers):
+            target = handler.target if isinstance(handler, QueueHandler) else handler
+            logger.removeHandler(handler)
+            logger.addHandler(QueueHandler(sink, target) if sink is not None else target)
+
+
+atexit.register(disable_async_logging)
+
@@ -26,9 +26,45 @@ import re
 import ast
 import pprint
 import json
+import collections
+import itertools
+import logging
 from iotqatools.iot_logger import get_logger
 
 
+class LazyLogMessage(object):
+    """
+    Log message built when a handler emits it (str() of the record message), not when it is logged. It is built
+    once, the next handlers reuse the text. The args are used as they are when the message is built, so the
+    mutable ones must be copied by the caller (see snapshot)
+    >>> log.debug(LazyLogMessage(pprint.pformat, snapshot(payload)))
+    """
+    __slots__ = ('function', 'args', 'text')
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+        self.text = None
+
+    def __str__(self):
+        if self.text is None:
+            text = self.function(*self.args)
+            self.text = text.encode('utf-8') if isinstance(text, unicode) else text
+            self.args = None
+        return self.text
+
+
+def snapshot(value):
+    """
+    shallow copy of a dict or a list logged lazily (the caller could change it before the message is built)
+    """
+    if isinstance(value, collections.Mapping):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
 class PqaTools(object):
     """
     PqaTools:   Test tools to store retrieve and print info during the tests
@@ -38,10 +74,73 @@ class PqaTools(object):
     'recall', 'remember', 'replace', 'secure_headers']
     """
 
+    # Request logging: payloads longer than log_payload_max_size chars are truncated (None logs them whole) and
+    # only 1 of every log_sample_rate requests is logged. See configure_request_logging
+    log_payload_max_size = 16384
+    log_sample_rate = 1
+    __log_counter = itertools.count()
+
+    # functions called with every request/response exchange (see add_exchange_hook)
+    exchange_hooks = []
+
+    @staticmethod
+    def add_exchange_hook(hook):
+        """
+        Call hook(comp, method, url, headers, data, response) for every exchange passed to log_requestAndResponse or
+        log_fullRequest, even if it is not logged (level or sampling). response is None if there is no response.
+        Hooks are called in the request thread, so they must be fast
+        """
+        if hook not in PqaTools.exchange_hooks:
+            PqaTools.exchange_hooks = PqaTools.exchange_hooks + [hook]
+
+    @staticmethod
+    def remove_exchange_hook(hook):
+        PqaTools.exchange_hooks = [item for item in PqaTools.exchange_hooks if item != hook]
+
+    @staticmethod
+    def __call_exchange_hooks(comp, method, url, headers, data, response):
+        for hook in PqaTools.exchange_hooks:
+            try:
+                hook(comp, method, url, headers, data, response)
+            except Exception, e:
+                get_logger('iot_tools').warning('Exchange hook %s failed: %s' % (hook, e))
+
+    @staticmethod
+    def configure_request_logging(payload_max_size=16384, sample_rate=1):
+        """
+        Configure the request logging of all the components
+        :param payload_max_size: max chars of the payloads logged (None to log them whole)
+        :param sample_rate: log 1 of every N requests (1 logs all of them)
+        """
+        PqaTools.log_payload_max_size = int(payload_max_size) if payload_max_size is not None else None
+        PqaTools.log_sample_rate = max(int(sample_rate), 1)
+
+    @staticmethod
+    def __request_log(log):
+        """
+        :return True if the request has to be logged: DEBUG is enabled and the request is in the sample
+        """
+        if not log.isEnabledFor(logging.DEBUG):
+            return False
+        if PqaTools.log_sample_rate > 1:
+            return next(PqaTools.__log_counter) % PqaTools.log_sample_rate == 0
+        return True
+
+    @staticmethod
+    def truncate_payload(text):
+        """
+        Limit a payload text to log_payload_max_size chars
+        """
+        limit = PqaTools.log_payload_max_size
+        if limit is None or not isinstance(text, basestring) or len(text) <= limit:
+            return text
+        return '%s... (%s chars more)' % (text[:limit], len(text) - limit)
+
     @staticmethod
     def log_requestAndResponse(url='', headers={}, params={}, data='', comp='', response={}, method=''):
         """
-        Print the result of a request and the response data provided in a standard view
+        Print the result of a request and the response data provided in a standard view. The texts are only
+        built if the log will be emitted (DEBUG)
         :param url: Endpoint where the request was sent
         :param headers: Headers sent to the component (if any)
         :param params: Params sent to the component (if any)
@@ -51,8 +150,25 @@ class PqaTools(object):
         :param method: http method, it can be POST, GET, PUT, DELETE (optional)
         :return: Nan
         """
+        if PqaTools.exchange_hooks:
+            PqaTools.__call_exchange_hooks(comp, method, url, headers, data, response if hasattr(
+                response, 'status_code') else None)
         log = get_logger('iot_tools')
+        if not PqaTools.__request_log(log):
+            return
+
+        log.debug(LazyLogMessage(PqaTools.format_request, url, snapshot(headers), snapshot(params), snapshot(data),
+                                 comp, method))
+
+        if isinstance(response, object) and hasattr(response, "status_code"):
+            # Log responded data
+            log.debug(LazyLogMessage(PqaTools.format_response, response))
 
+    @staticmethod
+    def format_request(url='', headers={}, params={}, data='', comp='', method=''):
+        """
+        :return text of the data sent, as logged by log_requestAndResponse
+        """
         log_msg = '>>>>>>>>>>>>>\t Data sent:     \t>>>>>>>>>>>>> \n'
         if comp:
             log_msg += "\t> Comp: {} \n".format(comp)
@@ -62,30 +178,28 @@ class PqaTools(object):
             log_msg += "\t> Url: {} \n".format(url)
         if headers:
             log_msg += '\t> Headers: {}\n'.format(str(dict(headers)))
-            # log_msg += "\t> Headers: {} \n".format(pprint.pformat(headers, width=20))
         if params:
             log_msg += "\t> Params: {} \n".format(pprint.pformat(params, width=20))
         if data is not '':
-            log_msg += "\t> Payload sent: {}\n".format(pprint.pformat(data, width=20))
+            log_msg += "\t> Payload sent: {}\n".format(
+                PqaTools.truncate_payload(pprint.pformat(data, width=20)))
         else:
             log_msg += "\t> SENT REQUEST DATA SEEMS TO BE EMPTY \n"
-        log.debug(log_msg)
+        return log_msg
 
-        if isinstance(response, object) and hasattr(response, "status_code"):
-            log_msg = '<<<<<<<<<<<<<<\t Data responded:\t<<<<<<<<<<<<<<\n'
-            if isinstance(response, object) and hasattr(response, "status_code"):
-                log_msg += '\t< Response code: {}\n'.format(str(response.status_code))
-            log_msg += '\t< Headers: {}\n'.format(str(dict(response.headers)))
-            try:
-                if response.content:
-                    log_msg += '\t< Payload received: {}\n'.format(response.content)
-                else:
-                    log_msg += '\t< Empty Payload \n'
-            except ValueError:
-                log_msg += '\t< Payload received:\n %s' % response.content
-
-        # Log responded data
-        log.debug(log_msg)
+    @staticmethod
+    def format_response(response):
+        """
+        :return text of the data responded, as logged by log_requestAndResponse
+        """
+        log_msg = '<<<<<<<<<<<<<<\t Data responded:\t<<<<<<<<<<<<<<\n'
+        log_msg += '\t< Response code: {}\n'.format(str(response.status_code))
+        log_msg += '\t< Headers: {}\n'.format(str(dict(response.headers)))
+        if response.content:
+            log_msg += '\t< Payload received: {}\n'.format(PqaTools.truncate_payload(response.content))
+        else:
+            log_msg += '\t< Empty Payload \n'
+        return log_msg
 
     @staticmethod
     def log_result(url='', headers={}, params={}, data='', comp='', method=''):
@@ -104,13 +218,35 @@ class PqaTools(object):
 
     @staticmethod
     def log_fullRequest(comp='', response='', params=dict()):
+        """
+        Print a request (the parameters passed to requests) and its response. The texts are only built if the log
+        will be emitted (DEBUG)
+        """
+        if PqaTools.exchange_hooks:
+            PqaTools.__call_exchange_hooks(comp, params.get('method'), params.get('url'), params.get('headers'),
+                                           params.get('data', params.get('json')), response)
+
         # initialize logger
         log = get_logger('iot_tools')
+        if not PqaTools.__request_log(log):
+            return 0
 
-        # Introduce info in log text
+        # Log sent data
+        log.debug(LazyLogMessage(PqaTools.format_full_request, comp,
+                                 dict((key, snapshot(value)) for key, value in params.items())))
+
+        # Log responded data
+        log.debug(LazyLogMessage(PqaTools.format_full_response, response))
+
+        return 0
+
+    @staticmethod
+    def format_full_request(comp='', params=dict()):
+        """
+        :return text of the data sent, as logged by log_fullRequest
+        """
         log_msg = '>>>>>>>>>>>>>\t Data sent:     \t>>>>>>>>>>>>> \n'
-        if 'comp' is not '':
-            log_msg += '\t> Comp: %s\n' % comp
+        log_msg += '\t> Comp: %s\n' % comp
         if 'url' in params:
             log_msg += '\t> Url: %s\n' % params['url']
         if 'method' in params:
@@ -118,27 +254,24 @@ class PqaTools(object):
         if 'headers' in params:
             log_msg += '\t> Headers: {}\n'.format(str(params['headers']))
         if 'data' in params:
-            log_msg += '\t> Payload sent: {}\n'.format(pprint.pformat(params['data'], width=20))
+            log_msg += '\t> Payload sent: {}\n'.format(
+                PqaTools.truncate_payload(pprint.pformat(params['data'], width=20)))
         if 'params' in params:
             log_msg += '\t> Params sent: {}\n'.format(str(params['params']))
         if 'verify' in params:
             log_msg += '\t> Verify: %s\n' % params['verify']
+        return log_msg
 
-        # Log sent data
-        log.debug(log_msg)
-
+    @staticmethod
+    def format_full_response(response):
+        """
+        :return text of the data responded, as logged by log_fullRequest
+        """
         log_msg = '<<<<<<<<<<<<<<\t Data responded:\t<<<<<<<<<<<<<<\n'
         log_msg += '\t< Response code: {}\n'.format(str(response.status_code))
         log_msg += '\t< Headers: {}\n'.format(str(dict(response.headers)))
-        try:
-            log_msg += '\t< Payload received:\n {}'.format(response.content)
-        except ValueError:
-            log_msg += '\t< Payload received:\n %s' % response.content.text
-
-        # Log responded data
-        log.debug(log_msg)
-
-        return 0
+        log_msg += '\t< Payload received:\n {}'.format(PqaTools.truncate_payload(response.content))
+        return log_msg
 
     @staticmethod
     def pattern_mapping(cad, mapping):
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from iotqatools.cb_bulk_utils import iter_chunks
+from iotqatools.iot_logger import get_logger
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+class ProvisioningReport(object):
+    """
+    Result of a bulk provisioning: counters, throughput and the result of each chunk (the failed ones can be
+    retried)
+    """
+
+    def __init__(self, service_name, service_path):
+        self.service_name = service_name
+        self.service_path = service_path
+        self.devices = 0
+        self.skipped = 0
+        self.failed_devices = 0
+        self.chunks = []
+        self.start_time = time.time()
+        self.end_time = None
+
+    def add(self, index, devices, status_code, error):
+        """
+        account the result of a chunk
+        :param index: position of the chunk
+        :param devices: list of devices sent
+        :param status_code: http status code (None if the request was not sent)
+        :param error: error text (None if the devices were created)
+        """
+        self.chunks.append({'index': index, 'devices': devices, 'status_code': status_code, 'error': error})
+        self.devices += len(devices)
+        if error is not None:
+            self.failed_devices += len(devices)
+
+    def failed_chunks(self):
+        return sorted((chunk for chunk in self.chunks if chunk['error'] is not None), key=lambda chunk: chunk['index'])
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def elapsed(self):
+        return (self.end_time or time.time()) - self.start_time
+
+    def devices_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return (self.devices - self.failed_devices) / elapsed
+
+    def __str__(self):
+        return 'devices: %s, skipped: %s, chunks: %s, failed chunks: %s, failed devices: %s, elapsed: %.2fs, ' \
+               '%.1f devices/s' % (self.devices, self.skipped, len(self.chunks), len(self.failed_chunks()),
+                                   self.failed_devices, self.elapsed(), self.devices_per_second())
+
+
+class IotaBulkProvisioner(object):
+    """
+    Register a big number of devices in an IoT Agent, sending the array form of POST /iot/devices in chunks
+    concurrently. The devices already registered are skipped using a local index (filled with the devices
+    created and, optionally, with the ones listed from the agent), so the provisioning can be run again
+    >>> provisioner = IotaBulkProvisioner(Rest_Utils_IoTA(server_root=..., transport=HttpTransport(pool_maxsize=8)))
+    >>> devices = [iota.build_device('dev_%s' % i, protocol='PDI-IoTA-UltraLight') for i in range(100000)]
+    >>> report = provisioner.provision('service', devices, '/path', load_index=True)
+    >>> report = provisioner.retry(report)
+    """
+
+    def __init__(self, iota, workers=8, chunk_size=DEFAULT_CHUNK_SIZE, max_in_flight=None, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        IoTA bulk provisioner constructor
+        :param iota: Rest_Utils_IoTA instance used to send the requests (with a transport if workers > 1)
+        :param workers: number of chunks sent at the same time
+        :param chunk_size: max number of devices per request
+        :param max_in_flight: max number of chunks read and not finished yet (by default 2 * workers)
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('IotaBulkProvisioner', log_verbosity)
+        self.iota = iota
+        self.workers = int(workers)
+        self.max_in_flight = int(max_in_flight) if max_in_flight is not None else 2 * self.workers
+        self.chunk_size = int(chunk_size)
+        self.lock = threading.Lock()
+        # device ids known to exist, per (service, service path)
+        self.index = {}
+
+    def __known(self, service_name, service_path):
+        with self.lock:
+            return self.index.setdefault((service_name, service_path or '/'), set())
+
+    def exists(self, service_name, device_id, service_path={}):
+        """
+        :return True if the device is in the local index
+        """
+        return device_id in self.__known(service_name, service_path)
+
+    def forget(self, service_name, device_ids=None, service_path={}):
+        """
+        remove devices from the local index (ev: after deleting them)
+        :param device_ids: ids removed (None removes all the devices of the service path)
+        """
+        known = self.__known(service_name, service_path)
+        with self.lock:
+            if device_ids is None:
+                known.clear()
+            else:
+                known.difference_update(device_ids)
+
+    def load_index(self, service_name, service_path={}, page_size=1000):
+        """
+        add to the local index the devices registered in the agent
+        :return number of devices listed
+        """
+        known = self.__known(service_name, service_path)
+        listed = 0
+        for device in self.iota.iter_devices(service_name, service_path, page_size=page_size):
+            with self.lock:
+                known.add(device['device_id'])
+            listed += 1
+        return listed
+
+    def provision(self, service_name, devices, service_path={}, skip_existing=True, load_index=False,
+                  keystone_token={}):
+        """
+        register the devices, in chunks sent concurrently
+        :param devices: iterable of device descriptions (see Rest_Utils_IoTA.build_device)
+        :param skip_existing: do not send the devices in the local index
+        :param load_index: list the devices of the agent before (see load_index)
+        :return ProvisioningReport
+        """
+        if keystone_token:
+            self.iota.token = keystone_token
+        if load_index:
+            self.load_index(service_name, service_path)
+        known = self.__known(service_name, service_path)
+        report = ProvisioningReport(service_name, service_path)
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+
+        def pending():
+            for device in devices:
+                with self.lock:
+                    skip = skip_existing and device.get('device_id') in known
+                    if skip:
+                        report.skipped += 1
+                if not skip:
+                    yield device
+
+        def send(index, chunk):
+            try:
+                response = self.iota.create_devices(service_name, chunk, service_path)
+            except Exception, e:
+                return index, chunk, None, str(e)
+            if response == 'ERROR':
+                return index, chunk, None, 'network error'
+            if response.status_code == 201:
+                with self.lock:
+                    known.update(device.get('device_id') for device in chunk)
+                return index, chunk, response.status_code, None
+            return index, chunk, response.status_code, response.text
+
+        def done(result):
+            # run in the result thread of the pool, it must not raise (the next results would not be handled)
+            try:
+                with self.lock:
+                    report.add(*result)
+                if result[3] is not None:
+                    self.log.warning('Chunk %s of %s devices failed (%s): %s' % (
+                        result[0], len(result[1]), result[2], result[3]))
+            except Exception, e:
+                self.log.error('Chunk %s result not accounted: %s' % (result[0], e))
+            finally:
+                in_flight.release()
+
+        pool = ThreadPool(self.workers)
+        try:
+            # the devices are read in this thread, only max_in_flight chunks at a time
+            for index, chunk in enumerate(iter_chunks(pending(), self.chunk_size)):
+                in_flight.acquire()
+                pool.apply_async(send, (index, chunk), callback=done)
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+        report.finish()
+        self.log.info('Provisioning of %s%s finished. %s' % (service_name, service_path or '/', report))
+        return report
+
+    def retry(self, report, load_index=True):
+        """
+        send again the failed chunks of a previous provisioning. The index is loaded from the agent by default,
+        because a failed chunk could have created some of its devices
+        :param report: ProvisioningReport of the previous provisioning
+        :return ProvisioningReport of the retry
+        """
+        return self.provision(report.service_name,
+                              [device for chunk in report.failed_chunks() for device in chunk['devices']],
+                              report.service_path, load_index=load_index)
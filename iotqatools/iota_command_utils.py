@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import Queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from iotqatools.histogram_utils import Histogram
+from iotqatools.iot_logger import get_logger
+from iotqatools.iota_fleet_utils import TimerWheel
+from iotqatools.iota_measures import Gw_Measures_Utils
+from iotqatools.transport_utils import client_transport
+
+DEFAULT_DESCRIPTION = 'command round trip benchmark'
+# suffix of the attribute where the IoTA writes the command response in ContextBroker
+INFO_SUFFIX = '_info'
+
+
+def parse_commands(body):
+    """
+    parse the commands returned to a polling device: 'device@command|value' or 'command|value', separated by
+    '#' or new lines
+    :return list of tuples (command, value)
+    """
+    commands = []
+    for line in body.replace('\n', '#').split('#'):
+        line = line.strip()
+        if '|' not in line:
+            continue
+        command, value = line.split('|', 1)
+        commands.append((command.split('@', 1)[-1], value))
+    return commands
+
+
+class CommandDevice(object):
+    """
+    State of an emulated polling device
+    """
+    __slots__ = ('apikey', 'device_id', 'entity_id', 'entity_type', 'polls', 'commands', 'errors')
+
+    def __init__(self, apikey, device_id, entity_id, entity_type):
+        self.apikey = apikey
+        self.device_id = device_id
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.polls = 0
+        self.commands = 0
+        self.errors = 0
+
+
+class CommandRoundTripStats(object):
+    """
+    Match the commands sent to ContextBroker with their delivery to the devices and with the responses written back
+    in ContextBroker (notified), by the command value (a unique token). Times in microseconds:
+        delivery: from the update of the command in ContextBroker to the device receiving it
+        round trip: from the update of the command to the notification of the device response
+    At most max_pending commands are waited for; the oldest ones are counted as lost
+    """
+
+    def __init__(self, max_pending=100000):
+        self.lock = threading.Lock()
+        self.max_pending = int(max_pending)
+        self.pending = OrderedDict()
+        self.delivery = Histogram()
+        self.round_trip = Histogram()
+        self.sent_count = 0
+        self.update_errors = 0
+        self.delivered = 0
+        self.responded = 0
+        self.response_errors = 0
+        self.completed = 0
+        self.lost = 0
+        self.unknown = 0
+
+    def sent(self, token, timestamp):
+        with self.lock:
+            self.pending[token] = timestamp
+            self.sent_count += 1
+            while len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+                self.lost += 1
+
+    def update_failed(self, token):
+        with self.lock:
+            self.pending.pop(token, None)
+            self.update_errors += 1
+
+    def received(self, token, timestamp):
+        """
+        account a command received by a device
+        """
+        with self.lock:
+            sent_at = self.pending.get(token)
+            if sent_at is not None:
+                self.delivery.record_seconds(timestamp - sent_at)
+                self.delivered += 1
+
+    def response_sent(self, ok):
+        with self.lock:
+            if ok:
+                self.responded += 1
+            else:
+                self.response_errors += 1
+
+    def notified(self, notification, timestamp):
+        """
+        account the command responses of a notification (see cb_notification_utils.NotificationHandler)
+        """
+        with self.lock:
+            for entity in notification['data']:
+                for name, attribute in entity.items():
+                    if not name.endswith(INFO_SUFFIX):
+                        continue
+                    token = attribute['value'] if isinstance(attribute, dict) else attribute
+                    sent_at = self.pending.pop(token, None) if isinstance(token, basestring) else None
+                    if sent_at is None:
+                        self.unknown += 1
+                    else:
+                        self.round_trip.record_seconds(timestamp - sent_at)
+                        self.completed += 1
+
+    def waiting(self):
+        with self.lock:
+            return len(self.pending)
+
+    def report(self):
+        """
+        :return text with the counters and the delivery and round trip percentiles (ms)
+        """
+        with self.lock:
+            lines = ['commands: %s (%s errors), delivered: %s, responded: %s (%s errors), completed: %s, '
+                     'waiting: %s, lost: %s, unknown: %s' % (
+                         self.sent_count, self.update_errors, self.delivered, self.responded, self.response_errors,
+                         self.completed, len(self.pending), self.lost, self.unknown),
+                     '%-10s %9s %9s %9s %9s %9s' % ('', 'min(ms)', 'p50(ms)', 'p95(ms)', 'p99(ms)', 'max(ms)')]
+            for name, histogram in (('delivery', self.delivery), ('round trip', self.round_trip)):
+                summary = histogram.summary()
+                lines.append('%-10s %9.2f %9.2f %9.2f %9.2f %9.2f' % ((name,) + tuple(
+                    summary[key] / 1000.0 for key in ('min', 'p50', 'p95', 'p99', 'max'))))
+        return '\n'.join(lines)
+
+
+class CommandPollerPool(object):
+    """
+    Emulate many devices polling the IoT Agent for commands (Gw_Measures_Utils.getCommand) and answering them
+    after a delay (Gw_Measures_Utils.SendCmdResponse, with the command value as result). Polls and responses are
+    scheduled on a timer wheel and run by a pool of worker threads, so thousands of devices only need as many
+    threads as concurrent requests
+    >>> pool = CommandPollerPool('http://iota:7896', poll_interval=5, response_delay=(0.1, 2), workers=200)
+    >>> pool.add_devices(5000, 'apikey1', entity_type='Thing')
+    >>> pool.start(stats)
+    """
+
+    def __init__(self, server_root, poll_type='IoTUL2', response_type='IoTUL2CmdResp', poll_interval=5.0,
+                 response_delay=(0.0, 0.0), workers=50, transport=None, tick=0.01, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        Command poller pool constructor
+        :param server_root: url of the IoTA south port (ev: http://localhost:7896)
+        :param poll_type: measure type of the polls (see iota_measures.MeasuresType)
+        :param response_type: measure type of the command responses
+        :param poll_interval: seconds between the polls of each device
+        :param response_delay: (min, max) seconds a device takes to answer a command (uniform)
+        :param workers: threads sending polls and responses
+        :param transport: HttpTransport (by default one with a connection per worker)
+        :param tick: resolution of the scheduler, seconds
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('CommandPollerPool', log_verbosity)
+        self.transport, self.own_transport = client_transport(transport, pool_maxsize=int(workers),
+                                                              log_instance=self.log)
+        self.gw = Gw_Measures_Utils(server_root=server_root, transport=self.transport, verbose=False)
+        self.poll_type = poll_type
+        self.response_type = response_type
+        self.poll_interval = float(poll_interval)
+        self.response_delay = response_delay
+        self.workers = int(workers)
+        self.tick = tick
+        self.devices = []
+        self.stats = None
+        self.wheel = None
+        self.wheel_lock = threading.Lock()
+        self.counters_lock = threading.Lock()
+        self.queue = Queue.Queue()
+        self.running = threading.Event()
+        self.threads = []
+        self.dispatcher = None
+
+    def add_devices(self, number, apikey, entity_type='Thing', prefix='cmd', entity_name=None):
+        """
+        add emulated devices, named <prefix>_<n>
+        :param entity_type: type of the entities of the devices in ContextBroker
+        :param entity_name: function(device_id) returning the entity id (by default <entity_type>:<device_id>)
+        :return list of the devices added
+        """
+        first = len(self.devices)
+        added = []
+        for i in xrange(int(number)):
+            device_id = '%s_%s' % (prefix, first + i)
+            entity_id = entity_name(device_id) if entity_name else '%s:%s' % (entity_type, device_id)
+            added.append(CommandDevice(apikey, device_id, entity_id, entity_type))
+        self.devices.extend(added)
+        return added
+
+    def __schedule(self, when, event):
+        with self.wheel_lock:
+            self.wheel.schedule(when, event)
+
+    def __count(self, device, counter, increment=1):
+        """
+        increment a counter of a device (a poll and a response of the same device can run at the same time)
+        """
+        with self.counters_lock:
+            setattr(device, counter, getattr(device, counter) + increment)
+
+    def poll(self, device):
+        """
+        poll the commands of a device and schedule their responses
+        """
+        self.__count(device, 'polls')
+        try:
+            response = self.gw.getCommand(self.poll_type, device.apikey, device.device_id)
+            commands = parse_commands(response.text) if response.status_code == 200 else []
+        except Exception, e:
+            self.log.debug('Poll of %s failed: %s' % (device.device_id, e))
+            self.__count(device, 'errors')
+            commands = []
+        now = time.time()
+        if commands:
+            self.__count(device, 'commands', len(commands))
+        for command, value in commands:
+            self.stats.received(value, now)
+            self.__schedule(now + random.uniform(*self.response_delay), ('respond', device, command, value))
+        self.__schedule(now + self.poll_interval, ('poll', device))
+
+    def respond(self, device, command, value):
+        try:
+            response = self.gw.SendCmdResponse(self.response_type, device.apikey, device.device_id, command, value)
+            ok = 200 <= response.status_code < 300
+        except Exception, e:
+            self.log.debug('Response of %s failed: %s' % (device.device_id, e))
+            ok = False
+        if not ok:
+            self.__count(device, 'errors')
+        self.stats.response_sent(ok)
+
+    def __work(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            if event[0] == 'poll':
+                self.poll(event[1])
+            else:
+                self.respond(*event[1:])
+
+    def __dispatch(self):
+        while self.running.is_set():
+            with self.wheel_lock:
+                events = self.wheel.advance(time.time())
+                next_time = self.wheel.next_time()
+            for event in events:
+                self.queue.put(event)
+            time.sleep(max(next_time - time.time(), 0))
+
+    def start(self, stats):
+        """
+        start polling (the first poll of each device at a random time of the first interval)
+        :param stats: CommandRoundTripStats where the commands received and answered are accounted
+        :return self
+        """
+        assert self.devices, 'ERROR: the pool has no devices'
+        self.stats = stats
+        start = time.time()
+        self.wheel = TimerWheel(self.tick, slots=min(int(self.poll_interval / self.tick) + 1, 4096), start=start)
+        for device in self.devices:
+            self.wheel.schedule(start + random.uniform(0, self.poll_interval), ('poll', device))
+        self.running.set()
+        self.threads = [threading.Thread(target=self.__work, name='poller-%s' % i) for i in xrange(self.workers)]
+        self.dispatcher = threading.Thread(target=self.__dispatch, name='poller-scheduler')
+        for thread in self.threads + [self.dispatcher]:
+            thread.daemon = True
+            thread.start()
+        self.log.info('Polling with %s devices every %.2fs, %s workers' % (len(self.devices), self.poll_interval,
+                                                                          self.workers))
+        return self
+
+    def __drain(self):
+        """
+        discard the events waiting in the queue
+        :return number of events discarded
+        """
+        discarded = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Queue.Empty:
+                return discarded
+            discarded += 1
+
+    def stop(self):
+        """
+        stop polling, after the requests in progress. The events not started are discarded, so they do not run
+        after a restart
+        """
+        self.running.clear()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        discarded = self.__drain()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.dispatcher = None
+        if discarded:
+            self.log.debug('%s polls and responses discarded' % discarded)
+
+    def close(self):
+        if self.own_transport:
+            self.transport.close()
+
+
+class CommandRoundTripBenchmark(object):
+    """
+    Measure the command round trip: the command attribute of a device entity is updated in ContextBroker (which
+    forwards it to the IoTA), the device polls and answers it, and the IoTA writes the response in the <command>_info
+    attribute, notified to a NotificationReceiver
+    >>> receiver = NotificationReceiver(port=10032).start()
+    >>> benchmark = CommandRoundTripBenchmark(cb, pool, receiver, receiver.url('10.0.0.2'), 'ping', headers)
+    >>> print benchmark.run(commands=1000, rate=50).report()
+    """
+
+    def __init__(self, cb, pool, receiver, notification_url, command, headers=None, description=DEFAULT_DESCRIPTION,
+                 log_instance=None, log_verbosity='INFO'):
+        """
+        Command round trip benchmark constructor
+        :param cb: CbNgsi10v2Utils instance
+        :param pool: CommandPollerPool with the devices (registered in the IoTA with the command)
+        :param receiver: NotificationReceiver started, reachable in notification_url
+        :param notification_url: url of the receiver, as seen by ContextBroker
+        :param command: name of the command
+        :param headers: headers for the requests (fiware-service, fiware-servicepath and x-auth-token)
+        :param description: description of the subscription, used to delete it at the end
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('CommandRoundTripBenchmark', log_verbosity)
+        self.cb = cb
+        self.pool = pool
+        self.receiver = receiver
+        self.notification_url = notification_url
+        self.command = command
+        self.headers = headers or {}
+        self.description = description
+
+    def subscribe(self):
+        entity_types = sorted(set(device.entity_type for device in self.pool.devices))
+        info = self.command + INFO_SUFFIX
+        payload = {'description': self.description,
+                   'subject': {'entities': [{'idPattern': '.*', 'type': entity_type} for entity_type in entity_types],
+                               'condition': {'attrs': [info]}},
+                   'notification': {'http': {'url': self.notification_url}, 'attrs': [info]}}
+        response = self.cb.create_subscription(payload, headers=dict(self.headers))
+        assert response.status_code == 201, 'ERROR: subscription not created (%s): %s' % (response.status_code,
+                                                                                         response.text)
+
+    def send(self, stats, device, token):
+        """
+        update the command attribute of the device entity with the token as value
+        """
+        stats.sent(token, time.time())
+        payload = {self.command: {'type': 'command', 'value': token}}
+        try:
+            response = self.cb.update_entity(payload, device.entity_id, headers=dict(self.headers),
+                                             params={'type': device.entity_type}, method='patch')
+            if response.status_code >= 400:
+                stats.update_failed(token)
+        except Exception, e:
+            self.log.debug('Command update error: %s' % e)
+            stats.update_failed(token)
+
+    def run(self, commands=100, rate=10.0, drain_timeout=30, max_pending=100000):
+        """
+        start the pollers, send the commands to random devices at a fixed rate and wait for the responses
+        :param commands: number of commands sent
+        :param rate: commands per second
+        :param drain_timeout: seconds waited after the last command without receiving responses
+        :param max_pending: max commands waited for (memory bound)
+        :return CommandRoundTripStats
+        """
+        stats = CommandRoundTripStats(max_pending)
+        self.subscribe()
+        self.receiver.reset(stats)
+        self.pool.start(stats)
+        try:
+            start = time.time()
+            for seq in xrange(int(commands)):
+                delay = start + seq / float(rate) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self.send(stats, random.choice(self.pool.devices), 'rt%s_%s' % (int(start), seq))
+            last_waiting = -1
+            last_progress = time.time()
+            while stats.waiting() > 0 and time.time() - last_progress < drain_timeout:
+                if stats.waiting() != last_waiting:
+                    last_waiting = stats.waiting()
+                    last_progress = time.time()
+                time.sleep(0.1)
+        finally:
+            self.pool.stop()
+            self.receiver.reset(None)
+            self.cb.delete_subscriptions(headers=dict(self.headers), description_prefix=self.description)
+        return stats
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import Queue
+import random
+import sys
+import threading
+import time
+from getopt import getopt, GetoptError
+
+from requests.exceptions import RequestException
+
+from iotqatools import json_utils
+from iotqatools.histogram_utils import Histogram
+from iotqatools.helpers_utils import LogLevelConfiguration
+from iotqatools.iot_logger import get_logger
+from iotqatools.iot_tools import PqaTools
+from iotqatools.iota_measures import Gw_Measures_Utils
+from iotqatools.transport_utils import client_transport
+
+# protocols of the simulated devices (MeasuresType of iota_measures) and the content type of their measures
+PROTOCOLS = {'UL': 'text/plain', 'UL2': 'text/plain', 'IoTUL2': 'text/plain', 'IoTJSON': 'application/json'}
+
+
+def random_value(device, alias):
+    return round(random.uniform(0, 100), 2)
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel: the items are stored in the slot of their tick, so scheduling and expiring are O(1)
+    whatever the number of items (a heap would be O(log n) with 50k devices). Not thread safe, it is used by the
+    scheduler thread only
+    """
+
+    def __init__(self, tick=0.01, slots=1024, start=None):
+        """
+        :param tick: resolution, seconds
+        :param slots: number of slots (items beyond a turn wait in their slot until their round)
+        :param start: time of the tick 0 (now by default)
+        """
+        self.tick = float(tick)
+        self.slots = [[] for _ in xrange(int(slots))]
+        self.start = time.time() if start is None else start
+        self.current = 0
+        self.size = 0
+
+    def schedule(self, when, item):
+        """
+        :param when: time when the item expires (past times expire in the next advance)
+        """
+        due = max(int((when - self.start) / self.tick), self.current)
+        self.slots[due % len(self.slots)].append((due, item))
+        self.size += 1
+
+    def advance(self, now):
+        """
+        :return list of the items expired until now, in expiration order
+        """
+        expired = []
+        last = int((now - self.start) / self.tick)
+        while self.current <= last:
+            slot = self.slots[self.current % len(self.slots)]
+            if slot:
+                pending = [entry for entry in slot if entry[0] > self.current]
+                expired.extend(item for due, item in slot if due <= self.current)
+                slot[:] = pending
+            self.current += 1
+        self.size -= len(expired)
+        return expired
+
+    def next_time(self):
+        return self.start + self.current * self.tick
+
+
+class VirtualDevice(object):
+    """
+    Simulated device: its measures url is built once
+    """
+    __slots__ = ('apikey', 'device_id', 'protocol', 'attributes', 'url', 'content_type')
+
+    def __init__(self, apikey, device_id, protocol, attributes, url):
+        self.apikey = apikey
+        self.device_id = device_id
+        self.protocol = protocol
+        self.attributes = attributes
+        self.url = url
+        self.content_type = PROTOCOLS[protocol]
+
+
+class FleetStats(object):
+    """
+    Counters and latency histograms per protocol: reports sent, delivered (2xx), failed (other status or network
+    error) and skipped (not sent because the workers could not keep up with the rate). lag is the delay between
+    the scheduled time of a report and the time it was sent
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.protocols = {}
+        self.start = None
+        self.end = None
+
+    def __protocol(self, protocol):
+        if protocol not in self.protocols:
+            self.protocols[protocol] = {'sent': 0, 'delivered': 0, 'failed': 0, 'skipped': 0,
+                                        'latency': Histogram(), 'lag': Histogram()}
+        return self.protocols[protocol]
+
+    def skipped(self, protocol):
+        with self.lock:
+            self.__protocol(protocol)['skipped'] += 1
+
+    def sent(self, protocol, delivered, latency, lag):
+        with self.lock:
+            stats = self.__protocol(protocol)
+            stats['sent'] += 1
+            stats['delivered' if delivered else 'failed'] += 1
+            stats['latency'].record_seconds(latency)
+            stats['lag'].record_seconds(lag)
+
+    def get(self, protocol, counter):
+        with self.lock:
+            return self.__protocol(protocol)[counter]
+
+    def report(self):
+        """
+        :return text with a line per protocol: counters, rate, latency percentiles and p99 lag (ms)
+        """
+        elapsed = (self.end or time.time()) - (self.start or time.time())
+        lines = ['%-8s %9s %9s %7s %8s %9s %8s %8s %8s %8s' % (
+            'protocol', 'sent', 'delivered', 'failed', 'skipped', 'rate(/s)', 'p50(ms)', 'p95(ms)', 'p99(ms)',
+            'lag99(ms)')]
+        with self.lock:
+            for protocol in sorted(self.protocols):
+                stats = self.protocols[protocol]
+                latency = stats['latency']
+                lines.append('%-8s %9s %9s %7s %8s %9.1f %8.2f %8.2f %8.2f %8.2f' % (
+                    protocol, stats['sent'], stats['delivered'], stats['failed'], stats['skipped'],
+                    stats['sent'] / elapsed if elapsed > 0 else 0.0, latency.percentile(50) / 1000.0,
+                    latency.percentile(95) / 1000.0, latency.percentile(99) / 1000.0,
+                    stats['lag'].percentile(99) / 1000.0))
+        return '\n'.join(lines)
+
+
+class DeviceFleetSimulator(object):
+    """
+    Simulate a fleet of devices sending measures to the IoT Agents. Each device reports periodically; the reports
+    are scheduled on a timer wheel (spread along the period, so the aggregate rate is constant) and sent by a pool
+    of workers over a pooled HttpTransport. The devices have to exist in the IoTA, or their apikey must belong to a
+    service with autoprovisioning
+    >>> fleet = DeviceFleetSimulator('http://iota:7896', rate=10000, workers=200)
+    >>> fleet.add_devices(25000, 'IoTUL2', 'apikey1', attributes=('t', 'h'))
+    >>> fleet.add_devices(25000, 'IoTJSON', 'apikey2', attributes=('t', 'h'))
+    >>> print fleet.run(duration=60).report()
+    """
+
+    def __init__(self, server_root, period=5.0, rate=None, workers=50, queue_size=None, transport=None,
+                 value=random_value, tick=0.01, log_instance=None, log_verbosity='INFO'):
+        """
+        Fleet simulator constructor
+        :param server_root: url of the IoTA south port (ev: http://localhost:7896)
+        :param period: seconds between the reports of each device
+        :param rate: aggregate reports per second (the period is calculated from the number of devices)
+        :param workers: threads sending the reports
+        :param queue_size: max reports waiting for a worker, the rest are skipped (by default 10 per worker)
+        :param transport: HttpTransport (by default one with a connection per worker)
+        :param value: function(device, alias) returning the value of a measure
+        :param tick: resolution of the scheduler, seconds
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('DeviceFleetSimulator', log_verbosity)
+        self.transport, self.own_transport = client_transport(transport, pool_maxsize=int(workers),
+                                                              log_instance=self.log)
+        self.gw = Gw_Measures_Utils(server_root=server_root, transport=self.transport, verbose=False)
+        self.period = float(period)
+        self.rate = rate
+        self.workers = int(workers)
+        self.queue = Queue.Queue(maxsize=int(queue_size or 10 * self.workers))
+        self.value = value
+        self.tick = tick
+        self.devices = []
+        self.stats = FleetStats()
+        self.running = threading.Event()
+
+    def add_devices(self, number, protocol, apikey, prefix='sim', attributes=('t',)):
+        """
+        add virtual devices to the fleet, named <prefix>_<n>
+        :param number: number of devices
+        :param protocol: UL | UL2 | IoTUL2 | IoTJSON
+        :param apikey: apikey of the service
+        :param attributes: aliases of the measures sent in each report
+        :return list of the devices added
+        """
+        if protocol not in PROTOCOLS:
+            raise Exception('Wrong protocol "%s", allowed: %s' % (protocol, ', '.join(sorted(PROTOCOLS))))
+        first = len(self.devices)
+        added = [VirtualDevice(apikey, '%s_%s' % (prefix, first + i), protocol, tuple(attributes),
+                               self.gw.getUrl(protocol, apikey, '%s_%s' % (prefix, first + i)))
+                 for i in xrange(int(number))]
+        self.devices.extend(added)
+        return added
+
+    def payload(self, device):
+        """
+        :return body of a report of the device
+        """
+        if device.protocol == 'IoTJSON':
+            return json_utils.dumps(dict((alias, self.value(device, alias)) for alias in device.attributes))
+        return self.gw.getMeasure(device.protocol, [{'alias': alias, 'value': self.value(device, alias)}
+                                                    for alias in device.attributes])
+
+    def report_period(self):
+        """
+        :return seconds between the reports of a device
+        """
+        if self.rate:
+            return len(self.devices) / float(self.rate)
+        return self.period
+
+    def send(self, device, scheduled):
+        """
+        send a report of the device, logged as the rest of the IoTA requests (see PqaTools.log_fullRequest)
+        """
+        start = time.time()
+        parameters = {'method': 'post', 'url': device.url, 'data': self.payload(device),
+                      'headers': {'Content-Type': device.content_type}}
+        try:
+            response = self.transport.request(**parameters)
+        except RequestException, e:
+            self.stats.sent(device.protocol, False, time.time() - start, start - scheduled)
+            PqaTools.log_requestAndResponse(url=device.url, headers=parameters['headers'], data=parameters['data'],
+                                            comp='IOTA', method='post')
+            self.log.debug('Report of %s failed: %s' % (device.device_id, e))
+            return
+        self.stats.sent(device.protocol, 200 <= response.status_code < 300, time.time() - start, start - scheduled)
+        PqaTools.log_fullRequest(comp='IOTA', response=response, params=parameters)
+
+    def __work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self.send(*item)
+
+    def __schedule(self, wheel, period, end):
+        """
+        expire the reports of the timer wheel, queue them and schedule the next report of each device
+        """
+        while self.running.is_set():
+            now = time.time()
+            if now >= end:
+                break
+            for device, scheduled in wheel.advance(now):
+                try:
+                    self.queue.put_nowait((device, scheduled))
+                except Queue.Full:
+                    self.stats.skipped(device.protocol)
+                if scheduled + period < end:
+                    wheel.schedule(scheduled + period, (device, scheduled + period))
+            time.sleep(max(wheel.next_time() - time.time(), 0))
+
+    def run(self, duration):
+        """
+        run the simulation: each device reports every period (its first report at a random time of the first
+        period) until the duration elapses, then wait for the reports queued
+        :param duration: seconds
+        :return FleetStats
+        """
+        assert self.devices, 'ERROR: the fleet has no devices'
+        period = self.report_period()
+        self.log.info('Simulating %s devices, a report every %.2fs (%.1f reports/s), %s workers' % (
+            len(self.devices), period, len(self.devices) / period, self.workers))
+        self.stats = FleetStats()
+        start = time.time()
+        wheel = TimerWheel(self.tick, slots=min(int(period / self.tick) + 1, 4096), start=start)
+        offsets = range(len(self.devices))
+        random.shuffle(offsets)
+        for device, offset in zip(self.devices, offsets):
+            scheduled = start + period * offset / len(self.devices)
+            wheel.schedule(scheduled, (device, scheduled))
+        workers = [threading.Thread(target=self.__work, name='fleet-worker-%s' % i) for i in xrange(self.workers)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        self.running.set()
+        self.stats.start = start
+        try:
+            self.__schedule(wheel, period, start + duration)
+        finally:
+            self.running.clear()
+            for _ in workers:
+                self.queue.put(None)
+            for worker in workers:
+                worker.join()
+            self.stats.end = time.time()
+        return self.stats
+
+    def stop(self):
+        """
+        stop a simulation running in other thread
+        """
+        self.running.clear()
+
+    def close(self):
+        if self.own_transport:
+            self.transport.close()
+
+
+def usage():
+    """
+    Print usage message
+    """
+    print('Usage: python -m iotqatools.iota_fleet_utils --apikey <apikey> [options]')
+    print('')
+    print('Parameters:')
+    print("  --server <url>: IoTA south url (default is 'http://127.0.0.1:7896')")
+    print("  --apikey <apikey>: apikey of the devices")
+    print("  --devices <n>: number of devices of each protocol (default is 1000)")
+    print("  --protocols <p,q>: protocols of the devices, UL, UL2, IoTUL2, IoTJSON (default is IoTUL2)")
+    print("  --period <secs>: seconds between the reports of each device (default is 5)")
+    print("  --rate <n>: aggregate reports per second (overrides the period)")
+    print("  --duration <secs>: seconds of simulation (default is 60)")
+    print("  --workers <n>: threads sending reports (default is 50)")
+    print("  --attributes <a,b>: aliases of the measures (default is t)")
+    print("  -u: print this usage message")
+
+
+def main(argv):
+    try:
+        opts, args = getopt(argv, 'u', ['server=', 'apikey=', 'devices=', 'protocols=', 'period=', 'rate=',
+                                        'duration=', 'workers=', 'attributes='])
+    except GetoptError, e:
+        print(str(e))
+        usage()
+        return 1
+
+    options = {'--server': 'http://127.0.0.1:7896', '--devices': '1000', '--protocols': 'IoTUL2', '--period': '5',
+               '--duration': '60', '--workers': '50', '--attributes': 't'}
+    for opt, arg in opts:
+        if opt == '-u':
+            usage()
+            return 0
+        options[opt] = arg
+    if '--apikey' not in options:
+        usage()
+        return 1
+
+    # request logging is too expensive during the simulation
+    LogLevelConfiguration.default_log_level = 'ERROR'
+    fleet = DeviceFleetSimulator(options['--server'], period=float(options['--period']),
+                                 rate=float(options['--rate']) if '--rate' in options else None,
+                                 workers=int(options['--workers']))
+    for protocol in options['--protocols'].split(','):
+        fleet.add_devices(int(options['--devices']), protocol, options['--apikey'], prefix='sim_%s' % protocol,
+                          attributes=options['--attributes'].split(','))
+    try:
+        print(fleet.run(float(options['--duration'])).report())
+    finally:
+        fleet.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -25,9 +25,12 @@ please contact with::[iot_support@tid.es]
 __author__ = 'gtsa07'
 
 
+import re
+import string
+
 # imports 3rd party libs
-import requests
 from iotqatools.iot_tools import PqaTools
+from iotqatools.transport_utils import client_transport
 import urllib2
 
 # Params GW
@@ -40,16 +43,139 @@ MeasuresType = {
     "IoTUL2": "/iot/ul?k={}&i={}",
     "IoTRepsol": "/iot/repsol",
     "IoTTT": "/iot/tt",
+    "IoTJSON": "/iot/json?k={}&i={}",
     "IoTEvadts": "/iot/evadts?apikey={}&ID={}",
     "RegLight": "/idas/2.0?apikey={}"
 }
 
+# UL booleans (whole fields) sent as 1/0 and chars replaced in the UL measures
+UL_BOOLEANS = re.compile(r'(?:^|(?<=[|#]))(?:True|False|true|false)(?=[|#]|$)')
+UL_CHARS = string.maketrans(';&', '/|')
+IOT_CHARS = string.maketrans("'", '"')
+# fields of the IoTRepsol messages
+REPSOL_KEYS = ('id', 'from', 'to', 'message', 'timestamp')
+
+
+def field_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def ul_boolean(match):
+    return '1' if match.group(0)[0] in 'Tt' else '0'
+
+
+class MeasureEncoder(object):
+    """
+    Encoder of the measures of a protocol (UL, UL2, IoTUL2, IoTRepsol), built once: the format of a measure and its
+    keys are precomputed, the measures are joined once and the special chars are replaced with one translation
+    table. The output is the same as Gw_Measures_Utils.getMeasure (utf-8 bytes), except that true/false are only
+    replaced when they are a whole field (not inside other values) and the IoTRepsol fields have a fixed order
+    >>> encoder = MeasureEncoder('IoTUL2')
+    >>> encoder.encode([{'alias': 't', 'value': 20}, {'alias': 'h', 'value': 50}])
+    '|t|20#|h|50'
+    >>> encoder.encode_many([[{'alias': 't', 'value': 20}], [{'alias': 't', 'value': 21}]])
+    ['|t|20', '|t|21']
+    """
+
+    def __init__(self, protocol, field=None):
+        """
+        :param protocol: UL | UL2 | IoTUL2 | IoTRepsol
+        :param field: field not sent in the IoTRepsol messages (from, message or timestamp)
+        """
+        if protocol == 'UL':
+            self.keys = ('timestamp', 'id', 'alias', 'value')
+            self.format = '||%s|%s||%s|%s'
+        elif protocol in ('UL2', 'IoTUL2'):
+            self.keys = ('timestamp', 'alias', 'value')
+            self.format = '%s|%s|%s'
+        elif protocol == 'IoTRepsol':
+            self.keys = tuple(key for key in REPSOL_KEYS if key != field)
+            self.format = '{%s}' % ', '.join('"%s": %%s' % key for key in self.keys)
+        else:
+            raise Exception('Wrong protocol "%s", allowed: UL, UL2, IoTUL2, IoTRepsol' % protocol)
+        self.protocol = protocol
+        self.booleans = 'IoT' not in protocol
+        self.chars = UL_CHARS if 'IoT' not in protocol else IOT_CHARS
+
+    def fields(self, measure):
+        """
+        :return tuple with the fields of a measure, as utf-8 bytes
+        """
+        if self.protocol == 'IoTRepsol':
+            fields = {'id': field_text(measure.get('id', '')),
+                      'from': 'tel:%s;phone-context=+34' % field_text(measure.get('device', '')),
+                      'to': 'tel:+123123123;phone-context=+34',
+                      'message': field_text(measure.get('message', '')),
+                      'timestamp': field_text(measure.get('timestamp', ''))}
+            return tuple(repr(fields[key]) for key in self.keys)
+        return tuple(field_text(measure.get(key, '')) for key in self.keys)
+
+    def __encode(self, measures):
+        format, keys = self.format, self.keys
+        if self.protocol == 'IoTRepsol':
+            text = '#'.join([format % self.fields(measure) for measure in measures])
+        else:
+            try:
+                text = '#'.join([format % tuple([measure.get(key, '') for key in keys]) for measure in measures])
+                if isinstance(text, unicode):
+                    text = text.encode('utf-8')
+            except UnicodeError:
+                # non ascii unicode values mixed with utf-8 bytes
+                text = '#'.join([format % self.fields(measure) for measure in measures])
+        text = text.translate(self.chars)
+        if self.booleans and ('rue' in text or 'alse' in text):
+            text = UL_BOOLEANS.sub(ul_boolean, text)
+        return text
+
+    def encode(self, measures):
+        """
+        encode the measures of a device in a payload
+        :param measures: list of dicts (see Gw_Measures_Utils.getMeasure)
+        :return payload, bytes (IoTRepsol payloads only have the last measure)
+        """
+        if self.protocol == 'IoTRepsol':
+            measures = measures[-1:]
+        return self.__encode(measures)
+
+    def encode_many(self, devices_measures):
+        """
+        encode the measures of many devices (or many IoTRepsol messages) at once
+        :param devices_measures: list with a list of measures per device
+        :return list of payloads
+        """
+        return [self.encode(measures) for measures in devices_measures]
+
+
+# encoders built, per protocol and IoTRepsol field
+__encoders__ = {}
+
+
+def get_encoder(protocol, field=None):
+    """
+    :return the MeasureEncoder of a protocol (None if the protocol has not an encoder)
+    """
+    key = (protocol, field if protocol == 'IoTRepsol' and field in ('from', 'message', 'timestamp') else None)
+    if key not in __encoders__:
+        try:
+            __encoders__[key] = MeasureEncoder(protocol, key[1])
+        except Exception:
+            __encoders__[key] = None
+    return __encoders__[key]
+
 
 class Gw_Measures_Utils(object):
     """Constructor"""
 
     def __init__(self, **kwargs):
         self.server_root = kwargs.get('server_root', SERVER_ROOT)
+        # HttpTransport shared with other clients (None creates one for this client)
+        self.transport, self.own_transport = client_transport(kwargs.get('transport'))
+        # print the urls and payloads sent
+        self.verbose = kwargs.get('verbose', False)
 
     """General Methods"""
 
@@ -103,9 +229,10 @@ class Gw_Measures_Utils(object):
             url += '&ip='
             url += field["ip"]
 
-        print 'url: ' + url
+        if self.verbose:
+            print 'url: ' + url
         data = self.getMeasure(measure_type, measures, field)
-        res = requests.post(url,headers = {'content-type': 'text/plain'},data=data)
+        res = self.transport.post(url, headers={'content-type': 'text/plain'}, data=data)
 
         #log request
         PqaTools.log_requestAndResponse(url=url, headers={}, data=data, comp='IOTA', response=res, method='post')
@@ -125,8 +252,15 @@ class Gw_Measures_Utils(object):
 """
 
     def getMeasure(self, protocol, measures, field={}):
+        if self.verbose:
+            print measures
+        encoder = get_encoder(protocol, field if isinstance(field, basestring) else None)
+        if encoder is not None:
+            result = encoder.encode(measures)
+            if self.verbose:
+                print result
+            return result
         result = ""
-        print measures
         for measure in measures:
             # Format type UL or UL2
             if protocol == "UL":
@@ -150,7 +284,8 @@ class Gw_Measures_Utils(object):
                 result = str(measure)
         if "UL" in protocol:
             result = result.rpartition("#")[0]  # delete the last "#"
-        print result
+        if self.verbose:
+            print result
         # Replace specials words and characters
         replaces = {
             "True": "1",
@@ -169,7 +304,8 @@ class Gw_Measures_Utils(object):
 
     def sendRegister(self, apikey, device, asset, model, phenomena):
         url = self.getUrl('RegLight', apikey, device)
-        print 'url: ' + url
+        if self.verbose:
+            print 'url: ' + url
         uom_id = 1
         result = "<rs>"
         result += "<id href=\"1:1\">" + device + "</id>"
@@ -177,7 +313,8 @@ class Gw_Measures_Utils(object):
         result += "<param name=\"ModelName\">"
         result += "<text>" + model + "</text>"
         result += "</param>"
-        print phenomena
+        if self.verbose:
+            print phenomena
         for phenom in phenomena:
             result += "<what href=\"" + str(phenom.get("href", "")) + "\" id=\"" + str(phenom.get("alias", "")) + "\"/>"
         for phenom in phenomena:
@@ -190,8 +327,9 @@ class Gw_Measures_Utils(object):
             uom_id += 1
             result += "</data>"
         result += "</rs>"
-        print result
-        res = requests.post(url, data=result)
+        if self.verbose:
+            print result
+        res = self.transport.post(url, data=result)
 
         #log request
         PqaTools.log_requestAndResponse(url=url, headers={}, data=result, comp='IOTA', response=res, method='post')
@@ -210,8 +348,9 @@ class Gw_Measures_Utils(object):
         url = self.getUrl(measure_type, apikey, idDevice)
         if ip:
             url += "&ip=" + ip
-        print 'url: ' + url
-        res = requests.get(url)
+        if self.verbose:
+            print 'url: ' + url
+        res = self.transport.get(url)
 
         #log request
         PqaTools.log_requestAndResponse(url=url, headers={}, data='', comp='IOTA', response=res, method='get')
@@ -227,9 +366,10 @@ class Gw_Measures_Utils(object):
 
     def SendCmdResponse(self, measure_type, apikey, idDevice, command, response):
         url = self.getUrl(measure_type, apikey, idDevice, command)
-        print 'url: ' + url
+        if self.verbose:
+            print 'url: ' + url
         data = str(command) + "|" + str(response)
-        res = requests.post(url, data=data)
+        res = self.transport.post(url, data=data)
 
         #log request
         PqaTools.log_requestAndResponse(url=url, headers={}, data=data, comp='IOTA', response=res, method='post')
@@ -26,10 +26,15 @@ __author__ = 'gtsa07'
 
 # Standard library imports
 import json
+import threading
+import time
 
 # 3rd party libraries
 import requests
+from iotqatools import json_utils
 from iotqatools.iot_tools import PqaTools
+from iotqatools.pagination_utils import iter_pages
+from iotqatools.transport_utils import client_transport
 
 # Params APIREST
 SERVER_ROOT = 'http://localhost:5371/m2m/v2'
@@ -67,6 +72,73 @@ ProtocolTypes = {
 }
 
 
+class ExistenceCache(object):
+    """
+    Results of the existence checks of services and devices, per (service, subservice, device, protocol), valid
+    during ttl seconds (0 disables the cache). Shared by the threads of a client
+    """
+
+    def __init__(self, ttl=0, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        :return the cached result (True or False), None if it is not cached or it is expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self):
+        """
+        :return number of invalidations, taken before asking the agent (see put)
+        """
+        with self.lock:
+            return self.invalidations
+
+    def put(self, key, exists, generation=None):
+        """
+        cache a result, unless the cache was invalidated after the given generation (the answer could be stale)
+        """
+        if self.ttl > 0:
+            with self.lock:
+                if generation is None or generation == self.invalidations:
+                    self.entries[key] = (exists, self.clock() + self.ttl)
+
+    def invalidate(self, service_name=None):
+        """
+        remove the results of a service (in every subservice), or all of them
+        """
+        with self.lock:
+            if service_name is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == service_name]:
+                    del self.entries[key]
+            self.invalidations += 1
+
+    def stats(self):
+        """
+        :return dict with the hits (requests saved), misses, invalidations and cached entries
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                    'entries': len(self.entries)}
+
+
+
 class Rest_Utils_IoTA(object):
     """Constructor"""
 
@@ -80,6 +152,10 @@ class Rest_Utils_IoTA(object):
         self.def_entity_type = kwargs.get('def_entity_type', DEF_ENTITY_TYPE)
         self.cbroker = kwargs.get('cbroker', CBROKER_URL)
         self.token = kwargs.get('token', TOKEN)
+        # HttpTransport shared with other clients (None creates one for this client)
+        self.transport, self.own_transport = client_transport(kwargs.get('transport'))
+        # seconds the results of service_created and device_created are reused (0 asks the agent every time)
+        self.existence_cache = ExistenceCache(kwargs.get('cache_ttl', 0))
 
     """General Methods"""
 
@@ -94,6 +170,13 @@ class Rest_Utils_IoTA(object):
             url += "/" + str(pattern)
         return url
 
+    def invalidate_existence_cache(self, headers={}):
+        """
+        forget the cached existence checks of the service of the headers (all the services without the header).
+        Called by every request changing services or devices
+        """
+        self.existence_cache.invalidate(headers.get(self.srv_header))
+
     def compose_headers(self, headers):
         headers["Content-Type"] = "application/json"
         if self.token:
@@ -119,7 +202,7 @@ class Rest_Utils_IoTA(object):
             else:
                 path = self.compose_url(args)
             if 'data' in kwargs:
-                kwargs['data'] = json.dumps(kwargs['data'])
+                kwargs['data'] = json_utils.dumps(kwargs['data'])
             return func(self, path, **kwargs)
 
         return wrapper
@@ -136,10 +219,10 @@ class Rest_Utils_IoTA(object):
             elif "Content-Type" in headers:  # used in Requests library version 2.11.1 or higher
                 headers.pop("Content-Type", None)
 
-            res = requests.get(url=path,
-                               headers=headers,
-                               params=params,
-                               verify=verify)
+            res = self.transport.get(url=path,
+                                     headers=headers,
+                                     params=params,
+                                     verify=verify)
 
         except requests.exceptions.Timeout:
             PqaTools.log_requestAndResponse(url=path,
@@ -175,11 +258,11 @@ class Rest_Utils_IoTA(object):
     def api_post(self, path, headers={}, params={}, data={}, verify=False):
         res = None
         try:
-            res = requests.post(url=path,
-                                data=data,
-                                headers=headers,
-                                params=params,
-                                verify=verify)
+            res = self.transport.post(url=path,
+                                      data=data,
+                                      headers=headers,
+                                      params=params,
+                                      verify=verify)
 
         except requests.exceptions.Timeout:
             PqaTools.log_requestAndResponse(url=path,
@@ -215,11 +298,11 @@ class Rest_Utils_IoTA(object):
     def api_put(self, path, headers={}, params={}, data={}, verify=False):
         res = None
         try:
-            res = requests.put(url=path,
-                               data=data,
-                               headers=headers,
-                               params=params,
-                               verify=verify)
+            res = self.transport.put(url=path,
+                                     data=data,
+                                     headers=headers,
+                                     params=params,
+                                     verify=verify)
 
         except requests.exceptions.Timeout:
             PqaTools.log_requestAndResponse(url=path,
@@ -259,10 +342,10 @@ class Rest_Utils_IoTA(object):
             elif "Content-Type" in headers:  # used in Requests library version 2.11.1 or higher
                 headers.pop("Content-Type", None)
 
-            res = requests.delete(url=path,
-                                  headers=headers,
-                                  params=params,
-                                  verify=verify)
+            res = self.transport.delete(url=path,
+                                        headers=headers,
+                                        params=params,
+                                        verify=verify)
         except requests.exceptions.Timeout:
             PqaTools.log_requestAndResponse(url=path,
                                             params=params,
@@ -318,6 +401,7 @@ class Rest_Utils_IoTA(object):
     def post_service(self, json, headers={}, params={}):
         headers = self.compose_headers(headers)
         res = self.api_post(self.services, headers=headers, data=json)
+        self.invalidate_existence_cache(headers)
         return res
 
     def put_service(self, nameService, json, headers={}, params={}):
@@ -326,6 +410,7 @@ class Rest_Utils_IoTA(object):
             res = self.api_put(self.services, nameService, headers=headers, data=json)
         else:
             res = self.api_put(self.services, headers=headers, params=params, data=json)
+        self.invalidate_existence_cache(headers)
         return res
 
     def delete_service(self, nameService={}, headers={}, params={}):
@@ -334,6 +419,7 @@ class Rest_Utils_IoTA(object):
             res = self.api_delete(self.services, nameService, headers=headers)
         else:
             res = self.api_delete(self.services, headers=headers, params=params)
+        self.invalidate_existence_cache(headers)
         return res
 
     """Devices Methods"""
@@ -351,16 +437,19 @@ class Rest_Utils_IoTA(object):
     def post_device(self, json, headers={}, params={}):
         headers = self.compose_headers(headers)
         res = self.api_post(self.devices, headers=headers, data=json)
+        self.invalidate_existence_cache(headers)
         return res
 
     def put_device(self, nameDevice, json, headers={}, params={}):
         headers = self.compose_headers(headers)
         res = self.api_put(self.devices, nameDevice, headers=headers, params=params, data=json)
+        self.invalidate_existence_cache(headers)
         return res
 
     def delete_device(self, nameDevice, headers={}, params={}):
         headers = self.compose_headers(headers)
         res = self.api_delete(self.devices, nameDevice, headers=headers, params=params)
+        self.invalidate_existence_cache(headers)
         return res
 
     """Complex Services Methods"""
@@ -378,13 +467,17 @@ class Rest_Utils_IoTA(object):
             params['resource'] = resource
         if keystone_token:
             self.token = keystone_token
+        key = (headers[self.srv_header], headers.get(self.srv_path_header), None, resource or None)
+        cached = self.existence_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.existence_cache.generation()
         service = self.get_service('', headers, params)
         if service.status_code == 200:
             serv = service.json()
-            if serv['count'] == 1:
-                return True
-            else:
-                return False
+            exists = serv['count'] == 1
+            self.existence_cache.put(key, exists, generation)
+            return exists
         else:
             return False
 
@@ -493,6 +586,17 @@ class Rest_Utils_IoTA(object):
         req = self.get_service('', headers, params)
         return req
 
+    def iter_services(self, service_name, service_path={}, resource={}, protocol={}, page_size=100, prefetch=True):
+        """
+        generator of the services (dicts) of a service path, walking the pages of the agent (limit/offset). Only one
+        page is kept in memory (plus the next one, requested while the current one is consumed if prefetch)
+        """
+        def fetch(offset):
+            return self.get_service_with_params(service_name, service_path, resource, limit=str(page_size),
+                                                offset=str(offset), protocol=protocol)
+
+        return self.__iter_pages(fetch, 'services', page_size, prefetch)
+
     def update_service_with_params(self, json, service_name, service_path={}, resource={}, apikey={}):
         params = {}
         headers = {}
@@ -551,15 +655,53 @@ class Rest_Utils_IoTA(object):
             headers[self.srv_path_header] = '/'
         if keystone_token:
             self.token = keystone_token
+        key = (headers[self.srv_header], headers.get(self.srv_path_header), device_name, None)
+        cached = self.existence_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self.existence_cache.generation()
         device = self.get_device(device_name, headers)
         if device.status_code == 200:
             data = json.loads(device.text)
-            if "count" in data:
-                return data["count"] > 0
-            else:
-                return True
+            exists = data["count"] > 0 if "count" in data else True
+        elif device.status_code == 404:
+            exists = False
         else:
             return False
+        self.existence_cache.put(key, exists, generation)
+        return exists
+
+    def build_device(self, device_name, apikey={}, endpoint={}, transport={}, commands={}, entity_name={},
+                     entity_type={}, attributes={}, static_attributes={}, protocol={}):
+        """
+        build the description of a device, as sent in the devices list of POST /iot/devices
+        """
+        device = {}
+        if device_name:
+            if device_name == 'void':
+                device_name = ""
+            device['device_id'] = device_name
+        if apikey:
+            device['apikey'] = apikey
+        if commands:
+            device['commands'] = commands
+        if endpoint:
+            device['endpoint'] = endpoint
+        if transport:
+            device['transport'] = transport
+        if entity_type:
+            device['entity_type'] = entity_type
+        if entity_name:
+            device['entity_name'] = entity_name
+        if attributes:
+            device['attributes'] = attributes
+        if static_attributes:
+            device['static_attributes'] = static_attributes
+        if protocol:
+            if protocol == "void":
+                protocol = ""
+            device['protocol'] = protocol
+        return device
 
     def create_device(self, service_name, device_name, apikey={}, service_path={}, endpoint={}, transport={}, commands={},
                       entity_name={}, entity_type={}, attributes={}, static_attributes={}, protocol={},
@@ -574,39 +716,33 @@ class Rest_Utils_IoTA(object):
             headers[self.srv_path_header] = '/'
         device = {
             "devices": [
-                {
-                }
+                self.build_device(device_name, apikey, endpoint, transport, commands, entity_name, entity_type,
+                                  attributes, static_attributes, protocol)
             ]
         }
-        if device_name:
-            if device_name == 'void':
-                device_name = ""
-            device['devices'][0]['device_id'] = device_name
-        if apikey:
-            device['devices'][0]['apikey'] = apikey
-        if commands:
-            device['devices'][0]['commands'] = commands
-        if endpoint:
-            device['devices'][0]['endpoint'] = endpoint
-        if transport:
-            device['devices'][0]['transport'] = transport
-        if entity_type:
-            device['devices'][0]['entity_type'] = entity_type
-        if entity_name:
-            device['devices'][0]['entity_name'] = entity_name
-        if attributes:
-            device['devices'][0]['attributes'] = attributes
-        if static_attributes:
-            device['devices'][0]['static_attributes'] = static_attributes
-        if protocol:
-            if protocol == "void":
-                protocol = ""
-            device['devices'][0]['protocol'] = protocol
         if keystone_token:
             self.token = keystone_token
         req = self.post_device(device, headers)
         return req
 
+    def create_devices(self, service_name, devices, service_path={}, keystone_token={}):
+        """
+        register many devices with one request (array form of POST /iot/devices)
+        :param devices: list of device descriptions (see build_device)
+        """
+        headers = {}
+        if not service_name == 'void':
+            headers[self.srv_header] = str(service_name)
+        if service_path:
+            if not service_path == 'void':
+                headers[self.srv_path_header] = str(service_path)
+        else:
+            headers[self.srv_path_header] = '/'
+        if keystone_token:
+            self.token = keystone_token
+        req = self.post_device({"devices": list(devices)}, headers)
+        return req
+
     def get_device_with_params(self, service_name, device_name, service_path={}, protocol={}, keystone_token={}):
         headers = {}
         params = {}
@@ -656,6 +792,36 @@ class Rest_Utils_IoTA(object):
         req = self.get_listDevices(headers, params)
         return req
 
+    def iter_devices(self, service_name, service_path={}, protocol={}, entity={}, detailed={}, page_size=100,
+                     prefetch=True, keystone_token={}):
+        """
+        generator of the devices (dicts) of a service path, walking the pages of the agent (limit/offset). Only one
+        page is kept in memory (plus the next one, requested while the current one is consumed if prefetch)
+        """
+        if keystone_token:
+            self.token = keystone_token
+
+        def fetch(offset):
+            return self.get_devices_with_params(service_name, service_path, protocol, entity, detailed,
+                                                limit=str(page_size), offset=str(offset))
+
+        return self.__iter_pages(fetch, 'devices', page_size, prefetch)
+
+    @staticmethod
+    def __iter_pages(fetch, key, page_size, prefetch):
+        """
+        generator walking the pages of fetch(offset). The total is taken from the count of the response (see
+        pagination_utils.iter_pages)
+        """
+        def fetch_page(offset):
+            response = fetch(offset)
+            assert response not in (None, 'ERROR') and response.status_code == 200, \
+                'ERROR: listing %s (offset %s) returns %s' % (key, offset, getattr(response, 'text', response))
+            body = json_utils.response_json(response)
+            return body.get(key, []), body.get('count')
+
+        return iter_pages(fetch_page, page_size, prefetch=prefetch)
+
     def update_device_with_params(self, json, device_name, service_name, service_path={}, protocol={},
                                   keystone_token={}):
         params = {}
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+
+# optional faster backends, the first one installed is used (pip install ujson)
+try:
+    import ujson
+except ImportError:
+    ujson = None
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+UJSON = 'ujson'
+SIMPLEJSON = 'simplejson'
+STDLIB = 'json'
+COMPACT = (',', ':')
+
+
+def available_backends():
+    """
+    :return list of the backends installed, the fastest first
+    """
+    backends = []
+    if ujson is not None:
+        backends.append(UJSON)
+    if simplejson is not None:
+        backends.append(SIMPLEJSON)
+    backends.append(STDLIB)
+    return backends
+
+
+class JsonCodec(object):
+    """
+    JSON serialization of the request and response bodies. dumps returns bytes ready to be sent, by default the
+    same ones as json.dumps (non ascii chars escaped, default separators); loads accepts bytes or unicode
+    >>> codec = JsonCodec()
+    >>> codec.dumps({'id': u'habitación'}, ensure_ascii=False, compact=True)
+    '{"id":"habitaci\\xc3\\xb3n"}'
+    """
+
+    def __init__(self, backend=None):
+        """
+        :param backend: ujson | simplejson | json (by default the fastest installed)
+        """
+        if backend is None:
+            backend = available_backends()[0]
+        if backend not in available_backends():
+            raise Exception('JSON backend "%s" is not installed, available: %s' % (backend, available_backends()))
+        self.backend = backend
+        if backend == UJSON:
+            self.__dumps = self.__ujson_dumps
+            self.loads = ujson.loads
+        elif backend == SIMPLEJSON:
+            self.__dumps = self.__simplejson_dumps
+            self.loads = simplejson.loads
+        else:
+            self.__dumps = self.__stdlib_dumps
+            self.loads = json.loads
+
+    @staticmethod
+    def __ujson_dumps(value, ensure_ascii, compact):
+        if not compact:
+            # ujson has not separators, only the compact output is its own
+            return json.dumps(value, ensure_ascii=ensure_ascii)
+        return ujson.dumps(value, ensure_ascii=ensure_ascii, escape_forward_slashes=False)
+
+    @staticmethod
+    def __simplejson_dumps(value, ensure_ascii, compact):
+        return simplejson.dumps(value, ensure_ascii=ensure_ascii, separators=COMPACT if compact else None)
+
+    @staticmethod
+    def __stdlib_dumps(value, ensure_ascii, compact):
+        return json.dumps(value, ensure_ascii=ensure_ascii, separators=COMPACT if compact else None)
+
+    def dumps(self, value, ensure_ascii=True, compact=False):
+        """
+        :param ensure_ascii: escape the non ascii chars (if False they are sent as utf-8)
+        :param compact: without spaces after the separators
+        :return JSON of the value, as bytes
+        """
+        text = self.__dumps(value, ensure_ascii, compact)
+        if isinstance(text, unicode):
+            return text.encode('utf-8')
+        return text
+
+    def pretty(self, value):
+        """
+        :return JSON of the value indented and with sorted keys (for the logs, always stdlib)
+        """
+        return json.dumps(value, sort_keys=True, indent=4, separators=(',', ': '), ensure_ascii=False)
+
+    def response_json(self, response):
+        """
+        parse the body of a response from its bytes (without decoding response.text, which can guess the charset
+        with chardet). The result is cached in the response, so it is parsed once and only if it is used. Every call
+        returns the same object: it must not be changed (copy it before)
+        :return parsed body
+        """
+        try:
+            return response.__parsed_json__
+        except AttributeError:
+            pass
+        parsed = self.loads(response.content)
+        response.__parsed_json__ = parsed
+        return parsed
+
+
+# codec used by all the clients
+codec = JsonCodec()
+
+
+def set_backend(backend=None):
+    """
+    change the backend of the codec used by all the clients
+    :param backend: ujson | simplejson | json (by default the fastest installed)
+    """
+    global codec
+    codec = JsonCodec(backend)
+
+
+def dumps(value, ensure_ascii=True, compact=False):
+    return codec.dumps(value, ensure_ascii, compact)
+
+
+def loads(text):
+    return codec.loads(text)
+
+
+def pretty(value):
+    return codec.pretty(value)
+
+
+def response_json(response):
+    return codec.response_json(response)
@@ -24,10 +24,11 @@ please contact with::[iot_support@tid.es]
 
 import json
 import re
-import requests
-from iotqatools.iot_tools import PqaTools
+from iotqatools import json_utils
+from iotqatools.iot_tools import LazyLogMessage, PqaTools, snapshot
 
 from iotqatools.iot_logger import get_logger
+from iotqatools.transport_utils import client_transport
 
 log = get_logger('keystone', 'ERROR')
 
@@ -48,10 +49,24 @@ ENDPOINTS = {
 }
 
 class RequestUtils(object):
+    # HttpTransport shared with other clients (None creates one the first time it is used, see get_transport)
+    transport = None
+
+    @staticmethod
+    def get_transport():
+        """
+        :return HttpTransport used by the Keystone requests
+        """
+        if RequestUtils.transport is None:
+            RequestUtils.transport, _ = client_transport(log_instance=log)
+        return RequestUtils.transport
+
     @staticmethod
-    def send(endpoint, method, headers={}, payload={}, url_parameters_list=[], query={}, verify=False):
+    def send(endpoint, method, headers={}, payload={}, url_parameters_list=[], query={}, verify=False,
+             transport=None):
         """
         Send a request to a specific endpoint in a specifig type of http request
+        :param transport: HttpTransport used in this request (by default RequestUtils.transport)
         """
         if url_parameters_list != []:
             log.debug('Setting the parameters "%s" in the url "%s' % (url_parameters_list, endpoint))
@@ -69,8 +84,8 @@ class RequestUtils(object):
             log.debug('\t*Headers:\n %s' % headers)
         if payload != {}:
             try:
-                parameters.update({'data': json.dumps(payload)})
-                log.debug('\t*Payload:\n %s' % json.dumps(payload, sort_keys=True, indent=4, separators=(',', ': ')))
+                parameters.update({'data': json_utils.dumps(payload)})
+                log.debug('\t*Payload:\n %s', LazyLogMessage(json_utils.pretty, snapshot(payload)))
             except ValueError:
                 parameters.update({'data': payload})
                 log.debug('\t*Payload:\n %s' % payload)
@@ -81,7 +96,7 @@ class RequestUtils(object):
             parameters.update({'verify': verify})
             log.debug('\t*Verify:\n %s' % verify)
         log.debug('End Sending\n**************************************************************************************')
-        response = requests.request(**parameters)
+        response = (transport or RequestUtils.get_transport()).request(**parameters)
         PqaTools.log_fullRequest(comp='KS', response=response, params=parameters)
 
         return response
@@ -92,7 +107,7 @@ class RequestUtils(object):
         Get a specific key from a json response
         """
         try:
-            dict_ = json.loads(response.text)
+            dict_ = json_utils.response_json(response)
         except ValueError:
             raise NameError('The response is not a Json, the response is: {response}'.format(response=response.text))
         if value in dict_:
@@ -943,7 +958,8 @@ class KeystoneUtils(object):
             }
         }
         try:
-            response = requests.post('http://%s:%s/v3/auth/tokens' % (ip, port), headers=header, data=json.dumps(payload))
+            response = RequestUtils.get_transport().post('http://%s:%s/v3/auth/tokens' % (ip, port), headers=header,
+                                                         data=json.dumps(payload))
             if response.status_code != 201:
                 return response
             else:
@@ -983,7 +999,8 @@ class KeystoneUtils(object):
             }
         }
         try:
-            response = requests.post('http://%s:%s/v3/auth/tokens' % (ip, port), headers=header, data=json.dumps(payload))
+            response = RequestUtils.get_transport().post('http://%s:%s/v3/auth/tokens' % (ip, port), headers=header,
+                                                         data=json.dumps(payload))
             if response.status_code != 201:
                 return response
             else:
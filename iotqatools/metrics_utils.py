@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import re
+import threading
+import time
+from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from iotqatools.histogram_utils import Histogram
+from iotqatools.iot_tools import PqaTools
+
+# metrics recorded per component, method and route. Times in microseconds, sizes in bytes
+CONNECT = 'connect'
+TTFB = 'ttfb'
+TOTAL = 'total'
+REQUEST_SIZE = 'request_size'
+RESPONSE_SIZE = 'response_size'
+METRICS = (CONNECT, TTFB, TOTAL, REQUEST_SIZE, RESPONSE_SIZE)
+
+# path segments followed by an id (Orion, IoTA, STH and Keystone resources)
+ID_COLLECTIONS = set(['entities', 'types', 'attrs', 'subscriptions', 'registrations', 'devices', 'type', 'id',
+                      'attributes', 'projects', 'users', 'groups', 'roles', 'domains', 'credentials'])
+VERSION_SEGMENT = re.compile(r'^v\d+(\.\d+)*$')
+DIGITS = re.compile(r'\d')
+ID = '{id}'
+
+# connect time of the current request, per thread (see TimedHTTPAdapter)
+__timings__ = threading.local()
+
+
+def route_template(url):
+    """
+    get the route of an url, with the ids collapsed: the segments after a collection (entities, devices, ...) and
+    the ones with digits (except versions). Ev:
+        http://cb:1026/v2/entities/room_1/attrs/temperature?type=Room -> /v2/entities/{id}/attrs/{id}
+    """
+    segments = urlparse(url).path.split('/')
+    route = []
+    previous = None
+    for segment in segments:
+        if segment != '' and (previous in ID_COLLECTIONS or
+                              (DIGITS.search(segment) and not VERSION_SEGMENT.match(segment))):
+            route.append(ID)
+        else:
+            route.append(segment)
+        previous = segment
+    return '/'.join(route)
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.time()
+        HTTPConnection.connect(self)
+        __timings__.connect = getattr(__timings__, 'connect', 0.0) + time.time() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.time()
+        HTTPSConnection.connect(self)
+        __timings__.connect = getattr(__timings__, 'connect', 0.0) + time.time() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter measuring the connect time (0 if a pooled connection is reused) and the time to the response
+    headers (time to first byte) of each request. They are stored in response.timings (seconds)
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        __timings__.connect = 0.0
+        start = time.time()
+        response = HTTPAdapter.send(self, request, **kwargs)
+        response.timings = {'start': start, CONNECT: __timings__.connect, TTFB: time.time() - start}
+        return response
+
+
+class TimedSession(requests.Session):
+    """
+    Session adding the total time (body read included) to response.timings, see TimedHTTPAdapter
+    """
+
+    def send(self, request, **kwargs):
+        response = requests.Session.send(self, request, **kwargs)
+        timings = getattr(response, 'timings', None)
+        if timings is not None and TOTAL not in timings:
+            timings[TOTAL] = time.time() - timings['start']
+        return response
+
+
+class RequestMetrics(object):
+    """
+    Latency (connect, time to first byte and total) and size histograms of the requests of all the components,
+    per component, method and route template. Fed by the PqaTools exchange hook, so every client is measured;
+    the connect time is only known for the clients using a TimedSession
+    >>> metrics = RequestMetrics().install()
+    >>> run_test()
+    >>> print metrics.summary_table()
+    >>> metrics.histogram('total', comp='CB').percentile(99)
+    """
+
+    def __init__(self, route=route_template):
+        """
+        :param route: function getting the route template of an url
+        """
+        self.route = route
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.errors = {}
+
+    def __histograms(self, key):
+        if key not in self.histograms:
+            self.histograms[key] = dict((metric, Histogram()) for metric in METRICS)
+            self.errors[key] = 0
+        return self.histograms[key]
+
+    def record(self, comp, method, url, headers, data, response):
+        """
+        exchange hook (see PqaTools.add_exchange_hook): record the timings and sizes of an exchange. The requests
+        without response (network errors) and the 5xx responses are counted as errors
+        """
+        if response is not None and response.url:
+            url = response.url
+        key = (comp, str(method).upper(), self.route(url))
+        if response is None:
+            with self.lock:
+                self.__histograms(key)
+                self.errors[key] += 1
+            return
+        timings = getattr(response, 'timings', None)
+        if timings is None:
+            elapsed = response.elapsed.total_seconds() if response.elapsed is not None else 0.0
+            timings = {TTFB: elapsed, TOTAL: elapsed}
+        body = response.request.body if response.request is not None else data
+        request_size = len(body) if isinstance(body, basestring) else 0
+        response_size = len(response.content or '')
+        with self.lock:
+            histograms = self.__histograms(key)
+            if CONNECT in timings:
+                histograms[CONNECT].record_seconds(timings[CONNECT])
+            histograms[TTFB].record_seconds(timings[TTFB])
+            histograms[TOTAL].record_seconds(timings.get(TOTAL, timings[TTFB]))
+            histograms[REQUEST_SIZE].record(request_size)
+            histograms[RESPONSE_SIZE].record(response_size)
+            if response.status_code >= 500:
+                self.errors[key] += 1
+
+    def install(self):
+        """
+        start recording the requests
+        :return self
+        """
+        PqaTools.add_exchange_hook(self.record)
+        return self
+
+    def uninstall(self):
+        PqaTools.remove_exchange_hook(self.record)
+
+    def merge(self, other):
+        """
+        add the histograms of other RequestMetrics (ev: from other process or thread)
+        :return self
+        """
+        with self.lock:
+            for key, histograms in other.histograms.items():
+                own = self.__histograms(key)
+                for metric in METRICS:
+                    own[metric].merge(histograms[metric])
+                self.errors[key] += other.errors[key]
+        return self
+
+    def keys(self):
+        """
+        :return sorted list of (component, method, route) recorded
+        """
+        with self.lock:
+            return sorted(self.histograms)
+
+    def histogram(self, metric, comp=None, method=None, route=None):
+        """
+        get a histogram merging the ones which match the filters
+        :param metric: connect, ttfb, total, request_size or response_size
+        :return Histogram (a copy)
+        """
+        result = Histogram()
+        with self.lock:
+            for (key_comp, key_method, key_route), histograms in self.histograms.items():
+                if (comp is None or comp == key_comp) and (method is None or method.upper() == key_method) and \
+                        (route is None or route == key_route):
+                    result.merge(histograms[metric])
+        return result
+
+    def summary_table(self, percentiles=(50, 95, 99)):
+        """
+        :return text table with a row per component, method and route: requests, errors, total time
+            percentiles, mean time to first byte and connect time (ms) and mean sizes (bytes)
+        """
+        header = '%-5s %-7s %-40s %8s %7s' % ('comp', 'method', 'route', 'requests', 'errors')
+        header += ''.join(' %9s' % ('p%s(ms)' % percentile) for percentile in percentiles)
+        header += ' %9s %9s %9s %9s' % ('ttfb(ms)', 'conn(ms)', 'req(B)', 'resp(B)')
+        lines = [header]
+        with self.lock:
+            for key in sorted(self.histograms):
+                histograms = self.histograms[key]
+                total = histograms[TOTAL]
+                line = '%-5s %-7s %-40s %8s %7s' % (key[0], key[1], key[2], total.count, self.errors[key])
+                line += ''.join(' %9.2f' % (total.percentile(percentile) / 1000.0) for percentile in percentiles)
+                line += ' %9.2f %9.2f %9.0f %9.0f' % (
+                    histograms[TTFB].mean() / 1000.0, histograms[CONNECT].mean() / 1000.0,
+                    histograms[REQUEST_SIZE].mean(), histograms[RESPONSE_SIZE].mean())
+                lines.append(line)
+        return '\n'.join(lines)
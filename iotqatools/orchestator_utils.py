@@ -30,6 +30,7 @@ import requests
 from iotqatools.iot_tools import get_logger
 from iotqatools.iot_tools import PqaTools
 from iotqatools.ks_utils import KeystoneUtils
+from iotqatools.transport_utils import client_transport
 
 class Orchestrator(object):
     """
@@ -39,8 +40,12 @@ class Orchestrator(object):
 
     log = get_logger('Orchestrator', 'ERROR')
 
-    def __init__(self, host='127.0.0.1', port='8084', protocol='http', verify=False):
+    def __init__(self, host='127.0.0.1', port='8084', protocol='http', verify=False, transport=None):
+        """
+        :param transport: HttpTransport shared with other clients (None creates one for this client)
+        """
         self.url = '%s://%s:%s' % (protocol, host, port)
+        self.transport, self.own_transport = client_transport(transport, log_instance=self.log)
         self.ip = host
         self.verify = verify
         self.timeout = 120 # should be greather than harakiri orc option
@@ -72,7 +77,7 @@ class Orchestrator(object):
         request_parms.update({'timeout': self.timeout})
 
         # Send the requests
-        response = requests.request(method, url, **request_parms)
+        response = self.transport.request(method, url, **request_parms)
 
         # Log data
         PqaTools.log_fullRequest(comp='ORC', response=response, params=request_parms)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import Queue
+import sys
+import threading
+
+
+def fetch_in_background(fetch, offset):
+    """
+    run fetch(offset) in a daemon thread
+    :return Queue where the tuple (result, exc_info) is put when the request finishes (exc_info is None if fetch
+    did not raise)
+    """
+    result = Queue.Queue(maxsize=1)
+
+    def target():
+        try:
+            result.put((fetch(offset), None))
+        except BaseException:
+            result.put((None, sys.exc_info()))
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    return result
+
+
+def iter_pages(fetch_page, page_size, offset=0, prefetch=True):
+    """
+    generator walking a paginated resource (limit/offset). Only the current page is kept in memory, plus the next
+    one if prefetch (requested in a background thread while the current one is consumed)
+    :param fetch_page: function(offset) returning the tuple (items, total) of a page. If total is None, the last
+    page is the first one with less items than page_size
+    :param page_size: limit of the pages requested by fetch_page
+    :param offset: offset of the first page
+    :param prefetch: request the next page before yielding the items of the current one
+    :return generator of items
+    """
+    pending = fetch_in_background(fetch_page, offset) if prefetch else None
+    page = None if prefetch else fetch_page(offset)
+    while True:
+        if pending is not None:
+            page, exc_info = pending.get()
+            if exc_info is not None:
+                # with the traceback of the background thread
+                raise exc_info[0], exc_info[1], exc_info[2]
+        items, total = page
+        offset += len(items)
+        if total is not None:
+            has_more = len(items) > 0 and offset < int(total)
+        else:
+            has_more = len(items) == int(page_size)
+        # the next page is requested before yielding the current one
+        if has_more and prefetch:
+            pending = fetch_in_background(fetch_page, offset)
+        page = None
+        for item in items:
+            yield item
+        if not has_more:
+            return
+        if not prefetch:
+            page = fetch_page(offset)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import itertools
+import json
+import signal
+import sys
+import time
+from contextlib import contextmanager
+
+from iotqatools.iot_logger import get_logger
+from iotqatools.iot_tools import PqaTools
+
+# fields of each recorded exchange
+FIELDS = ('timestamp', 'comp', 'method', 'url', 'status', 'elapsed_ms', 'request_body', 'response_body')
+
+
+def body_text(body, max_size):
+    """
+    get the text of a request or response body limited to max_size chars (dicts and lists are serialized)
+    """
+    if body is None:
+        return None
+    if not isinstance(body, basestring):
+        try:
+            body = json.dumps(body)
+        except (TypeError, ValueError):
+            body = repr(body)
+    if len(body) > max_size:
+        return '%s... (%s chars more)' % (body[:max_size], len(body) - max_size)
+    return body
+
+
+class FlightRecorder(object):
+    """
+    Keep the last N request/response exchanges of all the components (the ones logged by PqaTools), in a ring
+    buffer of fixed size, to be dumped when a long run fails
+    >>> recorder = FlightRecorder(size=1000).install()
+    >>> recorder.dump_on_signal('flight_recorder.jsonl')
+    >>> with recorder.dump_on_failure('flight_recorder.jsonl'):
+    >>>     run_test()
+    """
+
+    def __init__(self, size=1000, body_size=512, log_instance=None, log_verbosity='INFO'):
+        """
+        Flight recorder constructor
+        :param size: number of exchanges kept (at least 1)
+        :param body_size: max chars kept of the request and response bodies
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('FlightRecorder', log_verbosity)
+        if int(size) < 1:
+            raise ValueError('ERROR: the flight recorder size must be at least 1, not %s' % size)
+        self.size = int(size)
+        self.body_size = int(body_size)
+        self.slots = [None] * self.size
+        self.counter = itertools.count()
+        self.recorded = 0
+
+    def record(self, comp, method, url, headers, data, response):
+        """
+        exchange hook (see PqaTools.add_exchange_hook): store the exchange, overwriting the oldest one
+        """
+        now = time.time()
+        if response is not None:
+            elapsed = response.elapsed.total_seconds() * 1000 if response.elapsed is not None else None
+            entry = (now, comp, method, response.url or url, response.status_code, elapsed,
+                     body_text(data, self.body_size), body_text(response.content, self.body_size))
+        else:
+            entry = (now, comp, method, url, None, None, body_text(data, self.body_size), None)
+        position = next(self.counter)
+        self.slots[position % self.size] = entry
+        self.recorded = position + 1
+
+    def install(self):
+        """
+        start recording the exchanges
+        :return self
+        """
+        PqaTools.add_exchange_hook(self.record)
+        return self
+
+    def uninstall(self):
+        PqaTools.remove_exchange_hook(self.record)
+
+    def entries(self):
+        """
+        :return list of the exchanges kept (dicts), the oldest first
+        """
+        recorded = self.recorded
+        if recorded <= self.size:
+            slots = self.slots[:recorded]
+        else:
+            start = recorded % self.size
+            slots = self.slots[start:] + self.slots[:start]
+        return [dict(zip(FIELDS, entry)) for entry in slots if entry is not None]
+
+    def dump(self, filename):
+        """
+        write the exchanges kept as JSON-lines, the oldest first
+        :param filename: path to the file
+        :return number of exchanges written
+        """
+        entries = self.entries()
+        with open(filename, 'w') as fd:
+            for entry in entries:
+                fd.write('%s\n' % json.dumps(entry))
+        self.log.info('Flight recorder dumped %s of %s exchanges in %s' % (len(entries), self.recorded, filename))
+        return len(entries)
+
+    @contextmanager
+    def dump_on_failure(self, filename, exceptions=(AssertionError,)):
+        """
+        context manager dumping the exchanges if the block raises an assertion error (the error is raised again)
+        :param filename: path to the file
+        :param exceptions: exception classes which dump the recorder
+        """
+        try:
+            yield self
+        except exceptions:
+            exc_info = sys.exc_info()
+            self.dump(filename)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def dump_on_signal(self, filename, signum=signal.SIGUSR1):
+        """
+        dump the exchanges every time the process receives the signal (kill -USR1 <pid>). Only in the main thread
+        :param filename: path to the file
+        :param signum: signal number
+        """
+        previous = signal.getsignal(signum)
+
+        def handler(received, frame):
+            self.dump(filename)
+            if callable(previous):
+                previous(received, frame)
+
+        signal.signal(signum, handler)
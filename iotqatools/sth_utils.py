@@ -24,10 +24,10 @@ please contact with::[iot_support@tid.es]
 __author__ = 'macs'
 
 import json
-import requests
 from requests.exceptions import RequestException
 from iotqatools.iot_logger import get_logger
 from iotqatools.iot_tools import PqaTools
+from iotqatools.transport_utils import client_transport
 
 
 class SthUtils(object):
@@ -45,7 +45,8 @@ class SthUtils(object):
                  default_headers={"Accept": "application/json"},
                  check_json=True,
                  verify=False,
-                 path_notify="/notify"):
+                 path_notify="/notify",
+                 transport=None):
         """
         STH Utils constructor
         :param instance:
@@ -61,6 +62,7 @@ class SthUtils(object):
         :param check_json:
         :param verify:        
         :param path_notify:
+        :param transport: HttpTransport shared with other clients (None creates one for this client)
         """
         # initialize logger
         if log_instance is not None:
@@ -76,6 +78,7 @@ class SthUtils(object):
         self.check_json = check_json
         self.verify = verify
         self.path_notify = path_notify
+        self.transport, self.own_transport = client_transport(transport, log_instance=self.log)
 
     def __send_request(self, method, url, headers=None, payload=None, verify=None, query=None):
         """
@@ -107,7 +110,7 @@ class SthUtils(object):
 
         # Send the requests
         try:
-            response = requests.request(**parameters)
+            response = self.transport.request(**parameters)
         except RequestException, e:
             PqaTools.log_requestAndResponse(url=url, headers=headers, data=payload, comp='STH', method=method)
             assert False, 'ERROR: [NETWORK ERROR] {}'.format(e)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import base64
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+from nose.tools import eq_, ok_, raises
+from iotqatools.capture_utils import TrafficExporter, har_content
+from iotqatools.iot_tools import PqaTools
+
+
+class MockRequest(object):
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class MockResponse(object):
+    def __init__(self, status_code, content='', url='http://cb:1026/v2/entities?type=Room', headers=None):
+        self.status_code = status_code
+        self.reason = 'OK'
+        self.content = content
+        self.url = url
+        self.headers = headers or {'Content-Type': 'application/json'}
+        self.elapsed = timedelta(milliseconds=20)
+        self.request = MockRequest({'Content-Type': 'application/json', 'Fiware-Service': 'smart'})
+
+
+class HarContentTest(unittest.TestCase):
+    def test_har_content(self):
+        eq_(har_content(None, None), (None, 0, None))
+        eq_(har_content({'id': 'room'}, None), (u'{"id": "room"}', 14, None))
+        eq_(har_content('caf\xc3\xa9', None), (u'caf\xe9', 5, None))
+        eq_(har_content('abcdef', 3), (u'abc', 6, None))
+        eq_(har_content('\xff\x00', None), (base64.b64encode('\xff\x00'), 2, 'base64'))
+
+
+class TrafficExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def exchanges(self, exporter):
+        exporter.write('CB', 'get', 'http://cb:1026/v2/entities?type=Room', {}, None,
+                       MockResponse(200, '[{"id": "room_1"}]'))
+        exporter.write('CB', 'post', 'http://cb:1026/v2/entities', {'Content-Type': 'application/json'},
+                       {'id': 'room_2'}, None)
+
+    def test_har(self):
+        filename = os.path.join(self.folder, 'run.har')
+        exporter = TrafficExporter(filename)
+        self.exchanges(exporter)
+        exporter.close()
+        exporter.close()
+        with open(filename) as fd:
+            entries = json.load(fd)['log']['entries']
+        eq_(len(entries), 2)
+        eq_(entries[0]['request']['queryString'], [{'name': 'type', 'value': 'Room'}])
+        ok_({'name': 'Fiware-Service', 'value': 'smart'} in entries[0]['request']['headers'])
+        eq_((entries[0]['response']['status'], entries[0]['response']['content']['text'], entries[0]['time']),
+            (200, '[{"id": "room_1"}]', 20.0))
+        eq_(entries[1]['request']['postData'], {'mimeType': 'application/json', 'text': '{"id": "room_2"}'})
+        eq_((entries[1]['response']['status'], entries[1]['response']['_error']), (0, True))
+
+    def test_json_lines_gzip(self):
+        filename = os.path.join(self.folder, 'run.jsonl.gz')
+        with TrafficExporter(filename, max_body_size=4) as exporter:
+            eq_(exporter.format, 'jsonl')
+            self.exchanges(exporter)
+        exporter.write('CB', 'get', 'http://cb:1026/version', {}, None, MockResponse(200))
+        fd = gzip.open(filename)
+        try:
+            entries = [json.loads(line) for line in fd]
+        finally:
+            fd.close()
+        eq_(len(entries), 2)
+        eq_((entries[0]['response']['content']['text'], entries[0]['response']['bodySize']), ('[{"i', 18))
+
+    def test_install(self):
+        filename = os.path.join(self.folder, 'run.jsonl')
+        exporter = TrafficExporter(filename).install()
+        PqaTools.log_fullRequest(comp='STH', response=MockResponse(200, '{}'),
+                                 params={'method': 'get', 'url': 'http://sth:8666/version'})
+        exporter.close()
+        PqaTools.log_fullRequest(comp='STH', response=MockResponse(200, '{}'),
+                                 params={'method': 'get', 'url': 'http://sth:8666/version'})
+        with open(filename) as fd:
+            eq_([json.loads(line)['_comp'] for line in fd], ['STH'])
+
+    @raises(Exception)
+    def test_wrong_format(self):
+        TrafficExporter(os.path.join(self.folder, 'run.txt'), format='csv')
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+from nose.tools import assert_raises, eq_, ok_, raises
+from iotqatools.cassette_utils import AUTO, RECORD, REPLAY, Cassette, CassetteMissError
+from iotqatools.transport_utils import HttpTransport
+
+CB = 'http://127.0.0.1:1026'
+HEADERS = {'Fiware-Service': 'smartcity', 'Fiware-ServicePath': '/', 'X-Auth-Token': 'token_1'}
+
+
+def response(status_code, content, headers=None):
+    recorded = requests.Response()
+    recorded.status_code = status_code
+    recorded.reason = 'OK' if status_code < 400 else 'Not Found'
+    recorded.headers = requests.structures.CaseInsensitiveDict(headers or {'Content-Type': 'application/json'})
+    recorded._content = content
+    return recorded
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'entities.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def record(self, interactions):
+        cassette = Cassette(self.filename, mode=RECORD, log_verbosity='ERROR')
+        for method, url, kwargs, recorded in interactions:
+            cassette.record(method, url, kwargs, recorded)
+        cassette.close()
+        eq_(cassette.recorded, len(interactions))
+        return Cassette(self.filename, mode=REPLAY, log_verbosity='ERROR')
+
+    def test_key(self):
+        cassette = Cassette(self.filename, log_verbosity='ERROR')
+        key = cassette.key('get', CB + '/v2/entities/room_1?type=house', HEADERS, None)
+        eq_(key, ('GET', '/v2/entities/{id}', ('smartcity', '/', 'None', 'None'), None))
+        # the ids of the url and the tokens are not matched
+        eq_(key, cassette.key('GET', CB + '/v2/entities/room_2', dict(HEADERS, **{'X-Auth-Token': 'token_2'}), None))
+        ok_(key != cassette.key('get', CB + '/v2/entities/room_1', {'fiware-service': 'other'}, None))
+        ok_(key != cassette.key('get', CB + '/v2/entities/room_1', HEADERS, '{}'))
+        cassette.close()
+
+    def test_replay(self):
+        cassette = self.record([
+            ('get', CB + '/v2/entities/room_1', {'headers': HEADERS}, response(200, '{"id": "room_1"}')),
+            ('get', CB + '/v2/entities/room_2', {'headers': HEADERS}, response(200, '{"id": "room_2"}')),
+            ('post', CB + '/v2/entities', {'headers': HEADERS, 'data': '{"id": "room_3"}'}, response(201, '')),
+            ('get', CB + '/v2/entities/room_1', {'headers': dict(HEADERS, Accept='image/png')},
+             response(200, '\x89PNG\xff', {'Content-Type': 'image/png'}))])
+        ok_(cassette.replaying)
+        headers = dict(HEADERS, **{'X-Auth-Token': 'token_2'})
+        # the one with the same url is preferred
+        eq_(cassette.play('get', CB + '/v2/entities/room_2', {'headers': headers}).json(), {'id': 'room_2'})
+        eq_(cassette.play('get', CB + '/v2/entities/room_1', {'headers': headers}).json(), {'id': 'room_1'})
+        # then they are replayed in order, the last one is repeated
+        eq_(cassette.play('get', CB + '/v2/entities/room_9', {'headers': headers}).json(), {'id': 'room_2'})
+        eq_(cassette.play('get', CB + '/v2/entities/room_9', {'headers': headers}).json(), {'id': 'room_2'})
+        created = cassette.play('post', CB + '/v2/entities', {'headers': headers, 'data': '{"id": "room_3"}'})
+        eq_((created.status_code, created.reason, created.content), (201, 'OK', ''))
+        image = cassette.play('get', CB + '/v2/entities/room_1', {'headers': dict(headers, Accept='image/png')})
+        eq_(image.content, '\x89PNG\xff')
+        eq_(cassette.played, 6)
+
+    def test_miss(self):
+        cassette = self.record([
+            ('post', CB + '/v2/entities', {'headers': HEADERS, 'data': '{"id": "room_1"}'}, response(201, ''))])
+        assert_raises(CassetteMissError, cassette.play, 'post', CB + '/v2/entities',
+                      {'headers': HEADERS, 'data': '{"id": "room_2"}'})
+        assert_raises(CassetteMissError, cassette.play, 'post', CB + '/v2/entities',
+                      {'headers': {'Fiware-Service': 'other'}, 'data': '{"id": "room_1"}'})
+        assert_raises(CassetteMissError, cassette.play, 'get', CB + '/v2/entities', {'headers': HEADERS})
+
+    def test_match_body(self):
+        self.record([('post', CB + '/v2/entities', {'headers': HEADERS, 'data': '{"id": "room_1"}'},
+                      response(201, ''))])
+        cassette = Cassette(self.filename, mode=REPLAY, match_body=False, log_verbosity='ERROR')
+        eq_(cassette.play('post', CB + '/v2/entities', {'headers': HEADERS, 'data': '{}'}).status_code, 201)
+
+    def test_auto(self):
+        cassette = Cassette(self.filename, mode=AUTO, log_verbosity='ERROR')
+        eq_(cassette.mode, RECORD)
+        cassette.close()
+        eq_(Cassette(self.filename, mode=AUTO, log_verbosity='ERROR').mode, REPLAY)
+
+    @raises(Exception)
+    def test_wrong_mode(self):
+        Cassette(self.filename, mode='rewind', log_verbosity='ERROR')
+
+    def test_transport(self):
+        self.record([('get', CB + '/version', {}, response(200, '{"orion": {}}'))])
+        cassette = Cassette(self.filename, mode=AUTO, log_verbosity='ERROR')
+        with HttpTransport(cassette=cassette, log_verbosity='ERROR') as transport:
+            eq_(transport.get(CB + '/version').json(), {'orion': {}})
+            assert_raises(CassetteMissError, transport.get, CB + '/statistics')
+            eq_(transport.get_counters('127.0.0.1:1026')['requests'], 2)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import time
+import unittest
+
+import mock
+from nose.tools import eq_, ok_
+from iotqatools.cb_async_utils import AsyncCbNgsi10v2Utils
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+
+
+class AsyncCbNgsi10v2UtilsTest(unittest.TestCase):
+
+    def test_client_per_worker(self):
+        calls = []
+
+        def list_entities(cb, headers={}, params=None):
+            cb.entities_parameters = params
+            time.sleep(0.01)
+            calls.append((threading.current_thread().name, id(cb), cb.transport, params == cb.entities_parameters))
+            return params
+
+        with mock.patch.object(CbNgsi10v2Utils, 'list_entities', autospec=True, side_effect=list_entities):
+            with AsyncCbNgsi10v2Utils('127.0.0.1', concurrency=4, log_verbosity='ERROR') as cb:
+                results = cb.gather([cb.list_entities(params={'id': 'room_%s' % i}) for i in range(40)])
+                transport = cb.cb.transport
+        eq_([{'id': 'room_%s' % i} for i in range(40)], results)
+        # the context of a request is not changed by the requests of other workers
+        ok_(all(call[3] for call in calls))
+        # one client per thread, all of them with the same connection pool
+        eq_(len(set(call[0] for call in calls)), len(set(call[1] for call in calls)))
+        ok_(all(call[2] is transport for call in calls))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import unittest
+
+import mock
+from nose.tools import eq_, ok_
+from iotqatools import json_utils
+from iotqatools.cb_bulk_utils import CbBulkLoader, iter_chunks
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeCb(object):
+    """
+    CbNgsi10v2Utils answering the batches with 422 for the entities with "fail"
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = []
+
+    def batch_update(self, entities, action_type='append', headers=None, params=None):
+        with self.lock:
+            self.batches.append(entities)
+        if any(entity.get('fail') for entity in entities):
+            return MockResponse(422, 'Unprocessable')
+        return MockResponse(204)
+
+
+def entities(number, attribute_size=10):
+    return [{'id': 'room_%s' % i, 'type': 'Room', 'name': {'value': 'x' * attribute_size}} for i in range(number)]
+
+
+class IterChunksTest(unittest.TestCase):
+
+    def test_chunk_size(self):
+        eq_([[0, 1, 2], [3, 4, 5], [6]], list(iter_chunks(range(7), 3)))
+
+    def test_max_bytes(self):
+        items = entities(20, attribute_size=1000)
+        chunks = list(iter_chunks(items, 100, max_bytes=5000))
+        eq_(items, [entity for chunk in chunks for entity in chunk])
+        for chunk in chunks:
+            ok_(len(json_utils.dumps(chunk)) <= 5000)
+        eq_(5, len(chunks))
+
+    def test_entity_bigger_than_max_bytes(self):
+        items = entities(3, attribute_size=100)
+        eq_([[item] for item in items], list(iter_chunks(items, 100, max_bytes=50)))
+
+
+class CbBulkLoaderTest(unittest.TestCase):
+
+    def test_load_and_retry(self):
+        cb = FakeCb()
+        items = entities(45)
+        items[12]['fail'] = True
+        report = CbBulkLoader(cb, workers=3, chunk_size=10).load(iter(items))
+        eq_(45, report.entities)
+        eq_(5, report.chunks)
+        eq_(10, report.failed_entities)
+        del items[12]['fail']
+        retry = CbBulkLoader(cb, workers=3, chunk_size=10).retry(report)
+        eq_(10, retry.entities)
+        eq_(0, retry.failed_entities)
+
+    def test_report_error_does_not_block(self):
+        cb = FakeCb()
+        loader = CbBulkLoader(cb, workers=2, max_in_flight=1, chunk_size=10, log_verbosity='CRITICAL')
+        with mock.patch('iotqatools.cb_bulk_utils.BulkLoadReport.add', side_effect=ValueError('broken report')):
+            loader.load(entities(50))
+        eq_(5, len(cb.batches))
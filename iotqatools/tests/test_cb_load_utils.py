@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import unittest
+
+from nose.tools import eq_
+from iotqatools.cb_load_utils import CbLoadDriver
+
+
+class MockResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeCb(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def update_entity(self, payload, entity_id, headers={}, params=None, method='post'):
+        with self.lock:
+            self.requests.append((method, entity_id, payload['temperature']['value']))
+        return MockResponse(204)
+
+    def get_entity_attrs(self, entity_id, headers={}, params=None):
+        with self.lock:
+            self.requests.append(('get', entity_id, None))
+        return MockResponse(200)
+
+
+class CbLoadDriverTest(unittest.TestCase):
+    def run_open_loop(self, seed):
+        cb = FakeCb()
+        stats = CbLoadDriver(cb, entities=10, seed=seed).run_open_loop(100000, requests=200, workers=8)
+        return cb.requests, stats
+
+    def test_open_loop_same_seed(self):
+        first, stats = self.run_open_loop(7)
+        second, _ = self.run_open_loop(7)
+        eq_(len(first), 200)
+        eq_(sorted(first), sorted(second))
+        eq_(sum(histogram.count for histogram in stats.histograms.values()), 200)
+        eq_(sum(stats.errors.values()), 0)
+
+    def test_closed_loop(self):
+        cb = FakeCb()
+        stats = CbLoadDriver(cb, entities=10, seed=7).run_closed_loop(4, requests=100)
+        eq_(len(cb.requests), 100)
+        eq_(sum(histogram.count for histogram in stats.histograms.values()), 100)
+
+    def test_mix(self):
+        cb = FakeCb()
+        CbLoadDriver(cb, mix={'read': 1}, seed=1).run_closed_loop(2, requests=20)
+        eq_(set(request[0] for request in cb.requests), set(['get']))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import threading
+import unittest
+
+import mock
+from nose.tools import assert_raises, eq_, ok_
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+from iotqatools.transport_utils import HttpTransport
+
+
+class MockResponse(object):
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body) if body is not None else ''
+        self.text = self.content
+        self.headers = headers or {}
+
+
+class FakeTransport(object):
+    """
+    Orion entities and types resources: GET pages (limit/offset and Fiware-Total-Count)
+    """
+
+    def __init__(self, resources, status_code=200):
+        self.session = None
+        self.lock = threading.Lock()
+        self.resources = resources
+        self.status_code = status_code
+        self.pages = []
+
+    def request(self, method, url, headers=None, params=None, verify=None, data=None):
+        resource = url.split('/v2/', 1)[1]
+        offset, limit = params['offset'], params['limit']
+        with self.lock:
+            self.pages.append((resource, offset, limit, params['options'], params.get('type')))
+        items = self.resources[resource]
+        return MockResponse(self.status_code, items[offset:offset + limit],
+                            {'Fiware-Total-Count': str(len(items))})
+
+
+class CbNgsi10v2UtilsPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.entities = [{'id': 'room_%s' % i, 'type': 'house'} for i in range(25)]
+        self.types = [{'type': 'type_%s' % i, 'count': 1} for i in range(3)]
+        self.transport = FakeTransport({'entities': self.entities, 'types': self.types})
+        self.cb = CbNgsi10v2Utils('127.0.0.1', transport=self.transport, log_verbosity='ERROR')
+
+    def test_iter_entities(self):
+        eq_(self.entities, list(self.cb.iter_entities(page_size=10, prefetch=False)))
+        eq_([('entities', 0, 10, 'count', None), ('entities', 10, 10, 'count', None),
+             ('entities', 20, 10, 'count', None)], self.transport.pages)
+
+    def test_iter_entities_params(self):
+        entities = list(self.cb.iter_entities(params={'type': 'house', 'options': 'keyValues', 'offset': 18,
+                                                      'limit': 2}, page_size=5))
+        eq_(self.entities[18:], entities)
+        eq_(sorted(self.transport.pages), [('entities', 18, 5, 'keyValues,count', 'house'),
+                                           ('entities', 23, 5, 'keyValues,count', 'house')])
+
+    def test_iter_entity_types(self):
+        eq_(self.types, list(self.cb.iter_entity_types(page_size=2)))
+        eq_(sorted(page[:3] for page in self.transport.pages), [('types', 0, 2), ('types', 2, 2)])
+
+    def test_iter_entities_error(self):
+        self.transport.status_code = 500
+        assert_raises(AssertionError, list, self.cb.iter_entities(prefetch=False))
+
+
+class CbNgsi10v2UtilsTransportTest(unittest.TestCase):
+    def test_pool_options(self):
+        cb = CbNgsi10v2Utils('127.0.0.1', pool_connections=2, pool_maxsize=20, pool_block=True, max_retries=1,
+                             keep_alive=False, timeout=(3, 30), log_verbosity='ERROR')
+        adapter = cb.session.get_adapter('http://127.0.0.1:1026')
+        eq_((adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block), (2, 20, True))
+        eq_(adapter.max_retries.total, 1)
+        eq_(cb.session.headers['Connection'], 'close')
+        eq_(cb.transport.timeout, (3, 30))
+        ok_(cb.own_transport)
+        cb.close()
+
+    def test_close(self):
+        cb = CbNgsi10v2Utils('127.0.0.1', log_verbosity='ERROR')
+        with mock.patch.object(cb.transport.session, 'close') as close:
+            cb.close()
+        eq_(close.call_count, 1)
+
+    def test_context_manager(self):
+        with mock.patch.object(HttpTransport, 'close') as close:
+            with CbNgsi10v2Utils('127.0.0.1', log_verbosity='ERROR') as cb:
+                ok_(isinstance(cb, CbNgsi10v2Utils))
+                eq_(close.call_count, 0)
+            eq_(close.call_count, 1)
+
+    def test_shared_transport(self):
+        transport = HttpTransport(log_verbosity='ERROR')
+        with mock.patch.object(transport, 'close') as close:
+            with CbNgsi10v2Utils('127.0.0.1', transport=transport, pool_maxsize=50, log_verbosity='ERROR') as cb:
+                ok_(cb.transport is transport)
+                ok_(cb.session is transport.session)
+            # the transport is closed by its owner
+            eq_(close.call_count, 0)
+        eq_(transport.session.get_adapter('http://127.0.0.1:1026')._pool_maxsize, 10)
+        transport.close()
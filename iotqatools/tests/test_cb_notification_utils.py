@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import unittest
+
+from nose.tools import eq_, ok_
+from iotqatools.cb_notification_utils import NotificationLatencyStats, INITIAL_SEQ
+
+
+def notification(subscription_id, seq):
+    return {'subscriptionId': subscription_id, 'data': [{'id': 'latency_entity', 'seq': {'value': seq}}]}
+
+
+class NotificationLatencyStatsTest(unittest.TestCase):
+    def test_received(self):
+        stats = NotificationLatencyStats(2)
+        stats.sent(0, 10.0)
+        stats.notified(notification('s1', 0), 10.5)
+        stats.notified(notification('s1', 0), 10.6)
+        stats.notified(notification('s2', 7), 10.7)
+        eq_(stats.expected(), 2)
+        eq_(stats.received_count(), 1)
+        eq_(stats.lost(), 1)
+        eq_(stats.duplicated, 1)
+        eq_(stats.unknown, 1)
+        eq_(stats.histogram.summary()['max'], 500000)
+
+    def test_initial_notification(self):
+        stats = NotificationLatencyStats(2)
+        stats.notified(notification('s1', INITIAL_SEQ), 1.0)
+        stats.notified({'subscriptionId': 's2', 'data': [{'id': 'latency_entity'}]}, 1.0)
+        eq_(stats.initial, 2)
+        eq_(stats.unknown, 0)
+        eq_(stats.lost(), 0)
+
+    def test_achieved_rate(self):
+        stats = NotificationLatencyStats(1, rate=10)
+        for seq in range(5):
+            stats.sent(seq, seq * 0.5)
+        stats.update_failed(4)
+        eq_(stats.achieved_rate(), 2.0)
+        ok_('updates/s: 10 target, 2.0 achieved' in stats.report())
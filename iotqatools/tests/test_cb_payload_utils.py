@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import unittest
+
+from nose.tools import eq_, ok_, raises
+from iotqatools.cb_payload_utils import EncodedJson, EntityPayloadTemplate, checked_json
+
+
+def entity_context(**kwargs):
+    context = {'entities_id': 'room', 'entities_type': 'house', 'attributes_name': u'temperature',
+               'attributes_number': 1, 'attributes_type': 'celsius', 'attributes_value': u'34',
+               'metadatas_number': 0, 'metadatas_name': None, 'metadatas_type': 'none', 'metadatas_value': None}
+    context.update(kwargs)
+    return context
+
+
+class EntityPayloadTemplateTest(unittest.TestCase):
+    def test_render(self):
+        payload = EntityPayloadTemplate(entity_context()).render(entity_id='room_1')
+        ok_(isinstance(payload, EncodedJson))
+        eq_(json.loads(payload), {'id': 'room_1', 'type': 'house',
+                                  'temperature': {'type': 'celsius', 'value': '34'}})
+
+    def test_render_attributes(self):
+        template = EntityPayloadTemplate(entity_context(attributes_number=2, metadatas_number=1,
+                                                        metadatas_name='alarm', metadatas_value='hot'))
+        attr = {'type': 'celsius', 'value': '34', 'metadata': {'alarm': {'value': 'hot'}}}
+        eq_(json.loads(template.render_attributes()), {'temperature_0': attr, 'temperature_1': attr})
+
+    def test_render_attributes_key_values(self):
+        template = EntityPayloadTemplate(entity_context(attributes_value=u'caf\xe9'), 'keyValues')
+        eq_(json.loads(template.render_attributes()), {'temperature': u'caf\xe9'})
+
+    def test_without_attributes(self):
+        eq_(EntityPayloadTemplate(entity_context(attributes_name=None)).render_attributes(), None)
+
+    def test_zero_attributes(self):
+        template = EntityPayloadTemplate(entity_context(attributes_number=0))
+        eq_(template.render_attributes(), None)
+        eq_(json.loads(template.render(entity_id='room_1')), {'id': 'room_1', 'type': 'house'})
+
+    def test_render_batch(self):
+        template = EntityPayloadTemplate(entity_context(entities_id='"room"', entities_type='"house"',
+                                                        attributes_name='"temperature"', attributes_value='34',
+                                                        attributes_type='"celsius"'), raw=True)
+        batch = json.loads(template.render_batch(['room_1', 'room_2']))
+        eq_(batch['actionType'], 'append')
+        eq_([entity['id'] for entity in batch['entities']], ['room_1', 'room_2'])
+        eq_(batch['entities'][0]['temperature'], {'type': 'celsius', 'value': 34})
+
+
+class CheckedJsonTest(unittest.TestCase):
+    def test_valid(self):
+        payload = checked_json(u'{"name": "caf\xe9"}')
+        ok_(isinstance(payload, EncodedJson))
+        eq_(payload, '{"name": "caf\xc3\xa9"}')
+
+    @raises(ValueError)
+    def test_malformed(self):
+        checked_json('{"value": tru}')
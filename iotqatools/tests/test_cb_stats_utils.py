@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from nose.tools import eq_, ok_
+from iotqatools.cb_stats_utils import CbStatisticsSampler, StatisticsBuffer, flatten_statistics
+
+
+class MockResponse(object):
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+def is_nan(value):
+    return value != value
+
+
+class FlattenStatisticsTest(unittest.TestCase):
+    def test_flatten(self):
+        statistics = {'uptime_in_secs': 10, 'measuring_interval_in_secs': 10, 'semWait': {'request': 0.5},
+                      'counters': {'requests': {'/v2/entities': {'GET': 3}}}, 'flag': True, 'name': 'orion'}
+        eq_(flatten_statistics(statistics), {'uptime_in_secs': 10.0, 'measuring_interval_in_secs': 10.0,
+                                             'semWait.request': 0.5, 'counters.requests./v2/entities.GET': 3.0})
+
+
+class StatisticsBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.buffer = StatisticsBuffer()
+        self.buffer.append(100.0, {'requests': 10})
+        self.buffer.append(102.0, {'requests': 30, 'errors': 1})
+        self.buffer.append(103.0, {'errors': 3})
+
+    def test_columns(self):
+        eq_(len(self.buffer), 3)
+        eq_(self.buffer.names(), ['timestamp', 'errors', 'requests'])
+        eq_(list(self.buffer.column('timestamp')), [100.0, 102.0, 103.0])
+        errors = self.buffer.column('errors')
+        ok_(is_nan(errors[0]))
+        eq_(list(errors[1:]), [1.0, 3.0])
+        ok_(is_nan(self.buffer.column('requests')[2]))
+
+    def test_column_copy(self):
+        column = self.buffer.column('requests')
+        column[0] = 0
+        eq_(self.buffer.column('requests')[0], 10.0)
+
+    def test_rates(self):
+        rates = self.buffer.rates(['requests', 'errors'])
+        eq_(list(rates['timestamp']), [100.0, 102.0, 103.0])
+        ok_(is_nan(rates['requests'][0]))
+        eq_(rates['requests'][1], 10.0)
+        ok_(is_nan(rates['requests'][2]))
+        eq_(rates['errors'][2], 2.0)
+
+    def test_rows(self):
+        rows = list(self.buffer.rows(rates=True))
+        eq_(rows[0], {'timestamp': 100.0, 'requests': 10.0})
+        eq_(rows[1], {'timestamp': 102.0, 'requests': 30.0, 'errors': 1.0, 'requests/s': 10.0})
+        eq_(rows[2], {'timestamp': 103.0, 'errors': 3.0, 'errors/s': 2.0})
+
+    def test_export(self):
+        folder = tempfile.mkdtemp()
+        try:
+            csv_file = os.path.join(folder, 'statistics.csv')
+            self.buffer.to_csv(csv_file)
+            with open(csv_file) as fd:
+                eq_(fd.read().splitlines(), ['timestamp,errors,requests', '100.0,,10.0', '102.0,1.0,30.0',
+                                             '103.0,3.0,'])
+            json_file = os.path.join(folder, 'statistics.json')
+            self.buffer.to_json_lines(json_file, rates=True)
+            with open(json_file) as fd:
+                rows = [json.loads(line) for line in fd]
+            eq_(len(rows), 3)
+            eq_(rows[1]['requests/s'], 10.0)
+        finally:
+            shutil.rmtree(folder)
+
+
+class CbStatisticsSamplerTest(unittest.TestCase):
+    def setUp(self):
+        self.sampler = CbStatisticsSampler('127.0.0.1', interval=0.01)
+        self.sampler.cb = mock.Mock()
+
+    def test_sample(self):
+        self.sampler.cb.statistics.return_value = MockResponse(200, {'counters': {'jsonRequests': 4}})
+        eq_(self.sampler.sample(), {'counters.jsonRequests': 4.0})
+        eq_(len(self.sampler.buffer), 1)
+
+    def test_sample_error(self):
+        self.sampler.cb.statistics.side_effect = [MockResponse(500, {}), Exception('connection refused')]
+        eq_(self.sampler.sample(), None)
+        eq_(self.sampler.sample(), None)
+        eq_(self.sampler.errors, 2)
+        eq_(len(self.sampler.buffer), 0)
+
+    def test_background(self):
+        self.sampler.cb.statistics.return_value = MockResponse(200, {'uptime_in_secs': 1})
+        with self.sampler:
+            while len(self.sampler.buffer) < 3:
+                self.sampler.stopped.wait(0.01)
+        ok_(self.sampler.thread is None)
+        self.sampler.cb.close.assert_called_once_with()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import threading
+import unittest
+
+from nose.tools import eq_, ok_
+from requests.exceptions import ConnectionError
+from iotqatools.cb_bulk_utils import BulkDeleteReport
+from iotqatools.cb_ngsiv2_utils import CbNgsi10v2Utils
+
+
+class MockResponse(object):
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body) if body is not None else ''
+        self.text = self.content
+        self.headers = headers or {}
+
+
+def subscription(number, description, url):
+    return {'id': 'sub_%s' % number, 'description': description,
+            'notification': {'http' if number % 2 else 'httpCustom': {'url': url}}}
+
+
+class FakeTransport(object):
+    """
+    Orion subscriptions resource: GET pages (limit/offset and Fiware-Total-Count) and DELETE by id
+    """
+
+    def __init__(self, subscriptions, delete_status=None):
+        self.session = None
+        self.lock = threading.Lock()
+        self.subscriptions = subscriptions
+        self.delete_status = delete_status or {}
+        self.pages = []
+        self.deleted = []
+
+    def request(self, method, url, headers=None, params=None, verify=None, data=None):
+        with self.lock:
+            if method == 'get':
+                offset, limit = params['offset'], params['limit']
+                self.pages.append((offset, limit, params['options']))
+                return MockResponse(200, self.subscriptions[offset:offset + limit],
+                                    {'Fiware-Total-Count': str(len(self.subscriptions))})
+            sub_id = url.rsplit('/', 1)[1]
+            self.deleted.append(sub_id)
+            status = self.delete_status.get(sub_id, 204)
+        if status is None:
+            raise ConnectionError('connection refused')
+        return MockResponse(status, {'error': 'NotFound'} if status == 404 else None)
+
+
+class CbSubscriptionsTest(unittest.TestCase):
+    def setUp(self):
+        self.subscriptions = [subscription(i, 'test %s' % i if i % 3 else 'other', 'http://listener:%s' % (i % 2))
+                              for i in range(25)]
+        self.transport = FakeTransport(self.subscriptions)
+        self.cb = CbNgsi10v2Utils('127.0.0.1', transport=self.transport, log_verbosity='ERROR')
+
+    def test_iter_subscriptions(self):
+        eq_(self.subscriptions, list(self.cb.iter_subscriptions(page_size=10, prefetch=False)))
+        eq_([(0, 10, 'count'), (10, 10, 'count'), (20, 10, 'count')], self.transport.pages)
+
+    def test_iter_subscriptions_filters(self):
+        subscriptions = list(self.cb.iter_subscriptions(page_size=7, description_prefix='test',
+                                                        notification_url='http://listener:0'))
+        eq_([sub['id'] for sub in self.subscriptions if sub['description'] != 'other' and
+             sub['notification'].get('httpCustom', {}).get('url') == 'http://listener:0'],
+            [sub['id'] for sub in subscriptions])
+        ok_(subscriptions)
+
+    def test_delete_subscriptions(self):
+        report = self.cb.delete_subscriptions(description_prefix='test', workers=4, page_size=10)
+        expected = [sub['id'] for sub in self.subscriptions if sub['description'] != 'other']
+        ok_(isinstance(report, BulkDeleteReport))
+        eq_(sorted(expected), sorted(self.transport.deleted))
+        eq_((len(expected), len(expected), 0, []), (report.total, report.deleted, report.not_found, report.failed))
+        # the ids are collected before deleting
+        eq_([(0, 10, 'count'), (10, 10, 'count'), (20, 10, 'count')], self.transport.pages)
+
+    def test_delete_subscriptions_failures(self):
+        self.transport.delete_status = {'sub_1': 404, 'sub_2': 500, 'sub_4': None}
+        report = self.cb.delete_subscriptions(notification_url='http://listener:1', workers=2)
+        eq_(report.not_found, 1)
+        eq_([], report.failed)
+        report = self.cb.delete_subscriptions(notification_url='http://listener:0', workers=2)
+        eq_(sorted((failed['id'], failed['status_code']) for failed in report.failed),
+            [('sub_2', 500), ('sub_4', None)])
+        eq_(report.done(), report.total)
+        ok_('failed: 2' in str(report))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import random
+import unittest
+
+from nose.tools import eq_, ok_
+from iotqatools.histogram_utils import HALF_BUCKETS, Histogram, bucket_index, bucket_range
+
+
+class BucketsTest(unittest.TestCase):
+    def test_bucket_range(self):
+        for value in range(100000) + [2 ** 40, 2 ** 40 + 12345]:
+            lower, upper = bucket_range(bucket_index(value))
+            ok_(lower <= value < upper, value)
+
+    def test_relative_error(self):
+        for value in (1000, 123456, 10 ** 9):
+            lower, upper = bucket_range(bucket_index(value))
+            ok_(float(upper - lower) / value <= 1.0 / HALF_BUCKETS)
+
+
+class HistogramTest(unittest.TestCase):
+    def test_empty(self):
+        histogram = Histogram()
+        eq_(histogram.percentile(99), 0)
+        eq_(histogram.summary(), {'count': 0, 'min': 0, 'mean': 0.0, 'max': 0, 'p50': 0, 'p95': 0, 'p99': 0})
+
+    def test_small_values_exact(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.record(value)
+        eq_((histogram.count, histogram.min, histogram.max, histogram.mean()), (100, 1, 100, 50.5))
+        eq_((histogram.percentile(50), histogram.percentile(99), histogram.percentile(100)), (50, 99, 100))
+
+    def test_percentiles(self):
+        rand = random.Random(7)
+        values = sorted(rand.randint(1000, 10 ** 7) for _ in range(10000))
+        histogram = Histogram()
+        for value in values:
+            histogram.record(value)
+        for percentile in (50, 90, 99):
+            expected = values[int(len(values) * percentile / 100.0) - 1]
+            ok_(abs(histogram.percentile(percentile) - expected) <= expected * 2.0 / HALF_BUCKETS)
+        eq_(histogram.percentile(100), values[-1])
+
+    def test_record_seconds(self):
+        histogram = Histogram()
+        histogram.record_seconds(0.0125)
+        histogram.record_seconds(-1)
+        eq_((histogram.min, histogram.max), (0, 12500))
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        for value in range(0, 1000, 2):
+            first.record(value)
+        for value in range(1, 1000, 2):
+            second.record(value, count=2)
+        merged = first.copy().merge(second)
+        eq_((merged.count, merged.min, merged.max), (1500, 0, 999))
+        eq_(merged.total, first.total + second.total)
+        eq_(first.count, 500)
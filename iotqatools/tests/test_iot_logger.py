@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import logging
+import threading
+import unittest
+
+from nose.tools import eq_, ok_
+from iotqatools.iot_logger import AsyncLogSink, QueueHandler
+
+
+class ListHandler(logging.Handler):
+    """
+    handler keeping the formatted messages, blocked while the event is not set
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+        self.event = threading.Event()
+        self.event.set()
+
+    def emit(self, record):
+        self.event.wait()
+        self.messages.append(self.format(record))
+
+
+class AsyncLogSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.target = ListHandler()
+        self.logger = logging.getLogger('test_async_log_sink')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+
+    def test_message_rendered_in_caller(self):
+        sink = AsyncLogSink(10)
+        self.logger.addHandler(QueueHandler(sink, self.target))
+        self.target.event.clear()
+        headers = {'Fiware-Service': 'service1'}
+        self.logger.info('headers: %s', headers)
+        headers['Fiware-Service'] = 'service2'
+        self.target.event.set()
+        sink.stop()
+        eq_(["headers: {'Fiware-Service': 'service1'}"], self.target.messages)
+        eq_(1, sink.written)
+
+    def test_traceback_rendered_in_caller(self):
+        sink = AsyncLogSink(10)
+        self.logger.addHandler(QueueHandler(sink, self.target))
+        try:
+            raise ValueError('wrong value')
+        except ValueError:
+            self.logger.exception('failed')
+        sink.stop()
+        ok_(self.target.messages[0].startswith('failed\nTraceback'))
+        ok_(self.target.messages[0].endswith('ValueError: wrong value'))
+
+    def test_drop_when_full(self):
+        sink = AsyncLogSink(1, AsyncLogSink.DROP)
+        self.logger.addHandler(QueueHandler(sink, self.target))
+        self.target.event.clear()
+        for i in range(5):
+            self.logger.info('message %s', i)
+        self.target.event.set()
+        sink.stop()
+        eq_(5, sink.written + sink.dropped)
+        ok_(sink.dropped > 0)
+
+    def test_block_after_stop(self):
+        sink = AsyncLogSink(1, AsyncLogSink.BLOCK)
+        self.logger.addHandler(QueueHandler(sink, self.target))
+        sink.stop()
+        # the stale handler does not wait for the stopped thread
+        for i in range(3):
+            self.logger.info('message %s', i)
+        eq_(['message 0', 'message 1', 'message 2'], self.target.messages)
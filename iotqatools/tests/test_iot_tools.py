@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import logging
+import unittest
+
+from nose.tools import eq_, assert_in, assert_not_in
+from iotqatools.iot_logger import get_logger
+from iotqatools.iot_tools import LazyLogMessage, PqaTools
+
+
+class BufferHandler(logging.Handler):
+    """
+    handler keeping the records, to build their messages later
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LazyLogMessageTest(unittest.TestCase):
+
+    def test_built_once(self):
+        calls = []
+        message = LazyLogMessage(lambda text: calls.append(text) or text.upper(), u'payload')
+        eq_('PAYLOAD', str(message))
+        eq_('PAYLOAD', str(message))
+        eq_([u'payload'], calls)
+
+    def test_request_logged_as_sent(self):
+        log = get_logger('iot_tools', 'DEBUG')
+        handler = BufferHandler()
+        log.addHandler(handler)
+        try:
+            headers = {'Fiware-Service': 'service1'}
+            params = {'method': 'post', 'url': 'http://cb:1026/v2/entities', 'headers': headers}
+            PqaTools.log_requestAndResponse(url='http://iota:4041/iot/devices', headers=headers, comp='IOTA',
+                                            method='get')
+            PqaTools.log_fullRequest(comp='CB', params=params)
+            # the headers are changed after the request (ev: headers.update(self.headers) in the next one)
+            headers['Fiware-Service'] = 'service2'
+            params['url'] = 'http://cb:1026/v2/subscriptions'
+        finally:
+            log.removeHandler(handler)
+        # request of log_requestAndResponse, request and response of log_fullRequest
+        eq_(3, len(handler.records))
+        for record in handler.records[:2]:
+            assert_in('service1', record.getMessage())
+            assert_not_in('service2', record.getMessage())
+        assert_in('/v2/entities', handler.records[1].getMessage())
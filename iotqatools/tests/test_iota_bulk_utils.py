@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import unittest
+
+from nose.tools import eq_, ok_
+from iotqatools.iota_bulk_utils import IotaBulkProvisioner
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeIota(object):
+    """
+    Rest_Utils_IoTA answering create_devices with 409 for the devices in conflict
+    """
+
+    def __init__(self, conflicts=(), listed=()):
+        self.lock = threading.Lock()
+        self.conflicts = set(conflicts)
+        self.listed = list(listed)
+        self.created = []
+        self.token = None
+
+    def create_devices(self, service_name, devices, service_path={}):
+        if self.conflicts.intersection(device['device_id'] for device in devices):
+            return MockResponse(409, 'DUPLICATE_DEVICE_ID')
+        with self.lock:
+            self.created.extend(device['device_id'] for device in devices)
+        return MockResponse(201)
+
+    def iter_devices(self, service_name, service_path={}, page_size=100):
+        return iter(self.listed)
+
+
+def devices(number):
+    return [{'device_id': 'dev_%s' % i} for i in range(number)]
+
+
+class IotaBulkProvisionerTest(unittest.TestCase):
+
+    def test_provision_in_chunks(self):
+        iota = FakeIota()
+        report = IotaBulkProvisioner(iota, workers=4, chunk_size=10).provision('service', devices(95), '/path')
+        eq_(95, report.devices)
+        eq_(10, len(report.chunks))
+        eq_([], report.failed_chunks())
+        eq_(sorted('dev_%s' % i for i in range(95)), sorted(iota.created))
+
+    def test_lazy_devices_bounded(self):
+        iota = FakeIota()
+        read = []
+
+        def generator():
+            for device in devices(1000):
+                read.append(device)
+                # chunks of 10, at most 2 in flight and 1 being filled
+                ok_(len(read) - len(iota.created) <= 30)
+                yield device
+
+        IotaBulkProvisioner(iota, workers=1, chunk_size=10, max_in_flight=2).provision('service', generator())
+        eq_(1000, len(iota.created))
+
+    def test_skip_existing_and_retry(self):
+        iota = FakeIota(conflicts=['dev_15'], listed=[{'device_id': 'dev_0'}])
+        provisioner = IotaBulkProvisioner(iota, workers=2, chunk_size=10)
+        report = provisioner.provision('service', devices(30), load_index=True)
+        eq_(1, report.skipped)
+        eq_(1, len(report.failed_chunks()))
+        eq_(10, report.failed_devices)
+        ok_(provisioner.exists('service', 'dev_29'))
+        ok_(not provisioner.exists('service', 'dev_15'))
+        iota.conflicts.clear()
+        retry = provisioner.retry(report, load_index=False)
+        eq_(10, retry.devices)
+        eq_([], retry.failed_chunks())
+        ok_(provisioner.exists('service', 'dev_15'))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import time
+import unittest
+
+import mock
+from nose.tools import eq_, ok_
+from requests.exceptions import ConnectionError
+from iotqatools.iota_command_utils import CommandPollerPool, CommandRoundTripStats, parse_commands
+from iotqatools.iota_fleet_utils import TimerWheel
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+
+def notification(**attributes):
+    entity = {'id': 'Thing:cmd_0', 'type': 'Thing'}
+    entity.update(attributes)
+    return {'subscriptionId': 'sub_1', 'data': [entity]}
+
+
+class FakeGw(object):
+    """
+    IoTA south port: each device gets one command (its token) in the first poll
+    """
+
+    def __init__(self, fail_responses=False):
+        self.lock = threading.Lock()
+        self.fail_responses = fail_responses
+        self.polls = []
+        self.responses = []
+
+    def getCommand(self, measure_type, apikey, device_id):
+        with self.lock:
+            first = device_id not in self.polls
+            self.polls.append(device_id)
+        return MockResponse(200, '%s@ping|tk_%s' % (device_id, device_id) if first else '')
+
+    def SendCmdResponse(self, measure_type, apikey, device_id, command, response):
+        with self.lock:
+            self.responses.append((device_id, command, response))
+        if self.fail_responses:
+            raise ConnectionError('connection refused')
+        return MockResponse(200)
+
+
+class ParseCommandsTest(unittest.TestCase):
+    def test_parse_commands(self):
+        eq_(parse_commands('cmd_0@ping|tk_1'), [('ping', 'tk_1')])
+        eq_(parse_commands('ping|tk_1#cmd_0@reset|a|b\nnothing\n'), [('ping', 'tk_1'), ('reset', 'a|b')])
+        eq_(parse_commands(''), [])
+
+
+class CommandRoundTripStatsTest(unittest.TestCase):
+    def test_round_trip(self):
+        stats = CommandRoundTripStats()
+        stats.sent('tk_1', 10.0)
+        stats.sent('tk_2', 10.0)
+        stats.received('tk_1', 10.2)
+        stats.received('tk_9', 10.2)
+        stats.response_sent(True)
+        stats.notified(notification(ping_info={'type': 'commandResult', 'value': 'tk_1'},
+                                    ping_status={'value': 'OK'}), 10.5)
+        stats.notified(notification(ping_info='tk_1'), 10.6)
+        eq_((stats.delivered, stats.responded, stats.completed, stats.unknown), (1, 1, 1, 1))
+        eq_(stats.waiting(), 1)
+        eq_(stats.round_trip.count, 1)
+        ok_(stats.report().startswith('commands: 2 (0 errors), delivered: 1, responded: 1 (0 errors), completed: 1'))
+
+    def test_update_failed(self):
+        stats = CommandRoundTripStats()
+        stats.sent('tk_1', 10.0)
+        stats.update_failed('tk_1')
+        eq_((stats.update_errors, stats.waiting()), (1, 0))
+
+    def test_lost(self):
+        stats = CommandRoundTripStats(max_pending=2)
+        for token in ('tk_1', 'tk_2', 'tk_3'):
+            stats.sent(token, 10.0)
+        eq_((stats.lost, stats.waiting()), (1, 2))
+        # the oldest one is not waited for anymore
+        stats.notified(notification(ping_info='tk_1'), 11.0)
+        stats.notified(notification(ping_info='tk_3'), 11.0)
+        eq_((stats.unknown, stats.completed), (1, 1))
+
+
+class CommandPollerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.gw = FakeGw()
+        self.pool = CommandPollerPool('http://127.0.0.1:7896', poll_interval=5, response_delay=(1, 1), workers=4,
+                                      log_verbosity='ERROR')
+        self.pool.gw = self.gw
+        self.devices = self.pool.add_devices(2, 'apikey1')
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_add_devices(self):
+        self.pool.add_devices(1, 'apikey2', entity_name=lambda device_id: 'dev:' + device_id)
+        eq_([(device.device_id, device.entity_id) for device in self.pool.devices],
+            [('cmd_0', 'Thing:cmd_0'), ('cmd_1', 'Thing:cmd_1'), ('cmd_2', 'dev:cmd_2')])
+
+    def test_poll(self):
+        self.pool.stats = CommandRoundTripStats()
+        self.pool.stats.sent('tk_cmd_0', 999.0)
+        self.pool.wheel = TimerWheel(0.5, slots=16, start=1000.0)
+        device = self.devices[0]
+        with mock.patch('iotqatools.iota_command_utils.time.time', return_value=1000.0):
+            self.pool.poll(device)
+        eq_((device.polls, device.commands, self.pool.stats.delivered), (1, 1, 1))
+        # the response after response_delay and the next poll after poll_interval
+        eq_(self.pool.wheel.advance(1000.5), [])
+        eq_(self.pool.wheel.advance(1001.0), [('respond', device, 'ping', 'tk_cmd_0')])
+        eq_(self.pool.wheel.advance(1005.0), [('poll', device)])
+
+    def test_respond(self):
+        self.pool.stats = CommandRoundTripStats()
+        self.pool.respond(self.devices[0], 'ping', 'tk_cmd_0')
+        self.gw.fail_responses = True
+        self.pool.respond(self.devices[0], 'ping', 'tk_cmd_0')
+        eq_(self.gw.responses, [('cmd_0', 'ping', 'tk_cmd_0')] * 2)
+        eq_((self.pool.stats.responded, self.pool.stats.response_errors, self.devices[0].errors), (1, 1, 1))
+
+    def test_start_stop(self):
+        self.pool.poll_interval = 0.05
+        self.pool.response_delay = (0, 0.01)
+        self.pool.tick = 0.01
+        stats = CommandRoundTripStats()
+        self.pool.start(stats)
+        time.sleep(0.3)
+        self.pool.stop()
+        ok_(self.pool.queue.empty())
+        eq_(stats.responded, 2)
+        eq_(sorted(response[0] for response in self.gw.responses), ['cmd_0', 'cmd_1'])
+        for device in self.devices:
+            eq_(device.commands, 1)
+            eq_(device.polls, self.gw.polls.count(device.device_id))
+            ok_(device.polls > 1)
+        # nothing runs after stopping
+        polls = len(self.gw.polls)
+        time.sleep(0.1)
+        eq_(len(self.gw.polls), polls)
+
+    def test_stop_discards_queued_events(self):
+        for device in self.devices:
+            self.pool.queue.put(('poll', device))
+        self.pool.stop()
+        ok_(self.pool.queue.empty())
+        eq_(self.gw.polls, [])
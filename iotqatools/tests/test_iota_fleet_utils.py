@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import unittest
+
+from nose.tools import eq_
+from iotqatools.iota_fleet_utils import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    def setUp(self):
+        self.wheel = TimerWheel(tick=0.25, slots=4, start=100.0)
+
+    def test_advance(self):
+        self.wheel.schedule(100.5, 'second')
+        self.wheel.schedule(100.25, 'first')
+        self.wheel.schedule(100.6, 'third')
+        eq_(self.wheel.size, 3)
+        eq_(self.wheel.advance(100.2), [])
+        eq_(self.wheel.advance(100.25), ['first'])
+        eq_(self.wheel.advance(101.0), ['second', 'third'])
+        eq_(self.wheel.size, 0)
+        eq_(self.wheel.next_time(), 101.25)
+
+    def test_beyond_a_turn(self):
+        # 4 slots of 0.25s: 101.25 shares the slot of 100.25 and waits for its round
+        self.wheel.schedule(100.25, 'now')
+        self.wheel.schedule(101.25, 'next turn')
+        self.wheel.schedule(102.25, 'two turns')
+        eq_(self.wheel.advance(100.5), ['now'])
+        eq_(self.wheel.advance(101.0), [])
+        eq_(self.wheel.advance(101.5), ['next turn'])
+        eq_(self.wheel.size, 1)
+        eq_(self.wheel.advance(102.25), ['two turns'])
+
+    def test_past(self):
+        self.wheel.advance(101.0)
+        self.wheel.schedule(100.0, 'late')
+        eq_(self.wheel.advance(101.0), [])
+        eq_(self.wheel.advance(101.25), ['late'])
+
+    def test_reschedule(self):
+        # each device schedules again its next report when it expires
+        expired = []
+        self.wheel.schedule(100.0, 'device')
+        now = 100.0
+        while now < 102.0:
+            for item in self.wheel.advance(now):
+                expired.append(now)
+                self.wheel.schedule(now + 0.5, item)
+            now += 0.25
+        eq_(expired, [100.0, 100.5, 101.0, 101.5])
+        eq_(self.wheel.size, 1)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+from nose.tools import eq_
+from iotqatools.iota_measures import Gw_Measures_Utils, MeasureEncoder
+import unittest
+
+MEASURES = [{"timestamp": "2016-03-01T10:00:00Z", "id": "8:1", "alias": "t", "value": 20},
+            {"id": "8:2", "alias": "on", "value": True},
+            {"alias": "s", "value": "a;b&c"},
+            {"alias": "q", "value": "it's"}]
+
+REPSOL = {"id": "1", "device": "+34666", "message": "alarm", "timestamp": "2016-03-01T10:00:00Z"}
+
+
+class MeasureEncoderTest(unittest.TestCase):
+    """
+    Golden payloads, as they were built by Gw_Measures_Utils.getMeasure before the encoder (but the IoTRepsol
+    field order)
+    """
+
+    def setUp(self):
+        self.gw = Gw_Measures_Utils(verbose=False)
+
+    def test_ul(self):
+        eq_('||2016-03-01T10:00:00Z|8:1||t|20#|||8:2||on|1#|||||s|a/b|c#|||||q|it\'s',
+            self.gw.getMeasure('UL', MEASURES))
+
+    def test_ul2(self):
+        eq_('2016-03-01T10:00:00Z|t|20#|on|1#|s|a/b|c#|q|it\'s', self.gw.getMeasure('UL2', MEASURES))
+
+    def test_iot_ul2(self):
+        eq_('2016-03-01T10:00:00Z|t|20#|on|True#|s|a;b&c#|q|it"s', self.gw.getMeasure('IoTUL2', MEASURES))
+
+    def test_iot_repsol(self):
+        # fields in a fixed order (they were in the order of a dict)
+        eq_('{"id": "1", "from": "tel:+34666;phone-context=+34", "to": "tel:+123123123;phone-context=+34", '
+            '"message": "alarm", "timestamp": "2016-03-01T10:00:00Z"}',
+            self.gw.getMeasure('IoTRepsol', [REPSOL]))
+        eq_('{"id": "1", "from": "tel:+34666;phone-context=+34", "to": "tel:+123123123;phone-context=+34", '
+            '"timestamp": "2016-03-01T10:00:00Z"}',
+            self.gw.getMeasure('IoTRepsol', [REPSOL], 'message'))
+
+    def test_unicode_values(self):
+        eq_('|t|habitaci\xc3\xb3n#|h|\xc3\xb1', self.gw.getMeasure('UL2', [{"alias": "t", "value": u"habitaci\xf3n"},
+                                                                     {"alias": "h", "value": "\xc3\xb1"}]))
+
+    def test_empty(self):
+        eq_('', self.gw.getMeasure('UL2', []))
+
+    def test_values_not_replaced_inside_other_values(self):
+        eq_('|t|untrue', self.gw.getMeasure('UL2', [{"alias": "t", "value": "untrue"}]))
+
+    def test_encode_many(self):
+        encoder = MeasureEncoder('UL2')
+        eq_(['|t|20#|h|1', '|t|21'], encoder.encode_many([[{"alias": "t", "value": 20}, {"alias": "h", "value": True}],
+                                                          [{"alias": "t", "value": 21}]]))
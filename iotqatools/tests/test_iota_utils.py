@@ -100,6 +100,31 @@ class IOTAUtilsTest(unittest.TestCase):
        eq_(400, res.status_code, msg="version to CB does not return 200")
        assert_in("a service string must not be longer than 50 characters and may only contain underscores and alphanumeric characters", res.content, msg="bad data returned to bad sewrvice name to IOTA")
 
+class IOTAExistenceCacheTest(unittest.TestCase):
+
+   def setUp(self):
+      self.transport = mock.Mock()
+      self.transport.get.return_value = MockResponse({"count": 1, "services": []}, 200)
+      self.transport.post.return_value = MockResponse("", 201)
+      self.iota = Rest_Utils_IoTA(server_root="http://mock.iota.com:1026/iot", cache_ttl=60, transport=self.transport)
+
+   def test_service_created_cached_until_create(self):
+       ok_(self.iota.service_created("service1", "/path"))
+       ok_(self.iota.service_created("service1", "/path"))
+       eq_(1, self.transport.get.call_count)
+       self.iota.create_service_with_params("service1", "/path", apikey="apikey1")
+       ok_(self.iota.service_created("service1", "/path"))
+       eq_(2, self.transport.get.call_count)
+       eq_({'hits': 1, 'misses': 2, 'invalidations': 1, 'entries': 1}, self.iota.existence_cache.stats())
+
+   def test_ttl_expired(self):
+       now = [1000.0]
+       self.iota.existence_cache.clock = lambda: now[0]
+       self.iota.service_created("service1")
+       now[0] += 61
+       self.iota.service_created("service1")
+       eq_(2, self.transport.get.call_count)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import unittest
+
+import requests
+from nose.tools import eq_, ok_
+from iotqatools.json_utils import JsonCodec, available_backends
+
+VALUE = {'id': u'habitación', 'temperature': {'type': 'Number', 'value': 21.5}, 'url': 'http://host/path'}
+
+
+class JsonCodecTest(unittest.TestCase):
+
+    def test_same_bytes_as_json_dumps(self):
+        for backend in available_backends():
+            codec = JsonCodec(backend)
+            eq_(json.dumps(VALUE), codec.dumps(VALUE))
+            eq_(json.dumps(VALUE, ensure_ascii=False).encode('utf-8'), codec.dumps(VALUE, ensure_ascii=False))
+
+    def test_compact(self):
+        for backend in available_backends():
+            eq_(VALUE, json.loads(JsonCodec(backend).dumps(VALUE, ensure_ascii=False, compact=True)))
+        eq_('{"id":"habitaci\xc3\xb3n"}', JsonCodec('json').dumps({'id': u'habitación'}, ensure_ascii=False,
+                                                                  compact=True))
+
+    def test_response_json_parsed_once(self):
+        response = requests.Response()
+        response._content = JsonCodec().dumps(VALUE, ensure_ascii=False)
+        codec = JsonCodec()
+        parsed = codec.response_json(response)
+        eq_(VALUE, parsed)
+        ok_(parsed is codec.response_json(response))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from datetime import timedelta
+
+from nose.tools import eq_, ok_
+from iotqatools.iot_tools import PqaTools
+from iotqatools.metrics_utils import RequestMetrics, TimedHTTPAdapter, TimedSession, route_template
+
+
+class MockRequest(object):
+    def __init__(self, body):
+        self.body = body
+
+
+class MockResponse(object):
+    def __init__(self, status_code, url, content='', body=None, timings=None, elapsed=0.01):
+        self.status_code = status_code
+        self.url = url
+        self.content = content
+        self.headers = {}
+        self.request = MockRequest(body)
+        self.elapsed = timedelta(seconds=elapsed)
+        if timings is not None:
+            self.timings = timings
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RouteTemplateTest(unittest.TestCase):
+    def test_route_template(self):
+        eq_(route_template('http://cb:1026/v2/entities/room_1/attrs/temperature?type=Room'),
+            '/v2/entities/{id}/attrs/{id}')
+        eq_(route_template('http://cb:1026/v2/entities'), '/v2/entities')
+        eq_(route_template('http://cb:1026/v2/subscriptions/5a1b2c'), '/v2/subscriptions/{id}')
+        eq_(route_template('http://iota:4041/iot/devices/sensor_1'), '/iot/devices/{id}')
+        eq_(route_template('http://iota:7896/iot/d?k=apikey&i=sensor_1'), '/iot/d')
+        eq_(route_template('http://sth:8666/STH/v1/contextEntities/type/Room/id/room_1/attributes/temp'),
+            '/STH/v1/contextEntities/type/{id}/id/{id}/attributes/{id}')
+        eq_(route_template('http://ks:5000/v3/OS-SCIM/v2/Users/42'), '/v3/OS-SCIM/v2/Users/{id}')
+
+
+class RequestMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RequestMetrics()
+
+    def test_record(self):
+        self.metrics.record('CB', 'get', 'http://cb:1026/v2/entities/room_1', {}, None,
+                            MockResponse(200, 'http://cb:1026/v2/entities/room_1', '{"id": "room_1"}',
+                                         timings={'connect': 0.002, 'ttfb': 0.01, 'total': 0.012}))
+        self.metrics.record('CB', 'get', 'http://cb:1026/v2/entities/room_2', {}, None,
+                            MockResponse(503, 'http://cb:1026/v2/entities/room_2', elapsed=0.02))
+        self.metrics.record('CB', 'post', 'http://cb:1026/v2/entities', {}, '{"id": "room_3"}', None)
+        eq_(self.metrics.keys(), [('CB', 'GET', '/v2/entities/{id}'), ('CB', 'POST', '/v2/entities')])
+        total = self.metrics.histogram('total', comp='CB', method='get')
+        eq_((total.count, total.min, total.max), (2, 12000, 20000))
+        eq_(self.metrics.histogram('connect').count, 1)
+        eq_(self.metrics.histogram('response_size', route='/v2/entities/{id}').max, 16)
+        eq_(self.metrics.errors, {('CB', 'GET', '/v2/entities/{id}'): 1, ('CB', 'POST', '/v2/entities'): 1})
+        lines = self.metrics.summary_table().splitlines()
+        eq_(len(lines), 3)
+        ok_(lines[1].split()[:5] == ['CB', 'GET', '/v2/entities/{id}', '2', '1'])
+
+    def test_merge(self):
+        other = RequestMetrics()
+        for metrics in (self.metrics, other):
+            metrics.record('IOTA', 'post', 'http://iota:7896/iot/d', {}, 'a|1',
+                           MockResponse(200, 'http://iota:7896/iot/d', body='a|1'))
+        self.metrics.merge(other)
+        eq_(self.metrics.histogram('request_size', comp='IOTA').count, 2)
+        eq_(self.metrics.histogram('request_size', comp='IOTA').max, 3)
+
+    def test_install(self):
+        self.metrics.install()
+        try:
+            PqaTools.log_fullRequest(comp='STH', response=MockResponse(200, 'http://sth:8666/version'),
+                                     params={'method': 'get', 'url': 'http://sth:8666/version'})
+        finally:
+            self.metrics.uninstall()
+        eq_(self.metrics.keys(), [('STH', 'GET', '/version')])
+
+
+class TimedSessionTest(unittest.TestCase):
+    def test_timings(self):
+        server = HTTPServer(('127.0.0.1', 0), OkHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        session = TimedSession()
+        session.mount('http://', TimedHTTPAdapter())
+        try:
+            url = 'http://127.0.0.1:%s/version' % server.server_address[1]
+            first = session.get(url)
+            second = session.get(url)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+        for response in (first, second):
+            ok_(0 <= response.timings['ttfb'] <= response.timings['total'])
+        ok_(first.timings['connect'] > 0)
+        # the second request reuses the pooled connection
+        eq_(second.timings['connect'], 0.0)
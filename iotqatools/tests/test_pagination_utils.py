@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import sys
+import traceback
+import unittest
+
+from nose.tools import eq_, assert_raises
+from iotqatools.pagination_utils import iter_pages
+
+ITEMS = range(25)
+
+
+def pages(total=True, fail_at=None):
+    """
+    fetch_page of a resource with 25 items, recording the offsets requested
+    """
+    offsets = []
+
+    def fetch_page(offset):
+        offsets.append(offset)
+        if offset == fail_at:
+            raise ValueError('page %s failed' % offset)
+        return ITEMS[offset:offset + 10], len(ITEMS) if total else None
+
+    return fetch_page, offsets
+
+
+class IterPagesTest(unittest.TestCase):
+
+    def test_total(self):
+        for prefetch in (True, False):
+            fetch_page, offsets = pages()
+            eq_(ITEMS, list(iter_pages(fetch_page, 10, prefetch=prefetch)))
+            eq_([0, 10, 20], offsets)
+
+    def test_without_total(self):
+        fetch_page, offsets = pages(total=False)
+        eq_(ITEMS, list(iter_pages(fetch_page, 10)))
+        # the last page is the first one shorter than page_size
+        eq_([0, 10, 20], offsets)
+
+    def test_offset(self):
+        fetch_page, offsets = pages()
+        eq_(ITEMS[5:], list(iter_pages(fetch_page, 10, offset=5)))
+        eq_([5, 15], offsets)
+
+    def test_lazy(self):
+        fetch_page, offsets = pages()
+        items = iter_pages(fetch_page, 10, prefetch=False)
+        eq_(0, next(items))
+        eq_([0], offsets)
+
+    def test_error_in_background_page(self):
+        fetch_page, offsets = pages(fail_at=10)
+        items = iter_pages(fetch_page, 10)
+        eq_(ITEMS[:10], [next(items) for _ in range(10)])
+        assert_raises(ValueError, next, items)
+
+    def test_error_traceback(self):
+        fetch_page, offsets = pages(fail_at=0)
+        try:
+            list(iter_pages(fetch_page, 10))
+        except ValueError:
+            # the traceback ends in fetch_page, in the background thread
+            eq_('fetch_page', traceback.extract_tb(sys.exc_info()[2])[-1][2])
+        else:
+            raise AssertionError('ValueError not raised')
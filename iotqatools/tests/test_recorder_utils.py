@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+from nose.tools import eq_, ok_, assert_raises
+from iotqatools.iot_tools import PqaTools
+from iotqatools.recorder_utils import FlightRecorder, body_text
+
+
+class MockResponse(object):
+    def __init__(self, status_code, content='', url='http://cb:1026/v2/entities', elapsed=0.25):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+        self.headers = {}
+        self.elapsed = timedelta(seconds=elapsed)
+
+
+class BodyTextTest(unittest.TestCase):
+    def test_body_text(self):
+        eq_(body_text(None, 10), None)
+        eq_(body_text('short', 10), 'short')
+        eq_(body_text('x' * 15, 10), 'xxxxxxxxxx... (5 chars more)')
+        eq_(json.loads(body_text({'id': 'room'}, 100)), {'id': 'room'})
+
+
+class FlightRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.recorder = FlightRecorder(size=3, body_size=8, log_verbosity='ERROR')
+
+    def test_entries(self):
+        self.recorder.record('CB', 'post', 'http://cb:1026/v2/entities', {}, {'id': 'room_1'},
+                             MockResponse(201, 'created'))
+        self.recorder.record('IOTA', 'get', 'http://iota:4041/iot/services', {}, None, None)
+        entries = self.recorder.entries()
+        eq_(len(entries), 2)
+        eq_((entries[0]['comp'], entries[0]['status'], entries[0]['elapsed_ms'], entries[0]['response_body']),
+            ('CB', 201, 250.0, 'created'))
+        eq_(entries[0]['request_body'], '{"id": "... (8 chars more)')
+        eq_((entries[1]['status'], entries[1]['elapsed_ms'], entries[1]['response_body']), (None, None, None))
+
+    def test_ring(self):
+        for i in range(7):
+            self.recorder.record('CB', 'get', 'http://cb/%s' % i, {}, None, None)
+        eq_(self.recorder.recorded, 7)
+        eq_([entry['url'] for entry in self.recorder.entries()], ['http://cb/4', 'http://cb/5', 'http://cb/6'])
+
+    def test_wrong_size(self):
+        assert_raises(ValueError, FlightRecorder, size=0)
+        recorder = FlightRecorder(size=1, log_verbosity='ERROR')
+        recorder.record('CB', 'get', 'http://cb/0', {}, None, None)
+        recorder.record('CB', 'get', 'http://cb/1', {}, None, None)
+        eq_([entry['url'] for entry in recorder.entries()], ['http://cb/1'])
+
+    def test_install(self):
+        self.recorder.install()
+        try:
+            PqaTools.log_requestAndResponse(url='http://sth:8666/version', comp='STH', method='get',
+                                            response=MockResponse(200, '{}', url='http://sth:8666/version'))
+        finally:
+            self.recorder.uninstall()
+        PqaTools.log_requestAndResponse(url='http://sth:8666/version', comp='STH', method='get')
+        eq_([(entry['comp'], entry['status']) for entry in self.recorder.entries()], [('STH', 200)])
+
+    def test_dump_on_failure(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'flight_recorder.jsonl')
+            self.recorder.record('CB', 'get', 'http://cb/1', {}, None, MockResponse(500, 'error'))
+            with self.recorder.dump_on_failure(filename):
+                pass
+            ok_(not os.path.exists(filename))
+            with assert_raises(AssertionError):
+                with self.recorder.dump_on_failure(filename):
+                    assert False, 'ERROR: status 500'
+            with open(filename) as fd:
+                eq_([json.loads(line)['status'] for line in fd], [500])
+        finally:
+            shutil.rmtree(folder)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import mock
+from nose.tools import assert_raises, eq_, ok_
+from requests.exceptions import ConnectionError, ReadTimeout
+from requests.packages.urllib3.exceptions import NewConnectionError
+from iotqatools.transport_utils import CircuitBreaker, CircuitOpenError, HttpTransport, RetryPolicy, \
+    client_transport
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """
+    replies the statuses of the server queue (200 when it is empty), setting a cookie, and keeps the headers received
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.received.append(dict(self.headers))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        for name, value in self.server.reply_headers.items():
+            self.send_header(name, value)
+        self.send_header('Set-Cookie', 'session=1234; Path=/')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('{}')
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockResponse(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class LocalServer(object):
+    def __init__(self, statuses=(), reply_headers=None):
+        self.server = HTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.statuses = list(statuses)
+        self.server.reply_headers = reply_headers or {}
+        self.server.received = []
+        self.host = '127.0.0.1:%s' % self.server.server_address[1]
+        self.url = 'http://%s/version' % self.host
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def received(self):
+        return self.server.received
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_counters(self):
+        with HttpTransport(log_verbosity='ERROR') as transport:
+            eq_(transport.get(self.server.url).status_code, 200)
+            eq_(transport.request('post', self.server.url, data='{}').status_code, 200)
+            counters = transport.get_counters(self.server.host)
+        eq_(counters, {'requests': 2, 'errors': 0, 'retries': 0, 'circuit_opened': 0, 'circuit_rejected': 0})
+        eq_(transport.get_counters(), counters)
+        eq_(transport.get_counters('unknown:80'), {})
+
+    def test_timings(self):
+        with HttpTransport(log_verbosity='ERROR') as transport:
+            response = transport.get(self.server.url)
+        ok_(0 <= response.timings['ttfb'] <= response.timings['total'])
+
+    def test_cookies_not_kept(self):
+        with HttpTransport(log_verbosity='ERROR') as transport:
+            eq_(transport.get(self.server.url).cookies.get('session'), '1234')
+            transport.get(self.server.url)
+            transport.get(self.server.url, cookies={'user': 'test'})
+        eq_([headers.get('cookie') for headers in self.server.received], [None, None, 'user=test'])
+
+    def test_keep_alive(self):
+        with HttpTransport(keep_alive=False, log_verbosity='ERROR') as transport:
+            transport.get(self.server.url)
+        eq_(self.server.received[0].get('connection'), 'close')
+
+    def test_default_timeout(self):
+        transport = HttpTransport(timeout=(3, 30), log_verbosity='ERROR')
+        transport.session = mock.Mock()
+        transport.get(self.server.url)
+        transport.get(self.server.url, timeout=1)
+        eq_([call[1]['timeout'] for call in transport.session.request.call_args_list], [(3, 30), 1])
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(retries=2, backoff=0.1, max_backoff=0.3, seed=1)
+
+    def test_should_retry_status(self):
+        ok_(self.policy.should_retry('get', 0, MockResponse(503), None))
+        ok_(not self.policy.should_retry('get', 0, MockResponse(500), None))
+        ok_(not self.policy.should_retry('get', 2, MockResponse(503), None))
+        # the request was processed, only the idempotent methods are sent again
+        ok_(not self.policy.should_retry('post', 0, MockResponse(503), None))
+
+    def test_should_retry_error(self):
+        refused = ConnectionError(NewConnectionError(None, 'connection refused'))
+        ok_(self.policy.should_retry('post', 0, None, refused))
+        ok_(self.policy.should_retry('get', 1, None, ReadTimeout()))
+        ok_(not self.policy.should_retry('post', 0, None, ReadTimeout()))
+        ok_(not self.policy.should_retry('get', 0, None, CircuitOpenError()))
+
+    def test_delay(self):
+        for attempt in range(5):
+            ok_(0 <= self.policy.delay(attempt) <= min(0.3, 0.1 * 2 ** attempt))
+        # the same seed waits the same
+        other = RetryPolicy(retries=2, backoff=0.1, max_backoff=0.3, seed=1)
+        for attempt in range(5):
+            other.delay(attempt)
+        eq_([self.policy.delay(1) for _ in range(3)], [other.delay(1) for _ in range(3)])
+
+    def test_retry_after(self):
+        eq_(self.policy.delay(0, MockResponse(429, {'Retry-After': '0'})), 0.0)
+        eq_(self.policy.delay(0, MockResponse(429, {'Retry-After': '120'})), 0.3)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        patcher = mock.patch('iotqatools.transport_utils.time.time', return_value=1000.0)
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_open(self):
+        ok_(not self.breaker.record('cb:1026', True))
+        ok_(self.breaker.allow('cb:1026'))
+        ok_(self.breaker.record('cb:1026', True))
+        eq_(self.breaker.state('cb:1026'), CircuitBreaker.OPEN)
+        ok_(not self.breaker.allow('cb:1026'))
+        # the circuits are per host
+        ok_(self.breaker.allow('iota:4041'))
+
+    def test_success_resets_failures(self):
+        self.breaker.record('cb:1026', True)
+        self.breaker.record('cb:1026', False)
+        ok_(not self.breaker.record('cb:1026', True))
+        eq_(self.breaker.state('cb:1026'), CircuitBreaker.CLOSED)
+
+    def test_half_open(self):
+        self.breaker.record('cb:1026', True)
+        self.breaker.record('cb:1026', True)
+        self.time.return_value = 1010.0
+        ok_(self.breaker.allow('cb:1026'))
+        eq_(self.breaker.state('cb:1026'), CircuitBreaker.HALF_OPEN)
+        # only one trial request
+        ok_(not self.breaker.allow('cb:1026'))
+        ok_(self.breaker.record('cb:1026', True))
+        eq_(self.breaker.state('cb:1026'), CircuitBreaker.OPEN)
+        self.time.return_value = 1020.0
+        ok_(self.breaker.allow('cb:1026'))
+        self.breaker.record('cb:1026', False)
+        eq_(self.breaker.state('cb:1026'), CircuitBreaker.CLOSED)
+
+
+class HttpTransportRetryTest(unittest.TestCase):
+    def tearDown(self):
+        self.server.close()
+
+    def test_retry(self):
+        self.server = LocalServer(statuses=[503, 502])
+        with HttpTransport(retry=RetryPolicy(backoff=0), log_verbosity='ERROR') as transport:
+            eq_(transport.get(self.server.url).status_code, 200)
+            counters = transport.get_counters(self.server.host)
+        eq_((counters['requests'], counters['retries']), (3, 2))
+
+    def test_retries_exhausted(self):
+        self.server = LocalServer(statuses=[503, 503, 503], reply_headers={'Retry-After': '0'})
+        with HttpTransport(retry=RetryPolicy(retries=2), log_verbosity='ERROR') as transport:
+            eq_(transport.get(self.server.url).status_code, 503)
+        eq_(len(self.server.received), 3)
+
+    def test_post_not_retried(self):
+        self.server = LocalServer(statuses=[503])
+        with HttpTransport(retry=RetryPolicy(backoff=0), log_verbosity='ERROR') as transport:
+            eq_(transport.post(self.server.url, data='{}').status_code, 503)
+        eq_(len(self.server.received), 1)
+
+    def test_connection_refused(self):
+        self.server = LocalServer()
+        url = self.server.url
+        self.server.close()
+        with HttpTransport(retry=RetryPolicy(retries=2, backoff=0), log_verbosity='ERROR') as transport:
+            assert_raises(ConnectionError, transport.post, url, data='{}')
+            counters = transport.get_counters()
+        eq_((counters['requests'], counters['errors'], counters['retries']), (3, 3, 2))
+
+    def test_circuit_open(self):
+        self.server = LocalServer(statuses=[500, 500])
+        with HttpTransport(circuit_breaker=CircuitBreaker(failure_threshold=2), log_verbosity='ERROR') as transport:
+            eq_(transport.get(self.server.url).status_code, 500)
+            eq_(transport.get(self.server.url).status_code, 500)
+            assert_raises(CircuitOpenError, transport.get, self.server.url)
+            counters = transport.get_counters(self.server.host)
+        eq_((counters['circuit_opened'], counters['circuit_rejected']), (1, 1))
+        eq_(len(self.server.received), 2)
+
+
+class ClientTransportTest(unittest.TestCase):
+    def test_shared(self):
+        shared = HttpTransport(log_verbosity='ERROR')
+        transport, owned = client_transport(shared, pool_maxsize=50)
+        ok_(transport is shared)
+        ok_(not owned)
+
+    def test_owned(self):
+        transport, owned = client_transport(pool_maxsize=50, timeout=5, log_verbosity='ERROR')
+        ok_(isinstance(transport, HttpTransport))
+        ok_(owned)
+        eq_(transport.timeout, 5)
+        eq_(transport.session.get_adapter('http://127.0.0.1')._pool_maxsize, 50)
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2015 Telefonica Investigación y Desarrollo, S.A.U
+
+This file is part of telefonica-iotqatools
+
+iotqatools is free software: you can redistribute it and/or
+modify it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the License,
+or (at your option) any later version.
+
+iotqatools is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public
+License along with iotqatools.
+If not, seehttp://www.gnu.org/licenses/.
+
+For those usages not covered by the GNU Affero General Public License
+please contact with::[iot_support@tid.es]
+"""
+
+import random
+import threading
+import time
+from cookielib import DefaultCookiePolicy
+from urlparse import urlparse
+
+from requests.exceptions import ConnectionError, ConnectTimeout, RequestException
+from requests.packages.urllib3.exceptions import NewConnectionError
+
+from iotqatools.iot_logger import get_logger
+from iotqatools.metrics_utils import TimedHTTPAdapter, TimedSession
+
+# methods which can be sent again without side effects (RFC 7231)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+def is_connect_error(error):
+    """
+    :return True if the request failed before being sent (so it can be retried with any method)
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    if isinstance(error, ConnectionError) and error.args:
+        reason = getattr(error.args[0], 'reason', error.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class CircuitOpenError(RequestException):
+    """
+    The request was not sent because the circuit of the host is open
+    """
+
+
+class RetryPolicy(object):
+    """
+    Retry the failed requests with exponential backoff and full jitter: the wait before the retry N is random
+    between 0 and min(max_backoff, backoff * 2^N). Only the idempotent methods are retried after the request was
+    sent (errors and retry statuses); connection errors are retried with any method
+    """
+
+    def __init__(self, retries=3, backoff=0.1, max_backoff=10.0, statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS,
+                 seed=None):
+        """
+        :param retries: max number of retries of a request
+        :param backoff: base wait, seconds
+        :param max_backoff: max wait, seconds
+        :param statuses: response status codes retried
+        :param methods: methods retried after the request was sent (upper case)
+        :param seed: random seed
+        """
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.random = random.Random(seed)
+
+    def should_retry(self, method, attempt, response, error):
+        """
+        :param method: http method
+        :param attempt: number of retries already done
+        :param response: response (None if the request failed)
+        :param error: exception of the request (None if there is a response)
+        :return True if the request has to be sent again
+        """
+        if attempt >= self.retries or isinstance(error, CircuitOpenError):
+            return False
+        if error is not None:
+            return is_connect_error(error) or method.upper() in self.methods
+        return response.status_code in self.statuses and method.upper() in self.methods
+
+    def delay(self, attempt, response=None):
+        """
+        :return seconds to wait before the retry. The Retry-After header (in seconds) is honored up to max_backoff
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+
+class CircuitBreaker(object):
+    """
+    Per host circuit breaker. After failure_threshold consecutive failures (errors or 5xx responses) the circuit
+    of the host opens and the requests fail at once (CircuitOpenError) during reset_timeout seconds; then one
+    request is let through (half open) and its result closes or opens the circuit again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        :param failure_threshold: consecutive failures which open the circuit
+        :param reset_timeout: seconds the circuit stays open
+        """
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout = float(reset_timeout)
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def __host(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = {'state': self.CLOSED, 'failures': 0, 'opened_at': 0, 'trial': False}
+        return self.hosts[host]
+
+    def allow(self, host):
+        """
+        :return True if a request to the host can be sent
+        """
+        with self.lock:
+            circuit = self.__host(host)
+            if circuit['state'] == self.CLOSED:
+                return True
+            if circuit['state'] == self.OPEN and time.time() - circuit['opened_at'] >= self.reset_timeout:
+                circuit['state'] = self.HALF_OPEN
+                circuit['trial'] = False
+            if circuit['state'] == self.HALF_OPEN and not circuit['trial']:
+                circuit['trial'] = True
+                return True
+            return False
+
+    def record(self, host, failed):
+        """
+        account the result of a request
+        :return True if the circuit has been opened by this result
+        """
+        with self.lock:
+            circuit = self.__host(host)
+            if not failed:
+                circuit['state'] = self.CLOSED
+                circuit['failures'] = 0
+                return False
+            circuit['failures'] += 1
+            if circuit['state'] == self.HALF_OPEN or \
+                    (circuit['state'] == self.CLOSED and circuit['failures'] >= self.failure_threshold):
+                circuit['state'] = self.OPEN
+                circuit['opened_at'] = time.time()
+                return True
+            return False
+
+    def state(self, host):
+        with self.lock:
+            return self.__host(host)['state']
+
+
+def client_transport(transport=None, **kwargs):
+    """
+    transport of a component client: the one given (shared with other clients) or a new HttpTransport owned by the
+    client. All the clients get their transport here, so all their requests go through an HttpTransport
+    :param transport: HttpTransport shared with other clients (None creates a new one)
+    :param kwargs: HttpTransport constructor parameters, used if a new one is created
+    :return tuple (transport, owned), owned is True if the transport has been created for the client
+    """
+    if transport is not None:
+        return transport, False
+    return HttpTransport(**kwargs), True
+
+
+class HttpTransport(object):
+    """
+    HTTP transport of the component clients (CbNgsi10v2Utils, SthUtils, CKANUtils, CEP, AC, Orchestrator,
+    RequestUtils, Rest_Utils_IoTA and Gw_Measures_Utils). Each client creates its own one, or it can be shared, so
+    they reuse the same per host connection pools and the tuning (retries, circuit breaker, cassette) is done in
+    one place. The responses include their timings (see metrics_utils). As requests.request, cookies are not kept
+    between requests. The exchanges are logged and passed to the exchange hooks by the clients (see
+    PqaTools.add_exchange_hook)
+    >>> transport = HttpTransport(pool_maxsize=50, timeout=(3, 30), retry=RetryPolicy())
+    >>> cb = CbNgsi10v2Utils('127.0.0.1', transport=transport)
+    >>> iota = Rest_Utils_IoTA('127.0.0.1', transport=transport)
+    >>> RequestUtils.transport = transport
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0, keep_alive=True,
+                 timeout=None, retry=None, circuit_breaker=None, cassette=None, log_instance=None,
+                 log_verbosity='INFO'):
+        """
+        HTTP transport constructor
+        :param pool_connections: number of hosts with a connection pool
+        :param pool_maxsize: max number of connections kept alive per host
+        :param pool_block: block when no free connection is available in the pool, instead of opening a new one
+        :param max_retries: retries done by the http adapter (int or urllib3 Retry object)
+        :param keep_alive: reuse connections between requests (if False, "Connection: close" is sent)
+        :param timeout: default timeout of the requests, seconds or tuple (connect, read). None waits forever
+        :param retry: RetryPolicy (None does not retry)
+        :param circuit_breaker: CircuitBreaker (None does not break the circuits)
+        :param cassette: Cassette recording the interactions or replaying them without network (see cassette_utils)
+        :param log_instance:
+        :param log_verbosity:
+        """
+        if log_instance is not None:
+            self.log = log_instance
+        else:
+            self.log = get_logger('HttpTransport', log_verbosity)
+        self.timeout = timeout
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.cassette = cassette
+        self.counters_lock = threading.Lock()
+        self.counters = {}
+        self.session = TimedSession()
+        adapter = TimedHTTPAdapter(pool_connections=int(pool_connections), pool_maxsize=int(pool_maxsize),
+                                   pool_block=pool_block, max_retries=max_retries)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # the cookies set by the servers are not sent in the next requests
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def request(self, method, url, **kwargs):
+        """
+        send a request, with the same parameters as requests.request. The failed requests are retried following
+        the retry policy, and the circuit breaker can reject them (CircuitOpenError, a RequestException)
+        :return response
+        """
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            response, error = self.__send(method, url, host, kwargs)
+            if self.retry is None or not self.retry.should_retry(method, attempt, response, error):
+                break
+            delay = self.retry.delay(attempt, response)
+            self.log.debug('Retrying %s %s in %.3fs (%s)' % (method, url, delay,
+                                                            error if error is not None else response.status_code))
+            self.__count(host, 'retries')
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+        if error is not None:
+            raise error
+        return response
+
+    def __send(self, method, url, host, kwargs):
+        """
+        send a request once
+        :return tuple (response, error)
+        """
+        self.__count(host, 'requests')
+        if self.cassette is not None and self.cassette.replaying:
+            return self.__play(method, url, kwargs)
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow(host):
+            self.__count(host, 'circuit_rejected')
+            return None, CircuitOpenError('ERROR: circuit open for %s' % host)
+        response = error = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except RequestException, e:
+            error = e
+            self.__count(host, 'errors')
+        if self.cassette is not None and response is not None:
+            self.cassette.record(method, url, kwargs, response)
+        if self.circuit_breaker is not None:
+            failed = error is not None or response.status_code >= 500
+            if self.circuit_breaker.record(host, failed):
+                self.__count(host, 'circuit_opened')
+                self.log.warning('Circuit opened for %s' % host)
+        return response, error
+
+    def __play(self, method, url, kwargs):
+        """
+        get the response of a request from the cassette
+        :return tuple (response, error)
+        """
+        try:
+            return self.cassette.play(method, url, kwargs), None
+        except RequestException, e:
+            return None, e
+
+    def __count(self, host, counter):
+        with self.counters_lock:
+            if host not in self.counters:
+                self.counters[host] = {'requests': 0, 'errors': 0, 'retries': 0, 'circuit_opened': 0,
+                                       'circuit_rejected': 0}
+            self.counters[host][counter] += 1
+
+    def get_counters(self, host=None):
+        """
+        get the counters of requests sent (retries included), network errors, retries, circuit openings and
+        requests rejected by an open circuit
+        :param host: host:port (None to add the counters of all the hosts)
+        :return dict
+        """
+        with self.counters_lock:
+            if host is not None:
+                return dict(self.counters.get(host, {}))
+            total = {'requests': 0, 'errors': 0, 'retries': 0, 'circuit_opened': 0, 'circuit_rejected': 0}
+            for counters in self.counters.values():
+                for name in counters:
+                    total[name] += counters[name]
+            return total
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('put', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('patch', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+    def close(self):
+        """
+        close all the pooled connections (and the cassette)
+        """
+        self.session.close()
+        if self.cassette is not None:
+            self.cassette.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -80,24 +80,41 @@ setup(
     ],
     py_modules=[
         'iotqatools.ac_utils',
+        'iotqatools.capture_utils',
+        'iotqatools.cassette_utils',
         'iotqatools.cb_utils',
         'iotqatools.cb_ngsiv2_utils',
+        'iotqatools.cb_bulk_utils',
+        'iotqatools.cb_async_utils',
+        'iotqatools.cb_load_utils',
+        'iotqatools.cb_payload_utils',
+        'iotqatools.cb_stats_utils',
+        'iotqatools.cb_notification_utils',
         'iotqatools.cb_v2_utils',
         'iotqatools.cep_utils',
         'iotqatools.ckan_utils',
         'iotqatools.fabric_utils',
         'iotqatools.helpers_utils',
+        'iotqatools.histogram_utils',
         'iotqatools.iot_logger',
         'iotqatools.iot_tools',
+        'iotqatools.iota_bulk_utils',
+        'iotqatools.iota_command_utils',
+        'iotqatools.iota_fleet_utils',
         'iotqatools.iota_utils',
+        'iotqatools.json_utils',
         'iotqatools.ks_utils',
         'iotqatools.iota_measures',
+        'iotqatools.metrics_utils',
         'iotqatools.mongo_utils',
         'iotqatools.mysql_utils',
         'iotqatools.orchestator_utils',
+        'iotqatools.pagination_utils',
         'iotqatools.pep_utils',
+        'iotqatools.recorder_utils',
         'iotqatools.remote_log_utils',
-        'iotqatools.sth_utils'
+        'iotqatools.sth_utils',
+        'iotqatools.transport_utils'
     ],
     packages=[
         'iotqatools',